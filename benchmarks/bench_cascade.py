@@ -0,0 +1,152 @@
+"""Concordância com os rótulos, latência e custo da avaliação em cascata (monitorai.cascade) contra o stub.
+
+Uso:
+    python benchmarks/bench_cascade.py [--repeat 3] [--margins 0,5,10]
+    python benchmarks/bench_cascade.py --error-fast 0.15 --noise-fast 0.03 --malformed-rate 0.05
+
+As transcrições rotuladas de benchmarks/fixtures (itens 4, 5 e 14) são avaliadas `--repeat` vezes
+por estratégia: só o modelo rápido, só o completo e a cascata com cada margem de `--margins`. O stub
+responde os rótulos, e cada modelo erra cada item com as taxas configuradas:
+- `--error-*`: erros sistemáticos, os mesmos a cada chamada com a mesma transcrição;
+- `--noise-*`: erros avulsos, que fazem as execuções divergirem.
+O modelo rápido gera tokens a `--tps-fast` e o completo a `--tps-full`. Para cada estratégia, o
+benchmark mostra:
+- acurácia nos itens rotulados;
+- fração escalonada para o modelo completo e os motivos;
+- p50/p95 da avaliação de uma ligação;
+- custo estimado por ligação (tabela de preços de monitorai.telemetry).
+
+Com --output, grava os números em JSON para comparar com execuções futuras.
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_server import StubConfig, start_stub  # noqa: E402
+
+from monitorai.cascade import evaluate_cascade  # noqa: E402
+from monitorai.clients import make_client  # noqa: E402
+from monitorai.jsonstream import parse_tolerant  # noqa: E402
+from monitorai.pipeline import request_analysis  # noqa: E402
+from monitorai.prompt import MODELO_PADRAO, MODELO_RAPIDO  # noqa: E402
+from monitorai.telemetry import percentile, telemetry  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "transcricoes.jsonl"
+
+
+def load_fixtures(path=FIXTURES):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def single(client, model):
+    def evaluate(transcript_text):
+        return parse_tolerant(request_analysis(client, transcript_text, model))
+    return evaluate
+
+
+def cascade(client, margem):
+    def evaluate(transcript_text):
+        return evaluate_cascade(client, transcript_text, MODELO_PADRAO, MODELO_RAPIDO, margem=margem)[1]
+    return evaluate
+
+
+def run_strategy(evaluate, fixtures, repeat, concurrency):
+    """Avalia cada fixture `repeat` vezes; devolve acurácia, escalonamentos, latências e custo"""
+    telemetry.reset()
+
+    def one(fixture):
+        started = time.perf_counter()
+        try:
+            analysis = evaluate(fixture["transcricao"])
+        except ValueError:
+            return fixture, None, time.perf_counter() - started
+        return fixture, analysis, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        runs = list(pool.map(one, [fixture for _ in range(repeat) for fixture in fixtures]))
+
+    correct = total = escalated = invalid = 0
+    motivos = Counter()
+    for fixture, analysis, _ in runs:
+        if analysis is None:
+            invalid += 1
+            continue
+        respostas = {str(item.get("item")): item.get("resposta") for item in analysis.get("checklist_detalhado", [])}
+        for item, expected in fixture["esperado"].items():
+            total += 1
+            correct += respostas.get(item) == expected
+        decision = analysis.get("cascata")
+        if decision and decision["escalou"]:
+            escalated += 1
+            motivos.update(decision["motivos"])
+    latencies = [seconds for _, _, seconds in runs]
+    return {
+        "ligacoes": len(runs),
+        "acuracia": correct / total if total else 0.0,
+        "escalonadas": escalated / len(runs),
+        "json_invalido": invalid,
+        "motivos": dict(motivos),
+        "p50_s": percentile(latencies, 0.50),
+        "p95_s": percentile(latencies, 0.95),
+        "custo_usd": telemetry.totals()["custo_usd"] / len(runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="Avaliações de cada transcrição rotulada por estratégia")
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--margins", default="0,5,10", help="Margens da cascata (pontos percentuais em torno de 50%% e 70%%)")
+    parser.add_argument("--error-fast", type=float, default=0.06, help=f"Erros sistemáticos por item do {MODELO_RAPIDO} no stub")
+    parser.add_argument("--noise-fast", type=float, default=0.02, help=f"Erros avulsos por item do {MODELO_RAPIDO} no stub")
+    parser.add_argument("--error-full", type=float, default=0.01, help=f"Erros sistemáticos por item do {MODELO_PADRAO} no stub")
+    parser.add_argument("--noise-full", type=float, default=0.01, help=f"Erros avulsos por item do {MODELO_PADRAO} no stub")
+    parser.add_argument("--tps-fast", type=float, default=1000.0, help=f"Tokens/s do {MODELO_RAPIDO} no stub")
+    parser.add_argument("--tps-full", type=float, default=400.0, help=f"Tokens/s do {MODELO_PADRAO} no stub")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latência do stub até o primeiro token (s)")
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Grava os resultados em JSON")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    config = StubConfig(
+        latency=args.latency, completion_tokens=args.completion_tokens, malformed_rate=args.malformed_rate,
+        model_tokens_per_s={MODELO_RAPIDO: args.tps_fast, MODELO_PADRAO: args.tps_full},
+        model_error_rates={MODELO_RAPIDO: args.error_fast, MODELO_PADRAO: args.error_full},
+        model_noise_rates={MODELO_RAPIDO: args.noise_fast, MODELO_PADRAO: args.noise_full},
+        labels={fixture["transcricao"]: fixture["esperado"] for fixture in fixtures},
+    )
+    server, base_url = start_stub(config)
+    client = make_client(api_key="sk-bench", base_url=base_url, max_connections=max(20, 4 * args.concurrency))
+    strategies = {MODELO_RAPIDO: single(client, MODELO_RAPIDO), MODELO_PADRAO: single(client, MODELO_PADRAO)}
+    for margem in (float(value) for value in args.margins.split(",")):
+        strategies[f"cascata ±{margem:g}"] = cascade(client, margem)
+
+    results = {"parametros": vars(args), "estrategias": {}}
+    try:
+        print(f"{len(fixtures)} transcrições rotuladas × {args.repeat}")
+        print(f"{'estratégia':<16} {'acurácia':>8} {'escalonadas':>11} {'p50 s':>7} {'p95 s':>7} {'US$/ligação':>12}  motivos")
+        for name, evaluate in strategies.items():
+            row = results["estrategias"][name] = run_strategy(evaluate, fixtures, args.repeat, args.concurrency)
+            motivos = ", ".join(f"{motivo} {n}" for motivo, n in sorted(row["motivos"].items()))
+            invalid = f" (JSON inválido: {row['json_invalido']})" if row["json_invalido"] else ""
+            print(f"{name:<16} {row['acuracia']:>8.1%} {row['escalonadas']:>11.0%} {row['p50_s']:>7.2f} {row['p95_s']:>7.2f} "
+                  f"{row['custo_usd']:>12.5f}  {motivos}{invalid}")
+    finally:
+        server.shutdown()
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Custo de partida e de rerun do app e latência da primeira requisição: cliente por rerun x cliente compartilhado.
+
+Uso:
+    python benchmarks/bench_client.py [--reruns 20]
+    python benchmarks/bench_client.py --base-url https://api.openai.com/v1 --api-key sk-...
+
+Mede:
+- importação a frio dos módulos do app com openai e fpdf importados no topo (como antes) e sem eles;
+- trabalho feito a cada rerun: criar OpenAI(...) (antes) x consultar o cliente em cache (agora);
+- latência da primeira requisição de cada rerun: cliente novo (criação do cliente e conexão nova a
+  cada vez) x cliente com pool de conexões reaproveitado entre reruns.
+
+Sem --base-url, usa o stub local (benchmarks/stub_server.py; sem TLS, então a diferença de conexão
+aparece menor do que contra a API real).
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from stub_server import StubConfig, start_stub  # noqa: E402
+
+from monitorai.clients import make_client  # noqa: E402
+
+APP_MODULES = ("import monitorai.cache, monitorai.clients, monitorai.compact, monitorai.jobs, monitorai.memo, monitorai.preprocess, "
+               "monitorai.prompt, monitorai.segments, monitorai.telemetry, monitorai.uploads, monitorai.vad")
+EAGER_IMPORTS = "import openai, monitorai.report"
+
+
+def import_time(statement, runs=5):
+    """Mediana, em ms, do tempo de importação num processo novo"""
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    samples = [
+        float(subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout)
+        for _ in range(runs)
+    ]
+    return statistics.median(samples) * 1000
+
+
+def first_request(client):
+    started = time.perf_counter()
+    client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "ping"}])
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--base-url", help="API compatível com a OpenAI (padrão: servidor local)")
+    parser.add_argument("--api-key", default="sk-bench")
+    args = parser.parse_args()
+
+    from openai import OpenAI
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = start_stub(StubConfig(completion_tokens=10))
+
+    base = import_time(APP_MODULES)
+    eager = import_time(f"{APP_MODULES}; {EAGER_IMPORTS}")
+    print(f"importação a frio: {eager:.0f} ms com openai/fpdf no topo, {base:.0f} ms adiados")
+
+    started = time.perf_counter()
+    for _ in range(args.reruns):
+        OpenAI(api_key=args.api_key, base_url=base_url)
+    per_rerun = (time.perf_counter() - started) / args.reruns * 1000
+    print(f"trabalho por rerun: {per_rerun:.2f} ms criando OpenAI(...), ~0 ms com o cliente em cache")
+
+    fresh = []
+    for _ in range(args.reruns):
+        started = time.perf_counter()
+        client = OpenAI(api_key=args.api_key, base_url=base_url)
+        fresh.append((time.perf_counter() - started) * 1000 + first_request(client))
+        client.close()
+    shared_client = make_client(api_key=args.api_key, base_url=base_url)
+    first_request(shared_client)  # conexão aberta pelo primeiro rerun
+    shared = [first_request(shared_client) for _ in range(args.reruns)]
+    for name, samples in (("cliente por rerun", fresh), ("cliente compartilhado", shared)):
+        print(f"1ª requisição, {name:<22} p50 {statistics.median(samples):7.2f} ms  máx {max(samples):7.2f} ms")
+
+    if server is not None:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Transcrição de áudio longo em trechos contra um substituto local do endpoint de transcrição.
+
+Uso:
+    python benchmarks/bench_long_audio.py --minutes 30 --workers 4
+
+Gera com o ffmpeg uma "ligação" sintética (falas = tons, separadas por silêncios), transcreve em
+trechos com um cliente falso cuja latência é proporcional à duração do trecho e confere que:
+  * cada fala aparece exatamente uma vez depois da recomposição (sobreposição deduplicada);
+  * os timestamps recompostos caem dentro da fala original;
+  * o tempo total acompanha o trecho mais longo, não a ligação inteira.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitorai.audio import FFMPEG, detect_silences, run_ffmpeg  # noqa: E402
+from monitorai.longaudio import transcribe_long  # noqa: E402
+
+SPEECH_SECONDS = 20
+PAUSE_SECONDS = 3
+
+
+def make_call_audio(path, minutes):
+    """Falas de SPEECH_SECONDS separadas por pausas de PAUSE_SECONDS"""
+    count = int(minutes * 60 // (SPEECH_SECONDS + PAUSE_SECONDS))
+    filters = "".join(
+        f"sine=frequency={300 + 10 * (i % 40)}:duration={SPEECH_SECONDS}[s{i}];"
+        f"anullsrc=r=16000:cl=mono,atrim=duration={PAUSE_SECONDS}[p{i}];"
+        for i in range(count)
+    )
+    inputs = "".join(f"[s{i}][p{i}]" for i in range(count))
+    graph = filters + f"{inputs}concat=n={count * 2}:v=0:a=1,aresample=16000[out]"
+    run_ffmpeg(["-loglevel", "error", "-filter_complex", graph, "-map", "[out]",
+                "-ac", "1", "-c:a", "libmp3lame", "-b:a", "32k", "-y", str(path)])
+    return [(i * (SPEECH_SECONDS + PAUSE_SECONDS), i * (SPEECH_SECONDS + PAUSE_SECONDS) + SPEECH_SECONDS)
+            for i in range(count)]
+
+
+class FakeTranscriptions:
+    """Responde como verbose_json: um segmento por fala encontrada no trecho"""
+
+    def __init__(self, seconds_per_audio_second):
+        self.factor = seconds_per_audio_second
+
+    def create(self, model, file, **kwargs):
+        duration, silences = detect_silences(file.name)
+        time.sleep(duration * self.factor)
+        segments, cursor = [], 0.0
+        chunk_name = Path(file.name).stem
+        for start, end in silences + [(duration, duration)]:
+            if start - cursor > 1.0:
+                segments.append({"start": cursor, "end": start, "text": f"{chunk_name} fala {len(segments)}."})
+            cursor = end
+        return types.SimpleNamespace(text=" ".join(s["text"] for s in segments), segments=segments)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--chunk-seconds", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency-factor", type=float, default=0.01, help="Segundos de latência por segundo de áudio")
+    args = parser.parse_args()
+    print(f"ffmpeg: {FFMPEG}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        audio = os.path.join(tmpdir, "ligacao.mp3")
+        speeches = make_call_audio(audio, args.minutes)
+        client = types.SimpleNamespace(audio=types.SimpleNamespace(transcriptions=FakeTranscriptions(args.latency_factor)))
+
+        timings = {}
+        for workers in (1, args.workers):
+            started = time.perf_counter()
+            result = transcribe_long(client, audio, max_workers=workers, chunk_seconds=args.chunk_seconds)
+            timings[workers] = time.perf_counter() - started
+
+        segments = result["segments"]
+        print(f"falas: {len(speeches)}  segmentos recompostos: {len(segments)}")
+        misplaced = [
+            seg for seg in segments
+            if not any(start - 1.5 <= (seg["start"] + seg["end"]) / 2 <= end + 1.5 for start, end in speeches)
+        ]
+        whole = args.minutes * 60 * args.latency_factor
+        longest_chunk = (args.chunk_seconds + 4) * args.latency_factor
+        print(f"1 worker: {timings[1]:.2f}s  {args.workers} workers: {timings[args.workers]:.2f}s")
+        print(f"latência simulada da ligação inteira: {whole:.2f}s  do trecho mais longo: {longest_chunk:.2f}s")
+        ok = len(segments) == len(speeches) and not misplaced
+        print("OK" if ok else f"FALHOU: {len(misplaced)} segmentos fora do lugar")
+        return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
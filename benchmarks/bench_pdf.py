@@ -0,0 +1,145 @@
+"""Relatórios por segundo com transcrições longas: renderizador atual x create_pdf anterior.
+
+Uso:
+    python benchmarks/bench_pdf.py [--chars 60000] [--reports 10]
+
+O create_pdf anterior (clean_text_for_pdf com 14 str.replace por campo, fonte Arial latin-1 e
+multi_cell(0, 10, ...) na transcrição) é reproduzido aqui sobre o fpdf2, com o mesmo layout. Também
+mede o primeiro relatório do processo (carga da fonte) e conta os caracteres da transcrição que cada
+versão não escreve como estão (removidos ou transliterados).
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fpdf import FPDF  # noqa: E402
+from fpdf.enums import XPos, YPos  # noqa: E402
+
+from monitorai.report import clean_text, create_pdf  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "transcricoes.jsonl"
+
+ANALYSIS = {
+    "status_final": {"satisfacao": "satisfeito", "risco": "baixo", "desfecho": "resolvido"},
+    "grupos_avaliacao": [
+        {"grupo": letra, "nome": f"Grupo {letra} — critérios de atendimento", "percentual": 10, "feito": letra in "ACF",
+         "justificativa": "A agente confirmou os dados, repetiu a placa e o telefone e explicou o próximo passo. " * 3}
+        for letra in "ABCDEF"
+    ],
+    "checklist_detalhado": [
+        {"item": numero, "criterio": "Critério da rubrica", "resposta": "sim" if numero % 3 else "não",
+         "justificativa": "Trecho: “vou confirmar o seu telefone” — a agente repetiu a informação… 👍 " * 2}
+        for numero in (1, 3, 4, 5, 6, 7, 9, 10, 11, 12, 14, 15)
+    ],
+    "criterios_eliminatorios": [{"criterio": "Agiu de forma rude?", "ocorreu": True, "justificativa": "Não houve — falsa marcação."}],
+    "pontuacao_total_percentual": 40,
+    "resumo_geral": "Atendimento cordial, com confirmação de dados e orientação sobre a franquia. " * 4,
+}
+
+
+def legacy_clean_text_for_pdf(text):
+    if not text:
+        return ""
+    replacements = {
+        "…": "...", "–": "-", "—": "--", "‘": "'", "’": "'", "“": '"',
+        "”": '"', "•": "*", "′": "'", "″": '"', "°": " graus", "©": "(c)",
+        "®": "(R)", "™": "(TM)",
+    }
+    for unicode_char, replacement in replacements.items():
+        text = text.replace(unicode_char, replacement)
+    try:
+        text.encode("latin-1")
+    except UnicodeEncodeError:
+        text = text.encode("latin-1", errors="ignore").decode("latin-1")
+    return text
+
+
+def legacy_create_pdf(analysis, transcript_text, model_name):
+    clean = legacy_clean_text_for_pdf
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("helvetica", "B", 16)
+    pdf.set_fill_color(193, 0, 0)
+    pdf.set_text_color(255, 255, 255)
+    pdf.cell(0, 10, "MonitorAI - Relatorio de Atendimento", 1, align="C", fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(5)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("helvetica", "B", 12)
+    pdf.cell(0, 10, f"Modelo: {model_name}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    final = analysis.get("status_final", {})
+    pdf.set_font("helvetica", "", 12)
+    for campo in ("satisfacao", "desfecho", "risco"):
+        pdf.cell(0, 10, clean(f"{campo}: {final.get(campo, 'N/A')}"), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.cell(0, 10, clean(str(analysis.get("pontuacao_total_percentual", "N/A"))), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    for grupo in analysis.get("grupos_avaliacao", []):
+        pdf.set_font("helvetica", "B", 12)
+        pdf.multi_cell(0, 8, f"{clean(grupo.get('nome', ''))} ({grupo.get('percentual', 0)}%)", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font("helvetica", "", 10)
+        pdf.multi_cell(0, 6, f"Justificativa: {clean(grupo.get('justificativa', 'N/A'))}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.add_page()
+    pdf.set_font("helvetica", "", 12)
+    pdf.multi_cell(0, 10, clean(analysis.get("resumo_geral", "N/A")), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    for criterio in analysis.get("criterios_eliminatorios", []):
+        if criterio.get("ocorreu", False):
+            pdf.set_font("helvetica", "B", 11)
+            pdf.multi_cell(0, 8, f"VIOLADO: {clean(criterio.get('criterio', 'N/A'))}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.set_font("helvetica", "", 10)
+            pdf.multi_cell(0, 6, clean(criterio.get("justificativa", "")), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.add_page()
+    for item in analysis.get("checklist_detalhado", []):
+        pdf.set_font("helvetica", "B", 11)
+        pdf.multi_cell(0, 8, f"Item {item.get('item')}: {clean(item.get('criterio', ''))}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font("helvetica", "", 10)
+        pdf.cell(0, 6, f"Resposta: {clean(item.get('resposta', ''))}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.multi_cell(0, 6, f"Justificativa: {clean(item.get('justificativa', ''))}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.add_page()
+    pdf.set_font("helvetica", "", 10)
+    pdf.multi_cell(0, 10, clean(transcript_text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    return bytes(pdf.output())
+
+
+def long_transcript(chars):
+    with open(FIXTURES, encoding="utf-8") as f:
+        texts = [json.loads(line)["transcricao"] for line in f if line.strip()]
+    # Pontuação tipográfica e emoji como aparecem em transcrições coladas de outros sistemas
+    base = "\n".join(texts) + "\nCliente: “Tá certo” — obrigada pela paciência… 🙂\n"
+    return (base * (chars // len(base) + 1))[:chars]
+
+
+def measure(render, transcript, reports):
+    started = time.perf_counter()
+    first = render(ANALYSIS, transcript, "gpt-4o")
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(reports):
+        render(ANALYSIS, transcript, "gpt-4o")
+    elapsed = time.perf_counter() - started
+    return cold, reports / elapsed, len(first)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, default=60000, help="Tamanho da transcrição (60 mil ≈ 1 hora de ligação)")
+    parser.add_argument("--reports", type=int, default=10)
+    args = parser.parse_args()
+    transcript = long_transcript(args.chars)
+
+    print(f"transcrição: {len(transcript):,} caracteres")
+    print(f"{'versão':<10} {'1º (s)':>8} {'relat./s':>9} {'KiB':>7} {'caracteres alterados':>20}")
+    results = {}
+    for name, render, clean in (("anterior", legacy_create_pdf, legacy_clean_text_for_pdf), ("atual", create_pdf, clean_text)):
+        cold, rate, size = measure(render, transcript, args.reports)
+        altered = sum(1 for ch in transcript if clean(ch) != ch)
+        results[name] = rate
+        print(f"{name:<10} {cold:>8.3f} {rate:>9.2f} {size / 1024:>7.0f} {altered:>20,}")
+    print(f"ganho: {results['atual'] / results['anterior']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Latência por etapa, vazão com sessões concorrentes e memória do fluxo completo contra o stub local.
+
+Uso:
+    python benchmarks/bench_pipeline.py [--sessions 16] [--concurrency 4] [--latency 0.3 --tokens-per-s 200]
+    python benchmarks/bench_pipeline.py --engine grupos --malformed-rate 0.1 --output baseline.json
+    python benchmarks/bench_pipeline.py --compact --tokens-per-s 80   # modo compacto (justificativas só no PDF)
+    python benchmarks/bench_pipeline.py --app      # inclui o app Streamlit (clique e rerun) via AppTest
+
+Cada sessão percorre upload (spool_upload) → transcrição → avaliação → leitura do JSON → PDF,
+com um cliente compartilhado como no app. Os cenários "curta" e
+"longa" variam o tamanho da transcrição e da resposta. Para cada cenário:
+- p50/p95/p99 de cada etapa e vazão (sessões/s) com `--concurrency` sessões simultâneas;
+- pico de memória Python (tracemalloc) de uma sessão isolada e pico de RSS do processo;
+- tamanho do PDF (servido como download binário);
+- respostas malformadas injetadas pelo stub e quantas não puderam ser lidas.
+
+Com --compact (prompt único), a avaliação devolve só os veredictos e a etapa "justificativas" pede
+de uma vez as justificativas do PDF, como no app quando o relatório é gerado.
+
+Com --output, grava os números em JSON para comparar com execuções futuras.
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_server import StubConfig, start_stub  # noqa: E402
+
+from monitorai.clients import ETAPA_ANALISE, ETAPA_TRANSCRICAO, for_stage, make_client  # noqa: E402
+from monitorai.compact import apply_justifications, expand_compact, justify, pending_targets  # noqa: E402
+from monitorai.fanout import evaluate_by_group  # noqa: E402
+from monitorai.jsonstream import parse_tolerant  # noqa: E402
+from monitorai.pipeline import stream_analysis, transcribe_file  # noqa: E402
+from monitorai.prompt import MODELO_PADRAO  # noqa: E402
+from monitorai.report import create_pdf  # noqa: E402
+from monitorai.uploads import spool_upload  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+STAGES = ["upload", "transcricao", "avaliacao", "json", "justificativas", "pdf"]
+# (palavras da transcrição, tokens da resposta): ~3 minutos e ~1 hora de ligação
+SCENARIOS = {"curta": (450, 1500), "longa": (9000, 3000)}
+
+
+class MalformedResponse(Exception):
+    pass
+
+
+def run_session(client, audio_bytes, engine, compact=False, model=MODELO_PADRAO):
+    """Uma sessão completa; devolve ({etapa: segundos}, tamanho do PDF)"""
+    timings = {}
+
+    def stage(name, func, *args):
+        started = time.perf_counter()
+        value = func(*args)
+        timings[name] = time.perf_counter() - started
+        return value
+
+    upload = stage("upload", spool_upload, io.BytesIO(audio_bytes))
+    try:
+        transcript = stage("transcricao", transcribe_file, for_stage(client, ETAPA_TRANSCRICAO), upload.path)
+    finally:
+        upload.cleanup()
+    analysis_client = for_stage(client, ETAPA_ANALISE)
+    if engine == "grupos":
+        _, analysis = stage("avaliacao", evaluate_by_group, analysis_client, transcript, model)
+        timings["json"] = 0.0  # lido (com reparo) dentro do motor por grupo
+    else:
+        raw = stage("avaliacao", lambda: "".join(stream_analysis(analysis_client, transcript, model, compact=compact)))
+        try:
+            analysis = stage("json", parse_tolerant, raw)
+        except ValueError as error:
+            raise MalformedResponse(str(error)) from error
+    if compact and engine != "grupos":
+        analysis = expand_compact(analysis)
+        texts = stage("justificativas", justify, analysis_client, transcript, model, analysis, pending_targets(analysis))
+        analysis = apply_justifications(analysis, texts)
+    else:
+        timings["justificativas"] = 0.0
+    pdf_bytes = stage("pdf", create_pdf, analysis, transcript, model)
+    return timings, len(pdf_bytes)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_scenario(client, config, args, words, tokens):
+    config.transcript_words = words
+    config.completion_tokens = tokens
+    audio_bytes = os.urandom(args.audio_mb * 1024 * 1024)
+    before = dict(config.requests)
+
+    # Pico de memória de uma sessão isolada, já aquecida (tracemalloc deixa tudo mais lento; fora da medição de latência)
+    run_session(client, audio_bytes, args.engine, args.compact)
+    tracemalloc.start()
+    run_session(client, audio_bytes, args.engine, args.compact)
+    peak_python = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    samples = {name: [] for name in STAGES}
+    failures = 0
+    pdf_size = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(run_session, client, audio_bytes, args.engine, args.compact) for _ in range(args.sessions)]
+        for future in futures:
+            try:
+                timings, pdf_size = future.result()
+            except MalformedResponse:
+                failures += 1
+                continue
+            for name, seconds in timings.items():
+                samples[name].append(seconds)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "palavras": words,
+        "tokens_resposta": tokens,
+        "sessoes": args.sessions,
+        "concorrencia": args.concurrency,
+        "vazao_sessoes_s": args.sessions / elapsed,
+        "etapas_ms": {
+            name: {q: percentile(values, f) * 1000 for q, f in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+            for name, values in samples.items()
+        },
+        "pico_python_mib": peak_python / 2**20,
+        "pico_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "pdf_kib": pdf_size / 1024,
+        "malformadas": config.requests["malformed"] - before["malformed"],
+        "falhas_json": failures,
+    }
+
+
+def run_app(base_url, config):
+    """Clique em "Analisar" e rerun seguinte no app real, via AppTest (com o upload simulado)"""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    class FakeUpload(io.BytesIO):
+        file_id = "bench"
+        name = "bench.mp3"
+
+        @property
+        def size(self):
+            return len(self.getvalue())
+
+    # O AppTest não simula uploads: o file_uploader devolve um arquivo em memória
+    audio_bytes = os.urandom(1024 * 1024)
+    st.file_uploader = lambda *args, **kwargs: FakeUpload(audio_bytes)
+    st.audio = lambda *args, **kwargs: None
+    os.environ["MONITORAI_CACHE_DIR"] = tempfile.mkdtemp(prefix="monitorai-bench-")
+    results = {}
+    for name, (words, tokens) in SCENARIOS.items():
+        config.transcript_words, config.completion_tokens = words, tokens
+        app = AppTest.from_file(str(ROOT / "streamlit_app.py"), default_timeout=600)
+        app.secrets["OPENAI_API_KEY"] = "sk-bench"
+        app.secrets["OPENAI_BASE_URL"] = base_url
+        app.run()
+        started = time.perf_counter()
+        app.button[0].click().run()
+        click = time.perf_counter() - started
+        started = time.perf_counter()
+        app.run()
+        rerun = time.perf_counter() - started
+        results[name] = {"clique_ms": click * 1000, "rerun_ms": rerun * 1000, "erros": len(app.exception)}
+    return results
+
+
+def print_scenario(name, result):
+    print(f"\n== {name}: {result['palavras']} palavras, ~{result['tokens_resposta']} tokens de resposta ==")
+    print(f"{'etapa':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, q in result["etapas_ms"].items():
+        print(f"{stage:<14} {q['p50']:>9.1f} {q['p95']:>9.1f} {q['p99']:>9.1f}")
+    print(f"vazão: {result['vazao_sessoes_s']:.2f} sessões/s ({result['sessoes']} sessões, {result['concorrencia']} simultâneas)")
+    print(f"memória: pico Python {result['pico_python_mib']:.1f} MiB por sessão, pico RSS {result['pico_rss_mib']:.0f} MiB")
+    print(f"PDF {result['pdf_kib']:.0f} KiB")
+    print(f"respostas malformadas: {result['malformadas']}, não lidas: {result['falhas_json']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--engine", choices=["unico", "grupos"], default="unico")
+    parser.add_argument("--compact", action="store_true", help="Prompt único no modo compacto (monitorai.compact)")
+    parser.add_argument("--audio-mb", type=int, default=5, help="Tamanho do upload sintético (abaixo do limite de 25 MB)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latência do stub até o primeiro token (s)")
+    parser.add_argument("--tokens-per-s", type=float, default=0.0, help="Velocidade de geração do stub (0 = instantâneo)")
+    parser.add_argument("--transcription-latency", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append", help="Padrão: todos")
+    parser.add_argument("--app", action="store_true", help="Mede também o app Streamlit (AppTest)")
+    parser.add_argument("--output", help="Grava os resultados em JSON")
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, tokens_per_s=args.tokens_per_s,
+                        transcription_latency=args.transcription_latency, malformed_rate=args.malformed_rate)
+    server, base_url = start_stub(config)
+    client = make_client(api_key="sk-bench", base_url=base_url, max_connections=max(20, 8 * args.concurrency))
+    results = {"parametros": vars(args), "cenarios": {}}
+    try:
+        for name in args.scenario or SCENARIOS:
+            words, tokens = SCENARIOS[name]
+            results["cenarios"][name] = run_scenario(client, config, args, words, tokens)
+            print_scenario(name, results["cenarios"][name])
+        if args.app:
+            results["app"] = run_app(base_url, config)
+            print("\n== app (AppTest) ==")
+            for name, app in results["app"].items():
+                print(f"{name:<6} clique {app['clique_ms']:8.0f} ms   rerun {app['rerun_ms']:6.0f} ms   erros {app['erros']}")
+    finally:
+        server.shutdown()
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
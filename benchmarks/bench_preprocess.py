@@ -0,0 +1,82 @@
+"""Pré-processamento do áudio (monitorai.preprocess) em ligações sintéticas de várias durações.
+
+Uso:
+    python benchmarks/bench_preprocess.py [--minutes 5 30 60] [--lead 20 --tail 15]
+
+Gera com o ffmpeg um MP3 estéreo de 128 kbps como os recebidos (silêncio de espera no início e no
+fim, falas = tons modulados, com pausas curtas, sobre ruído de fundo) e roda prepare_audio. Para cada duração:
+- bytes antes e depois (Opus mono 16 kHz) e segundos cortados x silêncio gerado;
+- tempo de processamento (uma decodificação e uma codificação);
+- pico de memória Python (tracemalloc) e pico de RSS do processo, que devem ficar constantes
+  com a duração (o PCM é lido em blocos);
+- tempo das medições de voz (monitorai.vad) sobre os níveis já calculados.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitorai.audio import run_ffmpeg  # noqa: E402
+from monitorai.preprocess import TRIM_PADDING_SECONDS, prepare_audio  # noqa: E402
+from monitorai.vad import timing_metrics  # noqa: E402
+
+
+def make_recording(path, minutes, lead, tail):
+    """Silêncio de `lead` s, fala de `minutes` min e silêncio de `tail` s, estéreo, 44,1 kHz, 128 kbps"""
+    speech = minutes * 60
+    graph = (
+        f"anullsrc=r=44100:cl=stereo,atrim=duration={lead}[lead];"
+        f"sine=frequency=220:sample_rate=44100:duration={speech},tremolo=f=3:d=1,volume=0.5[tone];"
+        f"anoisesrc=r=44100:amplitude=0.01:duration={speech}[noise];"
+        f"[tone][noise]amix=inputs=2:normalize=0,aformat=channel_layouts=stereo[speech];"
+        f"anullsrc=r=44100:cl=stereo,atrim=duration={tail}[tail];"
+        f"[lead][speech][tail]concat=n=3:v=0:a=1[out]"
+    )
+    run_ffmpeg(["-loglevel", "error", "-filter_complex", graph, "-map", "[out]",
+                "-c:a", "libmp3lame", "-b:a", "128k", "-y", str(path)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 30, 60])
+    parser.add_argument("--lead", type=float, default=20.0, help="Silêncio (espera) no início, em segundos")
+    parser.add_argument("--tail", type=float, default=15.0, help="Silêncio no fim, em segundos")
+    args = parser.parse_args()
+
+    expected = args.lead + args.tail - 2 * TRIM_PADDING_SECONDS
+    print(f"{'min':>5} {'original MB':>12} {'enviado MB':>11} {'cortado s':>10} {'esperado s':>11} "
+          f"{'tempo s':>8} {'pico Python MB':>15} {'RSS MB':>7} {'vad ms':>7}")
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="monitorai-preprocess-") as tmp:
+        for minutes in args.minutes:
+            path = Path(tmp) / f"ligacao_{minutes:g}min.mp3"
+            make_recording(path, minutes, args.lead, args.tail)
+            tracemalloc.start()
+            started = time.perf_counter()
+            with prepare_audio(path) as prepared:
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                stats = prepared.stats
+                sent = os.path.getsize(prepared.path)
+                started = time.perf_counter()
+                tempos = timing_metrics(prepared.levels)
+                vad_ms = (time.perf_counter() - started) * 1000
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{minutes:>5g} {stats['bytes_originais'] / 2**20:>12.1f} {sent / 2**20:>11.2f} "
+                  f"{stats['segundos_economizados']:>10.1f} {expected:>11.1f} {elapsed:>8.1f} "
+                  f"{peak / 2**20:>15.1f} {rss:>7.0f} {vad_ms:>7.1f}")
+            ok = (ok and sent < stats["bytes_originais"] and abs(stats["segundos_economizados"] - expected) < 1.0
+                  and abs(tempos["primeira_fala_s"] - args.lead) < 0.5)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
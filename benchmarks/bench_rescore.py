@@ -0,0 +1,102 @@
+"""Reavaliação em massa pela Batch API (monitorai.rescore) de ponta a ponta contra o stub local.
+
+Uso:
+    python benchmarks/bench_rescore.py [--calls 2000] [--engine unico|grupos] [--failure-rate 0.01]
+
+Gera `--calls` transcrições a partir das fixtures e roda o fluxo completo do comando
+(`python -m monitorai.rescore`): compilação dos arquivos de requisição, envio, acompanhamento e
+leitura em streaming dos resultados. O envio é feito com --no-wait e o comando é reexecutado em
+seguida, como numa retomada. Mede:
+- tempo de compilação e tamanho dos arquivos de requisição;
+- ligações reavaliadas, erros (falhas injetadas pelo stub) e conferência com o esperado;
+- custo estimado dos tokens pela Batch API (50% do preço) x chamadas síncronas.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_server import StubConfig, start_stub  # noqa: E402
+
+from monitorai import rescore  # noqa: E402
+from monitorai.telemetry import estimate_cost  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "transcricoes.jsonl"
+BATCH_DISCOUNT = 0.5
+
+
+def write_source(path, calls):
+    with open(FIXTURES, encoding="utf-8") as f:
+        fixtures = [json.loads(line) for line in f if line.strip()]
+    with open(path, "w", encoding="utf-8") as out:
+        for index in range(calls):
+            fixture = fixtures[index % len(fixtures)]
+            out.write(json.dumps({"id": f"ligacao-{index:06d}", "status": "ok", "transcricao": fixture["transcricao"],
+                                  "metadados": {"agente": f"agente-{index % 20:02d}"}}, ensure_ascii=False) + "\n")
+
+
+def token_usage(config):
+    """Tokens de entrada e saída de todas as linhas respondidas pelo stub"""
+    prompt = completion = 0
+    for entry in config.files.values():
+        if entry["purpose"] != "batch_output":
+            continue
+        for line in entry["data"].decode("utf-8").splitlines():
+            usage = ((json.loads(line).get("response") or {}).get("body") or {}).get("usage")
+            if usage:
+                prompt += usage["prompt_tokens"]
+                completion += usage["completion_tokens"]
+    return prompt, completion
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--engine", choices=[rescore.ENGINE_SINGLE, rescore.ENGINE_GROUPS], default=rescore.ENGINE_SINGLE)
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="Fração das linhas que o stub devolve com erro")
+    parser.add_argument("--max-requests-per-file", type=int, default=5000)
+    args = parser.parse_args()
+
+    config = StubConfig(completion_tokens=800, batch_latency=0.5, batch_failure_rate=args.failure_rate)
+    server, base_url = start_stub(config)
+    os.environ.update(OPENAI_API_KEY="sk-bench", OPENAI_BASE_URL=base_url)
+    with tempfile.TemporaryDirectory(prefix="monitorai-rescore-") as tmp:
+        source, work_dir, output = Path(tmp) / "entrada.jsonl", Path(tmp) / "trabalho", Path(tmp) / "saida.jsonl"
+        write_source(source, args.calls)
+        argv = [str(source), "--work-dir", str(work_dir), "--output", str(output), "--engine", args.engine,
+                "--poll-interval", "0.2", "--max-requests-per-file", str(args.max_requests_per_file),
+                "--store", str(Path(tmp) / "resultados.sqlite")]
+
+        started = time.perf_counter()
+        rescore.main(argv + ["--no-wait"])
+        submitted = time.perf_counter() - started
+        state = rescore.load_state(work_dir)
+        started = time.perf_counter()
+        rescore.main(argv)
+        collected = time.perf_counter() - started
+
+        records = [json.loads(line) for line in open(output, encoding="utf-8")]
+        ok = sum(record["status"] == "ok" for record in records)
+        size = sum(entry["bytes"] for entry in state["arquivos"])
+        requests = sum(entry["requisicoes"] for entry in state["arquivos"])
+        print(f"\ncompilação e envio: {submitted:.2f} s, {requests} requisições em {len(state['arquivos'])} arquivo(s), "
+              f"{size / 2**20:.1f} MiB")
+        print(f"acompanhamento e coleta: {collected:.2f} s")
+        print(f"ligações: {len(records)} de {args.calls} ({ok} ok, {len(records) - ok} com erro)")
+
+        prompt, completion = token_usage(config)
+        sync_cost = estimate_cost("gpt-4o", prompt, completion)
+        print(f"tokens: {prompt:,} de entrada, {completion:,} de saída; custo estimado "
+              f"US$ {sync_cost * BATCH_DISCOUNT:.2f} pela Batch API x US$ {sync_cost:.2f} síncrono")
+    server.shutdown()
+    return 0 if len(records) == args.calls and ok > 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Acurácia, cobertura e vazão do pré-avaliador local (monitorai.rules).
+
+Uso:
+    python benchmarks/bench_rules.py [--repeat 2000]
+
+Acurácia é medida somente nos itens que as regras decidem (os demais vão para o modelo); cobertura
+é a fração de itens decididos localmente. Sai com erro se alguma decisão local estiver errada.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitorai.rules import RULES, prescore  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "transcricoes.jsonl"
+
+
+def load_fixtures(path=FIXTURES):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000, help="Passadas sobre o corpus na medição de vazão")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    corpus = load_fixtures()
+
+    stats = {item: {"decididos": 0, "corretos": 0, "total": 0} for item in RULES}
+    errors = []
+    for fixture in corpus:
+        results = prescore(fixture["transcricao"])
+        for item, result in results.items():
+            expected = fixture["esperado"].get(str(item))
+            if expected is None:
+                continue
+            stats[item]["total"] += 1
+            if result["resposta"] is None:
+                continue
+            stats[item]["decididos"] += 1
+            if result["resposta"] == expected:
+                stats[item]["corretos"] += 1
+            else:
+                errors.append((fixture["id"], item, result["resposta"], expected, result["justificativa"]))
+            if args.verbose:
+                print(f"{fixture['id']:<24} item {item:>2}: {result['resposta']:<4} {result['justificativa']}")
+
+    print(f"{'item':>4} {'cobertura':>10} {'acurácia':>9}")
+    for item, s in stats.items():
+        coverage = s["decididos"] / s["total"] if s["total"] else 0
+        accuracy = s["corretos"] / s["decididos"] if s["decididos"] else 1
+        print(f"{item:>4} {coverage:>9.0%} {accuracy:>9.0%}")
+    for fixture_id, item, got, expected, why in errors:
+        print(f"ERRO {fixture_id} item {item}: {got} (esperado {expected}) — {why}")
+
+    texts = [fixture["transcricao"] for fixture in corpus]
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            prescore(text)
+    elapsed = time.perf_counter() - started
+    count = args.repeat * len(texts)
+    print(f"vazão: {count / elapsed:,.0f} transcrições/s ({elapsed / count * 1000:.3f} ms por transcrição)")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
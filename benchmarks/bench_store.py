@@ -0,0 +1,168 @@
+"""Gravação em lote e consultas do painel no banco de resultados (monitorai.store) com muitas chamadas.
+
+Uso:
+    python benchmarks/bench_store.py [--calls 100000] [--agents 200] [--weeks 52]
+
+Mede:
+- gravação: add() por chamada (uma transação cada) x add_many() em lotes de 1000;
+- consultas do painel (por agente/semana, grupos, eliminatórios, distribuição de pontuação), sem
+  filtro e com filtro de agentes e semanas: agregados incrementais x GROUP BY sobre as tabelas
+  normalizadas;
+- conferência: os agregados incrementais (com 1% das chamadas substituídas) são iguais aos
+  recalculados do zero por rebuild_rollups().
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitorai.scoring import CRITERIOS_ELIMINATORIOS, GRUPOS, ITENS, group_done, total_percentual  # noqa: E402
+from monitorai.store import INSERT_BATCH, ResultsStore  # noqa: E402
+
+# Mesmo resultado das consultas do painel, calculado direto das tabelas normalizadas
+NAIVE_QUERIES = {
+    "agente_semana": "SELECT agente, semana, COUNT(*), COUNT(pontuacao), COALESCE(SUM(pontuacao), 0) FROM chamadas{where} GROUP BY agente, semana",
+    "grupos": "SELECT g.grupo, COUNT(*), SUM(g.feito) FROM grupos g JOIN chamadas c ON c.id = g.chamada_id{where_c} GROUP BY g.grupo",
+    "eliminatorios": "SELECT e.criterio_id, COUNT(*), SUM(e.ocorreu) FROM eliminatorios e JOIN chamadas c ON c.id = e.chamada_id{where_c} GROUP BY e.criterio_id",
+    "pontuacao": "SELECT pontuacao, COUNT(*) FROM chamadas{where} GROUP BY pontuacao",
+}
+
+
+def synthetic_analysis(rng, skill):
+    """Análise no formato da rubrica; `skill` é a chance de cada item ser "sim" para o agente"""
+    checklist = [
+        {"item": numero, "grupo": item["grupo"], "criterio": item["criterio"],
+         "resposta": "sim" if rng.random() < skill else "não", "justificativa": "Justificativa do item."}
+        for numero, item in ITENS.items()
+    ]
+    grupos = []
+    for grupo in GRUPOS:
+        itens = [item for item in checklist if item["grupo"] == grupo["grupo"]]
+        feito = group_done(grupo, itens) if grupo["itens"] else rng.random() < skill
+        grupos.append({"grupo": grupo["grupo"], "nome": grupo["nome"], "percentual": grupo["percentual"],
+                       "feito": feito, "justificativa": "Justificativa do grupo."})
+    return {
+        "status_final": {"satisfacao": rng.choice(["satisfeito", "neutro", "insatisfeito"]), "risco": "baixo", "desfecho": "resolvido"},
+        "grupos_avaliacao": grupos,
+        "checklist_detalhado": checklist,
+        "criterios_eliminatorios": [
+            {"criterio": c, "ocorreu": rng.random() < 0.03, "justificativa": "..."} for c in CRITERIOS_ELIMINATORIOS
+        ],
+        "pontuacao_total_percentual": total_percentual(grupos),
+        "resumo_geral": "Resumo do atendimento.",
+    }
+
+
+def synthetic_records(count, agents, weeks, seed=0):
+    rng = random.Random(seed)
+    skills = [rng.uniform(0.6, 0.97) for _ in range(agents)]
+    start = date.today() - timedelta(weeks=weeks)
+    for index in range(count):
+        agent = rng.randrange(agents)
+        yield {
+            "chave": f"chamada-{index}",
+            "analise": synthetic_analysis(rng, skills[agent]),
+            "agente": f"agente-{agent:03d}",
+            "data": (start + timedelta(days=rng.randrange(weeks * 7))).isoformat(),
+            "origem": "bench",
+        }
+
+
+def dashboard(store, **filters):
+    return (
+        store.by_agent_week(**filters),
+        store.group_pass_rates(**filters),
+        store.eliminatory_frequencies(**filters),
+        store.score_distribution(**filters),
+    )
+
+
+def naive_dashboard(path, agentes=None, semana_inicio=None, semana_fim=None):
+    clauses, params = [], []
+    if agentes:
+        clauses.append(f"agente IN ({', '.join('?' * len(agentes))})")
+        params.extend(agentes)
+    if semana_inicio:
+        clauses.append("semana >= ?")
+        params.append(semana_inicio)
+    if semana_fim:
+        clauses.append("semana <= ?")
+        params.append(semana_fim)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    conn = sqlite3.connect(path)
+    try:
+        return [
+            conn.execute(sql.format(where=where, where_c=where.replace("agente", "c.agente").replace("semana", "c.semana")), params).fetchall()
+            for sql in NAIVE_QUERIES.values()
+        ]
+    finally:
+        conn.close()
+
+
+def timed(func, *args, runs=5, **kwargs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append(time.perf_counter() - started)
+    return sorted(samples)[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--single", type=int, default=1000, help="Chamadas gravadas uma a uma para comparação")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="monitorai-store-") as tmp:
+        single = ResultsStore(Path(tmp) / "unitario.sqlite")
+        records = list(synthetic_records(args.single, args.agents, args.weeks, seed=1))
+        started = time.perf_counter()
+        for record in records:
+            single.add(record["chave"], record["analise"], agente=record["agente"], data=record["data"])
+        per_call = args.single / (time.perf_counter() - started)
+
+        store = ResultsStore(Path(tmp) / "resultados.sqlite")
+        records = list(synthetic_records(args.calls, args.agents, args.weeks))
+        started = time.perf_counter()
+        for start in range(0, len(records), INSERT_BATCH):
+            store.add_many(records[start:start + INSERT_BATCH])
+        bulk = args.calls / (time.perf_counter() - started)
+        print(f"gravação: {per_call:,.0f} chamadas/s uma a uma, {bulk:,.0f} chamadas/s em lotes de {INSERT_BATCH}")
+
+        # Substitui 1% das chamadas (reavaliação) para exercitar o desconto nos agregados
+        rng = random.Random(2)
+        replaced = [dict(record, analise=synthetic_analysis(rng, 0.5)) for record in rng.sample(records, len(records) // 100)]
+        store.add_many(replaced)
+
+        agents = store.agents()
+        weeks = store.weeks()
+        scenarios = {
+            "sem filtro": {},
+            "10 agentes, 12 semanas": {"agentes": agents[:10], "semana_inicio": weeks[-12], "semana_fim": weeks[-1]},
+        }
+        print(f"\n{store.count():,} chamadas, {len(agents)} agentes, {len(weeks)} semanas")
+        print(f"{'painel':<24} {'agregados ms':>13} {'GROUP BY ms':>12}")
+        for name, filters in scenarios.items():
+            rollup = timed(dashboard, store, **filters)
+            naive = timed(naive_dashboard, store.path, runs=3, **filters)
+            print(f"{name:<24} {rollup:>13.1f} {naive:>12.1f}")
+
+        incremental = dashboard(store)
+        store.rebuild_rollups()
+        consistent = incremental == dashboard(store)
+        print(f"\nagregados incrementais == recalculados: {consistent}")
+    return 0 if consistent else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
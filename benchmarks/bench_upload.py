@@ -0,0 +1,104 @@
+"""Pegada de memória e disco ao copiar uploads grandes para disco.
+
+Uso:
+    python benchmarks/bench_upload.py --size-mb 150
+
+Compara a cópia antiga (read() inteiro + NamedTemporaryFile sem remoção) com spool_upload e
+confere que nenhum arquivo temporário sobra depois do cleanup().
+"""
+
+import argparse
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitorai.uploads import spool_upload  # noqa: E402
+
+
+class FakeUpload(io.RawIOBase):
+    """Arquivo sintético de `size` bytes, gerado sob demanda (não ocupa memória)"""
+
+    def __init__(self, size):
+        self.size = size
+        self.pos = 0
+        self.name = "gravacao.mp3"
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.pos = offset if whence == io.SEEK_SET else self.size + offset
+        return self.pos
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self.size - self.pos)
+        buffer[:n] = b"\xff" * n
+        self.pos += n
+        return n
+
+
+def temp_files():
+    return {p for p in Path(tempfile.gettempdir()).glob("tmp*.mp3")}
+
+
+def measure(label, func):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} pico={peak / 2**20:8.1f} MiB  tempo={elapsed:6.2f}s")
+    return peak
+
+
+def legacy_copy(upload):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
+        tmp.write(upload.read())
+        return tmp.name
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=150)
+    parser.add_argument("--reruns", type=int, default=3, help="Reexecuções simuladas do script")
+    args = parser.parse_args()
+    size = args.size_mb * 2**20
+    before = temp_files()
+
+    legacy_paths = []
+    legacy_peak = measure("read() + NamedTemporaryFile", lambda: [
+        legacy_paths.append(legacy_copy(FakeUpload(size))) for _ in range(args.reruns)
+    ])
+    leaked = len(temp_files() - before)
+    print(f"  arquivos temporários deixados: {leaked} ({leaked * args.size_mb} MiB)")
+    for path in legacy_paths:
+        os.remove(path)
+
+    uploads = []
+    spool_peak = measure("spool_upload (blocos)", lambda: uploads.append(spool_upload(FakeUpload(size))))
+    assert uploads[0].size == size
+    for upload in uploads:
+        upload.cleanup()
+    leaked = len(temp_files() - before)
+    print(f"  arquivos temporários deixados: {leaked}")
+
+    print(f"Redução do pico de memória: {legacy_peak / max(spool_peak, 1):.0f}x")
+    if leaked or spool_peak > 16 * 2**20:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,449 @@
+"""Servidor local compatível com a API da OpenAI para benchmarks (sem rede e sem custo).
+
+Uso:
+    python benchmarks/stub_server.py [--port 8765] [--latency 0.5] [--tokens-per-s 80] [--malformed-rate 0.1]
+
+e aponte o app ou o lote para ele com OPENAI_BASE_URL=http://127.0.0.1:8765/v1 (qualquer chave serve).
+
+Atende:
+- POST /v1/audio/transcriptions: transcrição sintética (trechos das fixtures) com `transcript_words`
+  palavras; segmentos com tempos quando response_format=verbose_json (e palavras com tempos se
+  timestamp_granularities pedir "word").
+- POST /v1/chat/completions: avaliação no formato da rubrica, com e sem stream. Reconhece as tarefas
+  do motor por grupo (grupo, critérios eliminatórios, resumo), o modo compacto e os pedidos de
+  justificativas (monitorai.compact), e responde só o trecho pedido.
+- Batch API: POST /v1/files, GET /v1/files/{id} e /v1/files/{id}/content, POST /v1/batches e
+  GET /v1/batches/{id}. Os jobs ficam "in_progress" por `batch_latency` segundos e depois respondem
+  cada linha como o chat completions; uma fração `batch_failure_rate` das linhas vai para o arquivo
+  de erros.
+
+Latência simulada: `latency` segundos até o primeiro token e `completion_tokens` tokens a
+`tokens_per_s` (ou a `model_tokens_per_s[modelo]`). Uma fração `malformed_rate` das respostas sai com
+JSON malformado (truncado, entre cercas ``` ou com vírgula sobrando).
+
+Conjunto rotulado (benchmarks/bench_cascade.py): na análise completa, as transcrições de `labels`
+({transcrição: {"4": "sim", ...}}) recebem as respostas rotuladas. Os erros de cada modelo são
+de dois tipos, e ambos também podem marcar um critério eliminatório inexistente:
+- `model_error_rates` ({modelo: taxa}): erros sistemáticos, sorteados por modelo e transcrição, que
+  se repetem a cada chamada;
+- `model_noise_rates`: erros avulsos, sorteados a cada resposta. Em processo, use start_stub(StubConfig(...)); os campos da
+configuração podem ser alterados com o servidor no ar.
+"""
+
+import argparse
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from monitorai.scoring import CRITERIOS_ELIMINATORIOS, GRUPOS, ITENS  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "transcricoes.jsonl"
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_TOKENS = 4
+
+_GROUP_TASK_RE = re.compile(r"TAREFA: avalie APENAS o GRUPO ([A-F])")
+_JUSTIFY_TARGET_RE = re.compile(r"^- ((?:item|grupo|eliminatorio):\w+): ", re.MULTILINE)
+_TRANSCRIPT_RE = re.compile(r'TRANSCRIÇÃO:\n"""(.*?)"""', re.DOTALL)
+
+
+class StubConfig:
+    """Parâmetros do servidor (todos podem ser alterados enquanto ele atende)"""
+
+    def __init__(self, latency=0.0, tokens_per_s=0.0, completion_tokens=1500, transcription_latency=0.0,
+                 transcript_words=1200, malformed_rate=0.0, seed=1, batch_latency=1.0, batch_failure_rate=0.0,
+                 model_tokens_per_s=None, model_error_rates=None, model_noise_rates=None, labels=None):
+        self.latency = latency
+        self.tokens_per_s = tokens_per_s
+        self.completion_tokens = completion_tokens
+        self.transcription_latency = transcription_latency
+        self.transcript_words = transcript_words
+        self.malformed_rate = malformed_rate
+        self.batch_latency = batch_latency
+        self.batch_failure_rate = batch_failure_rate
+        self.model_tokens_per_s = model_tokens_per_s or {}
+        self.model_error_rates = model_error_rates or {}
+        self.model_noise_rates = model_noise_rates or {}
+        self.labels = {text.strip(): expected for text, expected in (labels or {}).items()}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {"transcriptions": 0, "chat": 0, "malformed": 0, "files": 0, "batches": 0}
+        self.files = {}
+        self.batches = {}
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+    def chance(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+
+def _corpus_words():
+    with open(FIXTURES, encoding="utf-8") as f:
+        return " ".join(json.loads(line)["transcricao"] for line in f if line.strip()).split()
+
+
+_WORDS = _corpus_words()
+
+
+def synthetic_transcript(words):
+    return " ".join(_WORDS[i % len(_WORDS)] for i in range(words))
+
+
+def _padding(text, tokens):
+    """Texto de justificativa com aproximadamente `tokens` tokens"""
+    filler = "A agente conduziu o atendimento conforme o roteiro e confirmou os dados do cliente. "
+    size = max(tokens * CHARS_PER_TOKEN - len(text), 0)
+    return text + (filler * (size // len(filler) + 1))[:size]
+
+
+def _answer(seed, numero):
+    return "sim" if (seed + numero) % 4 else "não"
+
+
+def full_analysis(tokens, seed=0):
+    """Análise completa (prompt único) com aproximadamente `tokens` tokens de saída"""
+    per_field = max(tokens // (len(GRUPOS) + len(ITENS) + 2), 10)
+    checklist = [
+        {"item": numero, "grupo": item["grupo"], "criterio": item["criterio"], "resposta": _answer(seed, numero),
+         "justificativa": _padding(f"Item {numero}: ", per_field)}
+        for numero, item in ITENS.items()
+    ]
+    grupos = []
+    for grupo in GRUPOS:
+        itens = [item for item in checklist if item["grupo"] == grupo["grupo"]]
+        feito = all(item["resposta"] == "sim" for item in itens) if itens else (seed + len(grupo["nome"])) % 3 != 0
+        grupos.append({"grupo": grupo["grupo"], "nome": grupo["nome"], "percentual": grupo["percentual"],
+                       "feito": feito, "justificativa": _padding(f"Grupo {grupo['grupo']}: ", per_field)})
+    return {
+        "status_final": {"satisfacao": "satisfeito", "risco": "baixo", "desfecho": "resolvido"},
+        "grupos_avaliacao": grupos,
+        "checklist_detalhado": checklist,
+        "criterios_eliminatorios": [{"criterio": c, "ocorreu": False, "justificativa": "Não ocorreu."} for c in CRITERIOS_ELIMINATORIOS],
+        "pontuacao_total_percentual": sum(g["percentual"] for g in grupos if g["feito"]),
+        "resumo_geral": _padding("Resumo: ", per_field),
+    }
+
+
+def compact_analysis(prompt, seed=0):
+    """Resposta do modo compacto: veredictos, com trechos da transcrição do prompt como evidência"""
+    analysis = full_analysis(0, seed)
+    match = _TRANSCRIPT_RE.search(prompt)
+    words = match.group(1).split() if match else []
+    return {
+        "status_final": analysis["status_final"],
+        "checklist_detalhado": [
+            {"item": item["item"], "resposta": item["resposta"], "evidencia": " ".join(words[posicao * 40:posicao * 40 + 6])}
+            for posicao, item in enumerate(analysis["checklist_detalhado"])
+        ],
+        "grupos_avaliacao": [{"grupo": g["grupo"], "feito": g["feito"]} for g in analysis["grupos_avaliacao"] if g["grupo"] in "EF"],
+        "criterios_eliminatorios": [{"criterio": c["criterio"], "ocorreu": False} for c in analysis["criterios_eliminatorios"]],
+        "resumo_geral": "Atendimento conduzido conforme o roteiro, com o cliente satisfeito.",
+    }
+
+
+def task_answer(prompt, tokens, seed=0):
+    """Resposta no formato pedido pelo prompt (tarefas do motor por grupo, justificativas, modo compacto ou análise completa)"""
+    targets = _JUSTIFY_TARGET_RE.findall(prompt) if "TAREFA: a avaliação desta ligação já foi feita" in prompt else []
+    if targets:
+        per_field = max(tokens // (len(GRUPOS) + len(ITENS) + 2), 10)
+        return {"justificativas": {target: _padding(f"{target}: ", per_field) for target in targets}}
+    if "SEM justificativas" in prompt:
+        return compact_analysis(prompt, seed)
+    analysis = full_analysis(tokens, seed)
+    match = _GROUP_TASK_RE.search(prompt)
+    if match:
+        letra = match.group(1)
+        grupo = next(g for g in analysis["grupos_avaliacao"] if g["grupo"] == letra)
+        itens = [item for item in analysis["checklist_detalhado"] if item["grupo"] == letra]
+        if itens:
+            pedidos = {int(n) for n in re.findall(r"\d+", prompt[match.end():].split("\n", 2)[1])} or {i["item"] for i in itens}
+            return {"checklist_detalhado": [i for i in itens if i["item"] in pedidos], "justificativa": grupo["justificativa"]}
+        return {"feito": grupo["feito"], "justificativa": grupo["justificativa"]}
+    if "TAREFA: avalie APENAS os CRITÉRIOS ELIMINATÓRIOS" in prompt:
+        return {"criterios_eliminatorios": analysis["criterios_eliminatorios"]}
+    if "TAREFA: informe APENAS o status final" in prompt:
+        return {"status_final": analysis["status_final"], "resumo_geral": analysis["resumo_geral"]}
+    return analysis
+
+
+def labelled_analysis(config, analysis, prompt, model):
+    """Análise completa com os rótulos da transcrição e os erros simulados do modelo"""
+    match = _TRANSCRIPT_RE.search(prompt)
+    transcript = match.group(1).strip() if match else ""
+    expected = config.labels.get(transcript, {})
+    rate = config.model_error_rates.get(model, 0.0)
+    noise = config.model_noise_rates.get(model, 0.0)
+    systematic = random.Random(f"{model}:{transcript}")
+    checklist = analysis["checklist_detalhado"]
+    for item in checklist:
+        resposta = expected.get(str(item["item"]), item["resposta"])
+        if (systematic.random() < rate) != config.chance(noise):
+            resposta = "não" if resposta == "sim" else "sim"
+        item["resposta"] = resposta
+    if systematic.random() < rate or config.chance(noise):
+        criterio = analysis["criterios_eliminatorios"][systematic.randrange(len(CRITERIOS_ELIMINATORIOS))]
+        criterio.update(ocorreu=True, justificativa="Ocorreu.")
+    for grupo in analysis["grupos_avaliacao"]:
+        itens = [item for item in checklist if item["grupo"] == grupo["grupo"]]
+        if itens:
+            grupo["feito"] = all(item["resposta"] == "sim" for item in itens)
+    analysis["pontuacao_total_percentual"] = sum(g["percentual"] for g in analysis["grupos_avaliacao"] if g["feito"])
+    return analysis
+
+
+def chat_result(config, request):
+    """(conteúdo, usage) da resposta a um pedido de chat completions"""
+    prompt = request["messages"][-1]["content"]
+    answer = task_answer(prompt, config.completion_tokens, seed=len(prompt))
+    if "grupos_avaliacao" in answer and "checklist_detalhado" in answer and "pontuacao_total_percentual" in answer:
+        answer = labelled_analysis(config, answer, prompt, request.get("model"))
+    content = json.dumps(answer, ensure_ascii=False, indent=2)
+    if config.chance(config.malformed_rate):
+        config.count("malformed")
+        content = malform(content, config.random)
+    usage = {"prompt_tokens": len(prompt) // CHARS_PER_TOKEN, "completion_tokens": len(content) // CHARS_PER_TOKEN}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return content, usage
+
+
+def completion_body(model, content, usage):
+    return {
+        "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": usage,
+    }
+
+
+def _file_object(file_id, entry):
+    return {"id": file_id, "object": "file", "bytes": len(entry["data"]), "created_at": entry["created_at"],
+            "filename": entry["filename"], "purpose": entry["purpose"], "status": "processed"}
+
+
+def store_file(config, data, filename, purpose):
+    with config.lock:
+        file_id = f"file-stub{len(config.files) + 1}"
+        config.files[file_id] = {"data": data, "filename": filename, "purpose": purpose, "created_at": int(time.time())}
+    return file_id
+
+
+def run_batch(config, batch_id):
+    """Processa as linhas do arquivo de entrada depois de `batch_latency` segundos"""
+    time.sleep(config.batch_latency)
+    batch = config.batches[batch_id]
+    outputs, errors = [], []
+    for line in config.files[batch["input_file_id"]]["data"].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if config.chance(config.batch_failure_rate):
+            errors.append({"id": f"batch_req_{len(errors)}", "custom_id": request["custom_id"], "response": None,
+                           "error": {"code": "server_error", "message": "falha simulada"}})
+            continue
+        content, usage = chat_result(config, request["body"])
+        outputs.append({"id": f"batch_req_{len(outputs)}", "custom_id": request["custom_id"], "error": None,
+                        "response": {"status_code": 200, "request_id": "req-stub",
+                                     "body": completion_body(request["body"]["model"], content, usage)}})
+    encode = lambda lines: "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in lines).encode("utf-8")  # noqa: E731
+    batch["output_file_id"] = store_file(config, encode(outputs), f"{batch_id}_output.jsonl", "batch_output") if outputs else None
+    batch["error_file_id"] = store_file(config, encode(errors), f"{batch_id}_error.jsonl", "batch_output") if errors else None
+    batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+def malform(content, rng):
+    """JSON estragado de um dos jeitos que o modelo costuma estragar"""
+    kind = rng.randrange(3)
+    if kind == 0:
+        return content[: rng.randrange(len(content) // 2, len(content))]
+    if kind == 1:
+        return "```json\n" + content + "\n```"
+    return content.replace("}", ",}", 1)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def setup(self):
+        super().setup()
+        # Cabeçalhos e corpo saem em escritas separadas: sem isso o Nagle atrasa conexões reaproveitadas
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/audio/transcriptions"):
+            self.transcription(body)
+        elif self.path.endswith("/chat/completions"):
+            self.chat(json.loads(body))
+        elif self.path.endswith("/files"):
+            self.upload(body)
+        elif self.path.endswith("/batches"):
+            self.create_batch(json.loads(body))
+        else:
+            self.not_found()
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        config = self.config
+        if len(parts) >= 3 and parts[-2] == "files" and parts[-1] in config.files:
+            self.send_json(_file_object(parts[-1], config.files[parts[-1]]))
+        elif len(parts) >= 4 and parts[-3] == "files" and parts[-1] == "content" and parts[-2] in config.files:
+            self.send_bytes(config.files[parts[-2]]["data"], "application/octet-stream")
+        elif len(parts) >= 3 and parts[-2] == "batches" and parts[-1] in config.batches:
+            self.send_json(config.batches[parts[-1]])
+        else:
+            self.not_found()
+
+    def not_found(self):
+        self.send_json({"error": {"message": f"rota não simulada: {self.command} {self.path}"}}, status=404)
+
+    def send_json(self, payload, status=200):
+        self.send_bytes(json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json", status)
+
+    def send_bytes(self, data, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def upload(self, body):
+        # multipart/form-data com os campos "purpose" e "file"
+        message = BytesParser(policy=default_policy).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("latin-1") + body
+        )
+        fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+        self.config.count("files")
+        file_part = fields["file"]
+        file_id = store_file(self.config, file_part.get_payload(decode=True), file_part.get_filename() or "upload.jsonl",
+                             fields["purpose"].get_content().strip())
+        self.send_json(_file_object(file_id, self.config.files[file_id]))
+
+    def create_batch(self, request):
+        config = self.config
+        if request.get("input_file_id") not in config.files:
+            self.send_json({"error": {"message": "input_file_id desconhecido"}}, status=400)
+            return
+        config.count("batches")
+        with config.lock:
+            batch_id = f"batch_stub{len(config.batches) + 1}"
+            config.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request["endpoint"], "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"], "status": "in_progress", "created_at": int(time.time()),
+                "metadata": request.get("metadata"), "output_file_id": None, "error_file_id": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+        threading.Thread(target=run_batch, args=(config, batch_id), daemon=True).start()
+        self.send_json(config.batches[batch_id])
+
+    def transcription(self, body):
+        config = self.config
+        config.count("transcriptions")
+        time.sleep(config.transcription_latency)
+        text = synthetic_transcript(config.transcript_words)
+        payload = {"text": text}
+        if b"verbose_json" in body:
+            words = text.split()
+            payload.update({"language": "portuguese", "duration": len(words) * 0.4, "segments": [
+                {"id": i // 20, "start": i * 0.4, "end": min(i + 20, len(words)) * 0.4, "text": " ".join(words[i:i + 20])}
+                for i in range(0, len(words), 20)
+            ]})
+            if b"\r\n\r\nword\r\n" in body:
+                payload["words"] = [{"word": word, "start": i * 0.4, "end": (i + 1) * 0.4} for i, word in enumerate(words)]
+        self.send_json(payload)
+
+    def chat(self, request):
+        config = self.config
+        config.count("chat")
+        content, usage = chat_result(config, request)
+        time.sleep(config.latency)
+        tokens_per_s = config.model_tokens_per_s.get(request["model"], config.tokens_per_s)
+        if request.get("stream"):
+            self.stream(request["model"], content, usage, request.get("stream_options"), tokens_per_s)
+            return
+        if tokens_per_s:
+            time.sleep(usage["completion_tokens"] / tokens_per_s)
+        self.send_json(completion_body(request["model"], content, usage))
+
+    def stream(self, model, content, usage, stream_options, tokens_per_s):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = STREAM_CHUNK_TOKENS * CHARS_PER_TOKEN
+        delay = STREAM_CHUNK_TOKENS / tokens_per_s if tokens_per_s else 0
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for start in range(0, len(content), step):
+            self.send_event({**base, "choices": [{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}]})
+            time.sleep(delay)
+        self.send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if stream_options and stream_options.get("include_usage"):
+            self.send_event({**base, "choices": [], "usage": usage})
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def send_event(self, payload):
+        self.send_chunk(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub(config=None, host="127.0.0.1", port=0):
+    """Sobe o servidor numa thread; devolve (servidor, URL base para OPENAI_BASE_URL)"""
+    config = config or StubConfig()
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos até o primeiro token")
+    parser.add_argument("--tokens-per-s", type=float, default=0.0, help="Velocidade de geração (0 = instantâneo)")
+    parser.add_argument("--completion-tokens", type=int, default=1500)
+    parser.add_argument("--transcription-latency", type=float, default=0.0)
+    parser.add_argument("--transcript-words", type=int, default=1200)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-latency", type=float, default=1.0, help="Segundos até um job da Batch API terminar")
+    parser.add_argument("--batch-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config = StubConfig(
+        latency=args.latency, tokens_per_s=args.tokens_per_s, completion_tokens=args.completion_tokens,
+        transcription_latency=args.transcription_latency, transcript_words=args.transcript_words,
+        malformed_rate=args.malformed_rate, seed=args.seed, batch_latency=args.batch_latency,
+        batch_failure_rate=args.batch_failure_rate,
+    )
+    server, base_url = start_stub(config, args.host, args.port)
+    print(f"stub da OpenAI em {base_url} (Ctrl+C para sair)", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""MonitorAI: avaliação de atendimentos por grupos, compartilhada entre o app Streamlit e o modo em lote."""
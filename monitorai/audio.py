@@ -0,0 +1,72 @@
+"""Utilitários de áudio baseados no ffmpeg (binário do sistema, ver packages.txt)."""
+
+import os
+import re
+import subprocess
+
+FFMPEG = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_SILENCE_START_RE = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+_SILENCE_END_RE = re.compile(r"silence_end: (-?\d+(?:\.\d+)?)")
+
+
+class AudioError(RuntimeError):
+    """Falha ao processar o áudio com o ffmpeg"""
+
+
+def run_ffmpeg(args):
+    """Executa o ffmpeg e devolve o stderr (onde ficam os logs dos filtros)"""
+    try:
+        completed = subprocess.run(
+            [FFMPEG, "-hide_banner", "-nostdin", *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+    except FileNotFoundError as error:
+        raise AudioError(f"ffmpeg não encontrado ({FFMPEG}); instale-o ou defina FFMPEG_BINARY") from error
+    stderr = completed.stderr.decode("utf-8", errors="replace")
+    if completed.returncode != 0:
+        raise AudioError(stderr.strip().splitlines()[-1] if stderr.strip() else "ffmpeg falhou")
+    return stderr
+
+
+def detect_silences(path, noise_db=-35, min_silence=0.5):
+    """Duração total e intervalos de silêncio (início, fim) em segundos, numa única leitura do arquivo"""
+    stderr = run_ffmpeg([
+        "-nostats", "-i", str(path),
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-",
+    ])
+    match = _DURATION_RE.search(stderr)
+    if not match:
+        raise AudioError("Não foi possível determinar a duração do áudio")
+    hours, minutes, seconds = match.groups()
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    silences = []
+    start = None
+    for line in stderr.splitlines():
+        started = _SILENCE_START_RE.search(line)
+        if started:
+            start = max(0.0, float(started.group(1)))
+            continue
+        ended = _SILENCE_END_RE.search(line)
+        if ended and start is not None:
+            silences.append((start, float(ended.group(1))))
+            start = None
+    if start is not None:
+        silences.append((start, duration))
+    return duration, silences
+
+
+def extract_segment(path, start, end, out_path):
+    """Copia o trecho [start, end) do áudio para `out_path` sem recodificar"""
+    run_ffmpeg([
+        "-loglevel", "error",
+        "-ss", f"{start:.3f}", "-i", str(path),
+        "-t", f"{end - start:.3f}",
+        "-vn", "-c", "copy", "-y", str(out_path),
+    ])
+    return out_path
@@ -0,0 +1,419 @@
+"""Modo em lote (sem interface): transcreve e avalia um diretório ou manifesto de gravações.
+
+Uso:
+    python -m monitorai.batch gravacoes/ --output resultados.jsonl --pdf-dir relatorios/
+
+Cada ligação concluída vira uma linha no JSONL de saída assim que termina. Ao reexecutar com o
+mesmo arquivo de saída, as ligações já concluídas com sucesso são puladas (retomada após falhas).
+As análises também são gravadas em lote no banco de resultados (monitorai.store), com os campos
+"agente" e "data" do manifesto .jsonl, quando houver.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from monitorai.cache import DiskCache, default_cache_dir, file_sha256
+from monitorai.cascade import CASCADE_RUNS, MARGEM_LIMIAR, cascade_cache_key, escalation_failed, evaluate_cascade_async
+from monitorai.clients import ETAPA_ANALISE, ETAPA_TRANSCRICAO, for_stage, make_async_client
+from monitorai.fanout import FANOUT_VERSION, evaluate_by_group_async
+from monitorai.jsonstream import parse_tolerant
+from monitorai.longaudio import needs_chunking, transcribe_long_async
+from monitorai.pipeline import (
+    analysis_cache_key,
+    finish_transcription,
+    measure_timing,
+    prepare_upload,
+    request_analysis_async,
+    transcribe_audio_async,
+    transcript_cache_key,
+    transcript_params,
+)
+from monitorai.preprocess import PreparedAudio, preprocess_enabled
+from monitorai.prompt import (
+    ENGINE_CASCADE,
+    ENGINE_GROUPS,
+    ENGINE_SINGLE,
+    MODELO_PADRAO,
+    MODELO_RAPIDO,
+    MODELO_TRANSCRICAO,
+    RUBRIC_VERSION,
+    build_prompt,
+    final_model,
+)
+from monitorai.ratelimit import RateLimiter, call_with_retry, estimate_tokens
+from monitorai.store import ResultsStore
+from monitorai.telemetry import ETAPA_AVALIACAO, span, start_metrics_server, telemetry
+
+AUDIO_EXTENSIONS = (".mp3",)
+# Reserva de tokens de saída considerada no limite de TPM de cada avaliação
+COMPLETION_TOKENS_ESTIMATE = 2000
+GROUP_COMPLETION_TOKENS_ESTIMATE = 600
+# Ligações concluídas acumuladas antes de cada gravação em lote no banco de resultados
+STORE_BATCH = 50
+
+
+def load_jobs(source, pattern="*"):
+    """Lista as ligações a processar: diretório (recursivo) ou manifesto .jsonl/.txt"""
+    source = Path(source)
+    jobs = []
+    if source.is_dir():
+        for path in sorted(source.rglob(pattern)):
+            if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS:
+                jobs.append({"id": path.relative_to(source).as_posix(), "path": str(path)})
+        return jobs
+
+    base = source.parent
+    with open(source, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source.suffix.lower() == ".jsonl":
+                entry = json.loads(line)
+            else:
+                entry = {"path": line}
+            path = Path(entry["path"])
+            if not path.is_absolute():
+                path = base / path
+            entry["path"] = str(path)
+            entry.setdefault("id", entry["path"])
+            jobs.append(entry)
+    return jobs
+
+
+def load_completed(output_path):
+    """IDs já concluídos com sucesso no JSONL de saída (linhas truncadas são ignoradas)"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                completed.add(record.get("id"))
+    return completed
+
+
+class ResultWriter:
+    """Acrescenta registros ao JSONL e força a gravação em disco a cada ligação"""
+
+    def __init__(self, output_path):
+        needs_newline = False
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            with open(output_path, "rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                needs_newline = existing.read(1) != b"\n"
+        self._file = open(output_path, "a", encoding="utf-8")
+        if needs_newline:
+            # Linha parcial de uma execução interrompida: começa o próximo registro em linha nova
+            self._file.write("\n")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class BatchRunner:
+    """Pipeline assíncrono com número limitado de ligações em andamento"""
+
+    def __init__(self, client, writer, model=MODELO_PADRAO, concurrency=4, pdf_dir=None,
+                 rpm=None, tpm=None, whisper_rpm=None, max_retries=5, transcript_cache=None,
+                 analysis_cache=None, engine=ENGINE_SINGLE, store=None, preprocess=True, fast_model=MODELO_RAPIDO,
+                 cascade_margin=MARGEM_LIMIAR):
+        self.client = client
+        self.transcription_client = for_stage(client, ETAPA_TRANSCRICAO)
+        self.analysis_client = for_stage(client, ETAPA_ANALISE)
+        self.writer = writer
+        self.model = model
+        self.concurrency = concurrency
+        self.pdf_dir = Path(pdf_dir) if pdf_dir else None
+        self.max_retries = max_retries
+        self.transcript_cache = transcript_cache
+        self.analysis_cache = analysis_cache
+        self.engine = engine
+        self.store = store
+        self.preprocess = preprocess
+        self.fast_model = fast_model
+        self.cascade_margin = cascade_margin
+        self._store_pending = []
+        self._store_lock = asyncio.Lock()
+        self.chat_limiter = RateLimiter(rpm=rpm, tpm=tpm)
+        self.whisper_limiter = RateLimiter(rpm=whisper_rpm)
+        self.ok = 0
+        self.failed = 0
+
+    # Os caches são consultados antes dos limitadores: acertos não consomem cota de RPM/TPM
+    async def transcribe(self, path):
+        """Resultado da transcrição (text, indice, tempos e, com pré-processamento, preprocessamento)"""
+        key = None
+        if self.transcript_cache is not None:
+            started = time.perf_counter()
+            key = transcript_cache_key(await asyncio.to_thread(file_sha256, path), MODELO_TRANSCRICAO,
+                                       transcript_params(self.preprocess))
+            cached = await asyncio.to_thread(self.transcript_cache.get, key)
+            if cached is not None:
+                telemetry.record(ETAPA_TRANSCRICAO, time.perf_counter() - started,
+                                 modelo=MODELO_TRANSCRICAO, cache_hit=True)
+                if "tempos" not in cached:
+                    cached["tempos"] = await asyncio.to_thread(measure_timing, path)
+                    await asyncio.to_thread(self.transcript_cache.set, key, cached)
+                return cached
+        # O ffmpeg roda fora do loop de eventos, em paralelo com as demais ligações
+        prepared = await asyncio.to_thread(prepare_upload, path) if self.preprocess else PreparedAudio(path, None)
+        with prepared:
+            if needs_chunking(prepared.path):
+                with span(ETAPA_TRANSCRICAO, modelo=MODELO_TRANSCRICAO, cache_hit=False, trechos=True) as sp:
+                    result = await transcribe_long_async(
+                        self.transcription_client, prepared.path, MODELO_TRANSCRICAO, concurrency=self.concurrency,
+                        run=lambda make_call: call_with_retry(make_call, limiter=self.whisper_limiter, max_retries=self.max_retries),
+                    )
+                    sp.set(audio_s=result["segments"][-1]["end"] if result["segments"] else 0.0)
+            else:
+                result = await call_with_retry(
+                    lambda: transcribe_audio_async(self.transcription_client, prepared.path, MODELO_TRANSCRICAO),
+                    limiter=self.whisper_limiter,
+                    max_retries=self.max_retries,
+                )
+        finish_transcription(result, prepared)
+        result["tempos"] = await asyncio.to_thread(measure_timing, path, prepared)
+        if key is not None:
+            await asyncio.to_thread(self.transcript_cache.set, key, result)
+        return result
+
+    async def analyze(self, transcript_text, tempos=None, indice=None):
+        key = None
+        # Só o motor por grupo usa o índice de segmentos (janelas de abertura e encerramento)
+        indice = indice if self.engine == ENGINE_GROUPS else None
+        if self.analysis_cache is not None:
+            started = time.perf_counter()
+            if self.engine == ENGINE_CASCADE:
+                key = cascade_cache_key(transcript_text, self.model, self.fast_model, CASCADE_RUNS, self.cascade_margin, tempos)
+            else:
+                version = FANOUT_VERSION if self.engine == ENGINE_GROUPS else RUBRIC_VERSION
+                key = analysis_cache_key(transcript_text, self.model, rubric_version=version, tempos=tempos, indice=indice)
+            cached = await asyncio.to_thread(self.analysis_cache.get, key)
+            if cached is not None:
+                telemetry.record(ETAPA_AVALIACAO, time.perf_counter() - started, modelo=self.model, cache_hit=True)
+                return cached["analysis"]
+        if self.engine == ENGINE_GROUPS:
+            raw, analysis = await evaluate_by_group_async(
+                self.analysis_client, transcript_text, self.model,
+                run=lambda make_call, prompt: call_with_retry(
+                    make_call,
+                    limiter=self.chat_limiter,
+                    tokens=estimate_tokens(prompt) + GROUP_COMPLETION_TOKENS_ESTIMATE,
+                    max_retries=self.max_retries,
+                ),
+                tempos=tempos,
+                indice=indice,
+            )
+        elif self.engine == ENGINE_CASCADE:
+            raw, analysis = await evaluate_cascade_async(
+                self.analysis_client, transcript_text, self.model, self.fast_model, margem=self.cascade_margin,
+                run=lambda make_call, prompt: call_with_retry(
+                    make_call,
+                    limiter=self.chat_limiter,
+                    tokens=estimate_tokens(prompt) + COMPLETION_TOKENS_ESTIMATE,
+                    max_retries=self.max_retries,
+                ),
+                tempos=tempos,
+            )
+        else:
+            tokens = estimate_tokens(build_prompt(transcript_text, tempos)) + COMPLETION_TOKENS_ESTIMATE
+            raw = await call_with_retry(
+                lambda: request_analysis_async(self.analysis_client, transcript_text, self.model, tempos),
+                limiter=self.chat_limiter,
+                tokens=tokens,
+                max_retries=self.max_retries,
+            )
+            analysis = parse_tolerant(raw)
+        if key is not None and not escalation_failed(analysis):
+            await asyncio.to_thread(self.analysis_cache.set, key, {"raw": raw, "analysis": analysis})
+        return analysis
+
+    async def write_pdf(self, job, analysis, transcript_text, tempos=None, indice=None):
+        from monitorai.report import render_report
+
+        pdf_path = self.pdf_dir / (Path(job["id"]).with_suffix(".pdf").as_posix().replace("/", "__"))
+        await asyncio.to_thread(render_report, analysis, transcript_text, final_model(analysis, self.model), pdf_path, tempos, indice)
+        return str(pdf_path)
+
+    async def save(self, job, analysis, metadata, flush_at=STORE_BATCH):
+        self._store_pending.append({
+            "chave": job["id"], "analise": analysis, "agente": metadata.get("agente"),
+            "data": metadata.get("data"), "modelo": final_model(analysis, self.model), "origem": "lote",
+        })
+        if len(self._store_pending) >= flush_at:
+            try:
+                await self.flush_store()
+            except Exception as error:
+                # A ligação já foi avaliada: os registros continuam pendentes para a próxima gravação
+                print(f"Falha ao gravar {len(self._store_pending)} análises no banco de resultados: "
+                      f"{type(error).__name__}: {error}", file=sys.stderr)
+
+    async def flush_store(self):
+        """Grava as análises pendentes; só as retira da fila depois que o banco confirma"""
+        async with self._store_lock:
+            pending = list(self._store_pending)
+            if pending:
+                await asyncio.to_thread(self.store.add_many, pending)
+                del self._store_pending[:len(pending)]
+
+    async def process(self, job):
+        started = time.monotonic()
+        record = {"id": job["id"], "audio": job["path"], "modelo": self.model}
+        metadata = {k: v for k, v in job.items() if k not in ("id", "path")}
+        if metadata:
+            record["metadados"] = metadata
+        try:
+            transcription = await self.transcribe(job["path"])
+            transcript_text = transcription["text"]
+            tempos = transcription.get("tempos")
+            indice = transcription.get("indice")
+            if transcription.get("preprocessamento"):
+                record["preprocessamento"] = transcription["preprocessamento"]
+            if tempos:
+                record["tempos"] = tempos
+            if indice:
+                # Os tempos por palavra ficam só no cache de transcrições
+                record["indice"] = {"segmentos": indice["segmentos"]}
+            analysis = await self.analyze(transcript_text, tempos, indice)
+            record.update(status="ok", modelo=final_model(analysis, self.model), transcricao=transcript_text, analise=analysis)
+            if self.pdf_dir is not None:
+                record["pdf"] = await self.write_pdf(job, analysis, transcript_text, tempos, indice)
+            if self.store is not None:
+                await self.save(job, analysis, metadata)
+            self.ok += 1
+        except Exception as error:
+            record.update(status="erro", erro=f"{type(error).__name__}: {error}")
+            self.failed += 1
+        record["duracao_s"] = round(time.monotonic() - started, 3)
+        record["concluido_em"] = datetime.now().isoformat(timespec="seconds")
+        self.writer.write(record)
+        return record
+
+    async def _worker(self, queue):
+        while True:
+            job = await queue.get()
+            try:
+                await self.process(job)
+            finally:
+                queue.task_done()
+
+    async def run(self, jobs):
+        if self.pdf_dir is not None:
+            self.pdf_dir.mkdir(parents=True, exist_ok=True)
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(max(1, self.concurrency))]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.store is not None:
+                try:
+                    await self.flush_store()
+                except Exception as error:
+                    print(f"{len(self._store_pending)} análises não foram gravadas no banco de resultados "
+                          f"({type(error).__name__}: {error}); elas estão no JSONL de resultados e podem ser "
+                          "importadas com `python -m monitorai.store importar`", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m monitorai.batch", description="Avaliação em lote de ligações gravadas")
+    parser.add_argument("source", help="Diretório de gravações ou manifesto (.jsonl com id/path, ou .txt com um caminho por linha)")
+    parser.add_argument("--output", default="resultados.jsonl", help="Arquivo JSONL de resultados (também usado para retomar)")
+    parser.add_argument("--pdf-dir", help="Se informado, grava o relatório em PDF de cada ligação neste diretório")
+    parser.add_argument("--model", default=MODELO_PADRAO, help="Modelo de avaliação (na cascata, o modelo completo)")
+    parser.add_argument("--engine", choices=[ENGINE_SINGLE, ENGINE_GROUPS, ENGINE_CASCADE], default=ENGINE_SINGLE,
+                        help="unico: um prompt com toda a rubrica; grupos: uma requisição por grupo em paralelo; "
+                             "cascata: modelo rápido duas vezes e o completo só nos casos duvidosos")
+    parser.add_argument("--fast-model", default=MODELO_RAPIDO, help="Modelo rápido da cascata")
+    parser.add_argument("--cascade-margin", type=float, default=MARGEM_LIMIAR,
+                        help="Na cascata, reavalia com o modelo completo pontuações a menos disso de um limiar (50%%, 70%%)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Ligações processadas em paralelo")
+    parser.add_argument("--rpm", type=int, help="Limite de requisições por minuto na avaliação")
+    parser.add_argument("--tpm", type=int, help="Limite de tokens por minuto na avaliação")
+    parser.add_argument("--whisper-rpm", type=int, help="Limite de requisições por minuto na transcrição")
+    parser.add_argument("--max-retries", type=int, default=5, help="Novas tentativas em erros transitórios")
+    parser.add_argument("--cache-dir", help="Diretório dos caches de transcrição e análise (padrão: MONITORAI_CACHE_DIR ou ~/.cache/monitorai)")
+    parser.add_argument("--no-cache", action="store_true", help="Não consulta nem grava os caches")
+    parser.add_argument("--pattern", default="*", help="Filtro glob ao varrer um diretório")
+    parser.add_argument("--store", help="Banco de resultados (padrão: MONITORAI_STORE ou ~/.local/share/monitorai/resultados.sqlite)")
+    parser.add_argument("--no-store", action="store_true", help="Não grava as análises no banco de resultados")
+    parser.add_argument("--no-preprocess", action="store_true",
+                        help="Envia o áudio original, sem converter para Opus mono nem cortar silêncios (também: MONITORAI_PREPROCESS=0)")
+    parser.add_argument("--telemetry-jsonl", help="Grava um evento de telemetria por etapa neste JSONL (padrão: MONITORAI_TELEMETRY_JSONL)")
+    parser.add_argument("--metrics-port", type=int, help="Expõe /metrics (Prometheus) nesta porta durante o lote")
+    return parser
+
+
+async def run_batch(args):
+    jobs = load_jobs(args.source, args.pattern)
+    completed = load_completed(args.output)
+    pending = [job for job in jobs if job["id"] not in completed]
+    print(f"{len(jobs)} ligações, {len(jobs) - len(pending)} já concluídas, {len(pending)} a processar", file=sys.stderr)
+
+    if args.telemetry_jsonl:
+        telemetry.jsonl_path = args.telemetry_jsonl
+    start_metrics_server(args.metrics_port)
+
+    # As novas tentativas ficam a cargo do call_with_retry, que respeita os limites configurados; o pool
+    # comporta as requisições paralelas de cada ligação (trechos de áudio, tarefas do motor por grupo)
+    client = make_async_client(max_retries=0, max_connections=max(20, 8 * args.concurrency))
+    transcript_cache = analysis_cache = None
+    if not args.no_cache:
+        cache_dir = Path(args.cache_dir or default_cache_dir())
+        transcript_cache = DiskCache(cache_dir / "transcricoes.sqlite")
+        analysis_cache = DiskCache(cache_dir / "analises.sqlite")
+    store = None if args.no_store else ResultsStore(args.store)
+    writer = ResultWriter(args.output)
+    runner = BatchRunner(
+        client, writer,
+        model=args.model,
+        concurrency=args.concurrency,
+        pdf_dir=args.pdf_dir,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        whisper_rpm=args.whisper_rpm,
+        max_retries=args.max_retries,
+        transcript_cache=transcript_cache,
+        analysis_cache=analysis_cache,
+        engine=args.engine,
+        store=store,
+        preprocess=preprocess_enabled() and not args.no_preprocess,
+        fast_model=args.fast_model,
+        cascade_margin=args.cascade_margin,
+    )
+    try:
+        await runner.run(pending)
+    finally:
+        writer.close()
+        await client.close()
+    print(f"Concluído: {runner.ok} ok, {runner.failed} com erro", file=sys.stderr)
+    return 0 if runner.failed == 0 else 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return asyncio.run(run_batch(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Cache em disco (SQLite) com expulsão LRU por tamanho e por tempo sem acesso.
+
+Seguro para acesso concorrente de várias sessões do Streamlit e de processos em lote: cada operação
+abre a própria conexão e o banco roda em modo WAL.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_dir():
+    """Diretório de cache (variável MONITORAI_CACHE_DIR ou ~/.cache/monitorai)"""
+    return Path(os.environ.get("MONITORAI_CACHE_DIR") or Path.home() / ".cache" / "monitorai")
+
+
+def file_sha256(path):
+    """SHA-256 do conteúdo de um arquivo, lido em blocos"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """Chave estável a partir de partes serializáveis em JSON"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Mapa chave -> valor JSON persistido em SQLite, com expulsão do menos usado recentemente"""
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        """Valor armazenado ou None; um acerto renova a posição LRU da entrada"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value, last_access FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age and now - row[1] > self.max_age:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+        finally:
+            conn.close()
+
+    def set(self, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+        finally:
+            conn.close()
+
+    def _evict(self, conn, now):
+        if self.max_age:
+            conn.execute("DELETE FROM entries WHERE last_access < ?", (now - self.max_age,))
+        if self.max_bytes:
+            # Mantém as entradas mais recentes cuja soma de tamanhos cabe no limite
+            conn.execute(
+                """DELETE FROM entries WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS acc FROM entries
+                    ) WHERE acc > ?
+                )""",
+                (self.max_bytes,),
+            )
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM entries")
+        finally:
+            conn.close()
@@ -0,0 +1,183 @@
+"""Avaliação em cascata: o modelo rápido primeiro e o completo só nos casos duvidosos.
+
+A transcrição é avaliada CASCADE_RUNS vezes, em paralelo, pelo modelo rápido (MODELO_RAPIDO), com o
+prompt único. A primeira dessas análises é usada quando todas as respostas são JSON válido, as
+execuções concordam em todos os veredictos (itens, grupos e critérios eliminatórios), nenhum
+critério eliminatório foi marcado e a pontuação não está perto de um limiar (LIMIARES_PONTUACAO).
+Caso contrário, a ligação é reavaliada pelo modelo completo (MODELO_PADRAO). Uma resposta cortada
+pelo limite de tokens (finish_reason "length") conta como inválida, mesmo que parse_tolerant
+consiga reparar o JSON. Se a resposta do modelo completo não for válida, fica a primeira análise
+válida do modelo rápido, com o erro em "escalacao_falhou" (e sem entrar no cache de análises, para
+que uma nova execução tente de novo).
+
+Os grupos e a pontuação total de cada análise são recalculados localmente pelos veredictos dos
+itens (monitorai.scoring), como nos outros motores; a pontuação informada pelo modelo é ignorada.
+
+Cada decisão fica na própria análise, em "cascata" (motivos, pontuações das execuções e modelo
+final), e vai com ela para o banco de resultados e para o JSONL do lote. Ela também alimenta os
+contadores "cascata" e "cascata_motivos" da telemetria. Os limiares são calibrados com
+benchmarks/bench_cascade.py.
+"""
+
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from monitorai.jsonstream import parse_tolerant
+from monitorai.pipeline import SAMPLING_PARAMS, analysis_cache_key, request_completion, request_completion_async
+from monitorai.prompt import MODELO_PADRAO, MODELO_RAPIDO, RUBRIC_VERSION, build_prompt
+from monitorai.scoring import is_yes, score_groups
+from monitorai.telemetry import count
+
+CASCADE_RUNS = 2
+# Faixas da pontuação no app (70% e 50%); perto de um limiar, um único grupo muda a faixa
+LIMIARES_PONTUACAO = (50, 70)
+MARGEM_LIMIAR = 5
+
+MOTIVO_JSON = "json_invalido"
+MOTIVO_TRUNCADO = "truncado"
+MOTIVO_DIVERGENCIA = "divergencia"
+MOTIVO_ELIMINATORIO = "eliminatorio"
+MOTIVO_LIMIAR = "limiar"
+
+# finish_reason de uma resposta cortada pelo limite de tokens
+FINISH_TRUNCADO = "length"
+
+# Muda quando a regra de escalonamento ou o cálculo da pontuação mudam (entra na chave do cache de análises)
+CASCADE_VERSION = hashlib.sha256(f"{RUBRIC_VERSION}:{LIMIARES_PONTUACAO}:pontuacao-local".encode("utf-8")).hexdigest()[:16]
+
+
+def cascade_cache_key(transcript_text, model=MODELO_PADRAO, fast_model=MODELO_RAPIDO, runs=CASCADE_RUNS,
+                      margem=MARGEM_LIMIAR, tempos=None):
+    return analysis_cache_key(transcript_text, f"{fast_model}>{model}", rubric_version=CASCADE_VERSION,
+                              params={**SAMPLING_PARAMS, "execucoes": runs, "margem": margem}, tempos=tempos)
+
+
+def score(analysis):
+    """Pontuação total, já recalculada localmente em parse_response"""
+    return analysis["pontuacao_total_percentual"]
+
+
+def verdicts(analysis):
+    """Veredictos comparados entre as execuções: itens, grupos e critérios eliminatórios"""
+    return (
+        {item.get("item"): is_yes(item.get("resposta")) for item in analysis.get("checklist_detalhado", [])},
+        {grupo.get("grupo"): grupo.get("feito") for grupo in analysis.get("grupos_avaliacao", [])},
+        [bool(criterio.get("ocorreu")) for criterio in analysis.get("criterios_eliminatorios", [])],
+    )
+
+
+def near_threshold(total, margem=MARGEM_LIMIAR):
+    return any(limiar - margem <= total < limiar + margem for limiar in LIMIARES_PONTUACAO)
+
+
+def parse_response(raw, finish_reason):
+    """Análise de uma resposta, com grupos e pontuação recalculados; ValueError se ela não for JSON válido ou foi truncada"""
+    if finish_reason == FINISH_TRUNCADO:
+        raise ValueError("resposta truncada pelo limite de tokens")
+    analysis = parse_tolerant(raw)
+    if not isinstance(analysis, dict):
+        raise ValueError("a resposta não é um objeto JSON")
+    return score_groups(analysis)
+
+
+def parse_runs(responses):
+    """Análise de cada resposta (bruto, finish_reason) do modelo rápido; None nas inválidas; devolve (análises, truncadas)"""
+    analyses = []
+    for raw, finish_reason in responses:
+        try:
+            analysis = parse_response(raw, finish_reason)
+        except ValueError:
+            analysis = None
+        analyses.append(analysis)
+    return analyses, [finish_reason == FINISH_TRUNCADO for _, finish_reason in responses]
+
+
+def escalation_reasons(analyses, truncadas, margem=MARGEM_LIMIAR):
+    """Motivos para reavaliar com o modelo completo; lista vazia quando o modelo rápido basta"""
+    motivos = []
+    if any(truncadas):
+        motivos.append(MOTIVO_TRUNCADO)
+    if any(analysis is None and not truncada for analysis, truncada in zip(analyses, truncadas)):
+        motivos.append(MOTIVO_JSON)
+    valid = [analysis for analysis in analyses if analysis is not None]
+    if not valid:
+        return motivos
+    if any(verdicts(analysis) != verdicts(valid[0]) for analysis in valid[1:]):
+        motivos.append(MOTIVO_DIVERGENCIA)
+    if any(any(verdicts(analysis)[2]) for analysis in valid):
+        motivos.append(MOTIVO_ELIMINATORIO)
+    if any(near_threshold(score(analysis), margem) for analysis in valid):
+        motivos.append(MOTIVO_LIMIAR)
+    return motivos
+
+
+def escalation_failed(analysis):
+    """Se a análise é a do modelo rápido mantida porque a resposta do modelo completo não foi válida"""
+    return bool((analysis.get("cascata") or {}).get("escalacao_falhou"))
+
+
+def _finish(raw, analysis, model, fast_model, analyses, motivos, falha=None):
+    """Anota a decisão na análise e na telemetria; devolve (bruto, analysis)"""
+    analysis["cascata"] = {
+        "modelo_rapido": fast_model,
+        "pontuacoes": [score(run) if run is not None else None for run in analyses],
+        "motivos": motivos,
+        "escalou": bool(motivos),
+        "modelo_final": model,
+    }
+    if falha is not None:
+        analysis["cascata"]["escalacao_falhou"] = falha
+    count("cascata", decisao="escalacao_falhou" if falha is not None else "escalada" if motivos else "rapida")
+    for motivo in motivos:
+        count("cascata_motivos", motivo=motivo)
+    return raw, analysis
+
+
+def _escalated(response, model, fast_model, raws, analyses, motivos):
+    """Resultado do modelo completo; se a resposta não for válida, mantém a primeira análise válida do rápido"""
+    raw, finish_reason = response
+    try:
+        return _finish(raw, parse_response(raw, finish_reason), model, fast_model, analyses, motivos)
+    except ValueError as error:
+        falha = f"{model}: {'resposta truncada' if finish_reason == FINISH_TRUNCADO else 'JSON inválido'}: {error}"
+        fallback = next((index for index, analysis in enumerate(analyses) if analysis is not None), None)
+        if fallback is None:
+            count("cascata", decisao="escalacao_falhou")
+            for motivo in motivos:
+                count("cascata_motivos", motivo=motivo)
+            raise
+    return _finish(raws[fallback], analyses[fallback], fast_model, fast_model, analyses, motivos, falha)
+
+
+def evaluate_cascade(client, transcript_text, model=MODELO_PADRAO, fast_model=MODELO_RAPIDO, runs=CASCADE_RUNS,
+                     margem=MARGEM_LIMIAR, tempos=None):
+    """Execuções do modelo rápido em paralelo (threads) e, se preciso, o modelo completo; devolve (bruto, analysis)"""
+    with ThreadPoolExecutor(max_workers=runs) as pool:
+        responses = list(pool.map(lambda _: request_completion(client, transcript_text, fast_model, tempos), range(runs)))
+    raws = [raw for raw, _ in responses]
+    analyses, truncadas = parse_runs(responses)
+    motivos = escalation_reasons(analyses, truncadas, margem)
+    if not motivos:
+        return _finish(raws[0], analyses[0], fast_model, fast_model, analyses, motivos)
+    response = request_completion(client, transcript_text, model, tempos)
+    return _escalated(response, model, fast_model, raws, analyses, motivos)
+
+
+async def evaluate_cascade_async(client, transcript_text, model=MODELO_PADRAO, fast_model=MODELO_RAPIDO, runs=CASCADE_RUNS,
+                                 margem=MARGEM_LIMIAR, run=None, tempos=None):
+    """Versão assíncrona (AsyncOpenAI); `run(make_call, prompt)` permite aplicar limites e novas tentativas"""
+    prompt = build_prompt(transcript_text, tempos)
+
+    async def call(name):
+        make_call = lambda: request_completion_async(client, transcript_text, name, tempos)  # noqa: E731
+        return await (run(make_call, prompt) if run else make_call())
+
+    responses = await asyncio.gather(*(call(fast_model) for _ in range(runs)))
+    raws = [raw for raw, _ in responses]
+    analyses, truncadas = parse_runs(responses)
+    motivos = escalation_reasons(analyses, truncadas, margem)
+    if not motivos:
+        return _finish(raws[0], analyses[0], fast_model, fast_model, analyses, motivos)
+    response = await call(model)
+    return _escalated(response, model, fast_model, raws, analyses, motivos)
@@ -0,0 +1,91 @@
+"""Clientes da OpenAI com pool de conexões HTTP, keep-alive e timeouts por etapa.
+
+Um cliente por processo (no app, via st.cache_resource) mantém as conexões abertas entre reruns e
+sessões, evitando um novo handshake TCP/TLS a cada requisição. A URL base pode apontar para um
+servidor local compatível (OPENAI_BASE_URL), por exemplo o stub dos benchmarks.
+
+Variáveis de ambiente (todas opcionais):
+    MONITORAI_HTTP_MAX_CONNECTIONS     conexões simultâneas por cliente (padrão 20)
+    MONITORAI_HTTP_MAX_KEEPALIVE       conexões ociosas mantidas abertas (padrão 10)
+    MONITORAI_HTTP_KEEPALIVE_EXPIRY    segundos até fechar uma conexão ociosa (padrão 120)
+    MONITORAI_TIMEOUT_CONNECT          timeout de conexão em segundos (padrão 10)
+    MONITORAI_TIMEOUT_<ETAPA>          timeout de leitura da etapa (TRANSCRICAO, ANALISE)
+"""
+
+import os
+
+from monitorai.telemetry import count
+
+ETAPA_TRANSCRICAO = "transcricao"
+ETAPA_ANALISE = "analise"
+
+# Timeouts de leitura/escrita por etapa, em segundos: o upload e a transcrição de um trecho de 24 MB
+# demoram bem mais do que o intervalo entre dois pedaços do streaming da análise
+STAGE_TIMEOUTS = {
+    ETAPA_TRANSCRICAO: {"read": 300.0, "write": 120.0},
+    ETAPA_ANALISE: {"read": 120.0, "write": 30.0},
+}
+
+
+def _env_number(name, default, cast=float):
+    value = os.environ.get(name)
+    return cast(value) if value else default
+
+
+def http_limits(max_connections=None):
+    import httpx
+
+    return httpx.Limits(
+        max_connections=max_connections or _env_number("MONITORAI_HTTP_MAX_CONNECTIONS", 20, int),
+        max_keepalive_connections=_env_number("MONITORAI_HTTP_MAX_KEEPALIVE", 10, int),
+        keepalive_expiry=_env_number("MONITORAI_HTTP_KEEPALIVE_EXPIRY", 120.0),
+    )
+
+
+def stage_timeout(stage):
+    """httpx.Timeout da etapa (conexão e espera por uma conexão do pool são comuns a todas)"""
+    import httpx
+
+    connect = _env_number("MONITORAI_TIMEOUT_CONNECT", 10.0)
+    limits = STAGE_TIMEOUTS[stage]
+    read = _env_number(f"MONITORAI_TIMEOUT_{stage.upper()}", limits["read"])
+    return httpx.Timeout(connect=connect, read=read, write=limits["write"], pool=connect)
+
+
+def _count_response(response):
+    # Cada tentativa é uma requisição: as novas tentativas internas do SDK aparecem como 429/5xx repetidos
+    endpoint = response.request.url.path.rsplit("/v1", 1)[-1]
+    count("http_requests", endpoint=endpoint, status=response.status_code)
+
+
+async def _count_response_async(response):
+    _count_response(response)
+
+
+def make_client(api_key=None, base_url=None, max_retries=2, max_connections=None):
+    """Cliente síncrono com pool de conexões; api_key/base_url None usam OPENAI_API_KEY/OPENAI_BASE_URL"""
+    from openai import DefaultHttpxClient, OpenAI
+
+    http_client = DefaultHttpxClient(limits=http_limits(max_connections), event_hooks={"response": [_count_response]})
+    return OpenAI(
+        api_key=api_key, base_url=base_url or None, max_retries=max_retries,
+        timeout=stage_timeout(ETAPA_ANALISE), http_client=http_client,
+    )
+
+
+def make_async_client(api_key=None, base_url=None, max_retries=2, max_connections=None):
+    """Versão assíncrona de make_client (AsyncOpenAI)"""
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=http_limits(max_connections), event_hooks={"response": [_count_response_async]}
+    )
+    return AsyncOpenAI(
+        api_key=api_key, base_url=base_url or None, max_retries=max_retries,
+        timeout=stage_timeout(ETAPA_ANALISE), http_client=http_client,
+    )
+
+
+def for_stage(client, stage):
+    """Mesmo cliente (e mesmo pool de conexões) com os timeouts da etapa"""
+    return client.with_options(timeout=stage_timeout(stage))
@@ -0,0 +1,170 @@
+"""Modo compacto: veredictos e evidências curtas primeiro, justificativas sob demanda.
+
+No modo compacto o modelo devolve só os veredictos (prompt.COMPACT_OUTPUT_SPEC), com um trecho curto
+da transcrição como evidência de cada item. Nomes, critérios, status dos grupos A–D e pontuação são
+completados localmente (monitorai.scoring). As justificativas, que eram a maior parte dos tokens de
+saída, são pedidas depois, só para os itens abertos no app ou para o PDF, numa requisição que começa
+com o mesmo prefixo da avaliação (instrução, transcrição, medições e rubrica) e aproveita o cache de
+prompt do provedor.
+"""
+
+import hashlib
+import json
+import time
+
+from monitorai.cache import make_key
+from monitorai.jsonstream import parse_tolerant
+from monitorai.pipeline import SAMPLING_PARAMS
+from monitorai.prompt import PROMPT_INTRO, RUBRICA, SYSTEM_PROMPT, TRANSCRIPT_BLOCK, audio_facts_block
+from monitorai.scoring import CRITERIOS_ELIMINATORIOS, GRUPOS, ITENS, group_done, total_percentual
+from monitorai.telemetry import ETAPA_AVALIACAO, span, telemetry
+
+ALVO_ITEM = "item"
+ALVO_GRUPO = "grupo"
+ALVO_ELIMINATORIO = "eliminatorio"
+
+JUSTIFY_TASK = """TAREFA: a avaliação desta ligação já foi feita e os veredictos estão abaixo. Escreva APENAS as justificativas
+dos veredictos listados, seguindo as instruções detalhadas acima e citando entre aspas os trechos da transcrição
+que os sustentam. Não altere nenhum veredicto.
+
+VEREDICTOS:
+{veredictos}
+
+RETORNE APENAS JSON (sem ``` ou texto adicional), com uma justificativa para cada chave listada:
+{exemplo}
+"""
+
+# Muda quando o pedido de justificativas muda (entra na chave do cache de cada justificativa)
+JUSTIFY_VERSION = hashlib.sha256((SYSTEM_PROMPT + JUSTIFY_TASK).encode("utf-8")).hexdigest()[:16]
+
+
+def target_key(kind, ident):
+    """Chave de uma justificativa: "item:5", "grupo:A" ou "eliminatorio:2" (posição na lista)"""
+    return f"{kind}:{ident}"
+
+
+def expand_compact(compact):
+    """Estrutura `analysis` completa a partir da resposta compacta (sem justificativas)"""
+    respostas = {item.get("item"): item for item in compact.get("checklist_detalhado", [])}
+    checklist = []
+    for numero, info in ITENS.items():
+        if numero in respostas:
+            checklist.append({"item": numero, "grupo": info["grupo"], "criterio": info["criterio"],
+                              "resposta": respostas[numero].get("resposta"),
+                              "evidencia": respostas[numero].get("evidencia") or ""})
+    diretos = {grupo.get("grupo"): grupo.get("feito") for grupo in compact.get("grupos_avaliacao", [])}
+    grupos_avaliacao = [
+        {"grupo": grupo["grupo"], "nome": grupo["nome"], "percentual": grupo["percentual"],
+         "feito": group_done(grupo, checklist) if grupo["itens"] else diretos.get(grupo["grupo"])}
+        for grupo in GRUPOS
+    ]
+    criterios = [
+        {**criterio, "criterio": criterio.get("criterio") or CRITERIOS_ELIMINATORIOS[posicao]}
+        for posicao, criterio in enumerate(compact.get("criterios_eliminatorios", []))
+        if isinstance(criterio, dict)
+    ]
+    return {
+        "status_final": compact.get("status_final", {}),
+        "grupos_avaliacao": grupos_avaliacao,
+        "checklist_detalhado": checklist,
+        "criterios_eliminatorios": criterios,
+        "pontuacao_total_percentual": total_percentual(grupos_avaliacao),
+        "resumo_geral": compact.get("resumo_geral", ""),
+    }
+
+
+def _entries(analysis):
+    """{chave: entrada da análise} de tudo o que pode receber justificativa"""
+    entries = {target_key(ALVO_GRUPO, grupo.get("grupo")): grupo for grupo in analysis.get("grupos_avaliacao", [])}
+    entries.update((target_key(ALVO_ITEM, item.get("item")), item) for item in analysis.get("checklist_detalhado", []))
+    entries.update((target_key(ALVO_ELIMINATORIO, posicao), criterio)
+                   for posicao, criterio in enumerate(analysis.get("criterios_eliminatorios", [])))
+    return entries
+
+
+def pending_targets(analysis):
+    """Chaves das justificativas que faltam para o relatório (grupos avaliados, itens e critérios que ocorreram)"""
+    targets = []
+    for key, entry in _entries(analysis).items():
+        if entry.get("justificativa"):
+            continue
+        if key.startswith(ALVO_GRUPO) and entry.get("feito") is None:
+            continue
+        if key.startswith(ALVO_ELIMINATORIO) and not entry.get("ocorreu"):
+            continue
+        targets.append(key)
+    return targets
+
+
+def _verdict(entry, key):
+    kind = key.split(":", 1)[0]
+    if kind == ALVO_ITEM:
+        line = f"Item {entry.get('item')} ({entry.get('criterio')}): {entry.get('resposta')}"
+    elif kind == ALVO_GRUPO:
+        line = f"Grupo {entry.get('grupo')} ({entry.get('nome')}): {'feito' if entry.get('feito') else 'não feito'}"
+    else:
+        line = f"Critério eliminatório ({entry.get('criterio')}): {'ocorreu' if entry.get('ocorreu') else 'não ocorreu'}"
+    if entry.get("evidencia"):
+        line += f'; evidência: "{entry["evidencia"]}"'
+    return line
+
+
+def justification_messages(transcript_text, analysis, targets, tempos=None):
+    """Mensagens do pedido de justificativas; o prefixo é o mesmo do prompt de avaliação até a rubrica"""
+    entries = _entries(analysis)
+    veredictos = "\n".join(f"- {key}: {_verdict(entries[key], key)}" for key in targets)
+    exemplo = json.dumps({"justificativas": {key: "..." for key in targets}}, ensure_ascii=False, indent=2)
+    prompt = (PROMPT_INTRO + TRANSCRIPT_BLOCK.format(transcript_text=transcript_text) + audio_facts_block(tempos)
+              + RUBRICA + JUSTIFY_TASK.format(veredictos=veredictos, exemplo=exemplo))
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def request_justifications(client, transcript_text, model, analysis, targets, tempos=None):
+    """Pede numa única requisição as justificativas de `targets`; devolve {chave: texto}"""
+    messages = justification_messages(transcript_text, analysis, targets, tempos)
+    with span(ETAPA_AVALIACAO, modelo=model, justificativas=len(targets)) as sp:
+        response = client.chat.completions.create(model=model, messages=messages, **SAMPLING_PARAMS)
+        sp.usage(response.usage)
+    texts = parse_tolerant(response.choices[0].message.content.strip()).get("justificativas") or {}
+    return {key: str(texts[key]) for key in targets if texts.get(key)}
+
+
+def justification_cache_key(analysis_key, analysis, target):
+    """Chave do cache de uma justificativa: análise + veredicto justificado + versão do pedido"""
+    return make_key("justificativa", analysis_key, JUSTIFY_VERSION, target, _verdict(_entries(analysis)[target], target))
+
+
+def justify(client, transcript_text, model, analysis, targets, tempos=None, cache=None, analysis_key=None):
+    """Justificativas de `targets`, consultando o cache por chave e pedindo as que faltam de uma vez"""
+    texts, keys = {}, {}
+    if cache is not None and analysis_key is not None:
+        started = time.perf_counter()
+        for target in targets:
+            keys[target] = justification_cache_key(analysis_key, analysis, target)
+            cached = cache.get(keys[target])
+            if cached is not None:
+                texts[target] = cached
+        if texts:
+            telemetry.record(ETAPA_AVALIACAO, time.perf_counter() - started, modelo=model, cache_hit=True,
+                             justificativas=len(texts))
+    missing = [target for target in targets if target not in texts]
+    if missing:
+        fetched = request_justifications(client, transcript_text, model, analysis, missing, tempos)
+        for target, text in fetched.items():
+            if target in keys:
+                cache.set(keys[target], text)
+        texts.update(fetched)
+    return texts
+
+
+def apply_justifications(analysis, texts):
+    """Cópia de `analysis` com as justificativas de `texts` ({chave: texto}) preenchidas"""
+    filled = json.loads(json.dumps(analysis))
+    entries = _entries(filled)
+    for key, text in texts.items():
+        if key in entries:
+            entries[key]["justificativa"] = text
+    return filled
@@ -0,0 +1,209 @@
+"""Exportação dos relatórios em PDF de muitas análises num único arquivo ZIP.
+
+Os relatórios são gerados em paralelo, em processos separados (a montagem do PDF ocupa a CPU e
+segura o GIL), e entram no ZIP na ordem das análises, conforme ficam prontos. No máximo
+IN_FLIGHT_PER_PROCESS relatórios por processo ficam pendentes de cada vez. O ZIP é escrito em
+fluxo, inclusive num destino sem seek, como a saída padrão. Assim a memória não cresce com o
+número de relatórios.
+
+As análises vêm do banco de resultados (monitorai.store), com os filtros de agente e semana da
+página de Resultados, ou do JSONL do modo em lote, que também traz a transcrição, os tempos e o
+índice de segmentos. O banco guarda só a análise, e os relatórios exportados dele saem sem a
+transcrição.
+
+Uso:
+    python -m monitorai.export relatorios.zip [--agente Ana] [--semana-inicio 2025-W01] [--semana-fim 2025-W10]
+    python -m monitorai.export relatorios.zip --jsonl resultados.jsonl
+    python -m monitorai.export - > relatorios.zip
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from monitorai.store import ResultsStore
+
+IN_FLIGHT_PER_PROCESS = 2
+ERRORS_NAME = "erros.txt"
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class TempExport:
+    """ZIP de uma exportação num arquivo temporário, apagado em discard() ou quando o objeto é coletado
+
+    A página de Resultados guarda o objeto na sessão: o arquivo some quando a sessão termina, quando
+    o servidor é encerrado ou quando uma nova exportação o substitui. start() gera o ZIP numa thread,
+    fora do script da página, que só acompanha `gerados` até `pronto`.
+    """
+
+    def __init__(self, filtros=None, total=0):
+        fd, self.path = tempfile.mkstemp(prefix="monitorai-relatorios-", suffix=".zip")
+        os.close(fd)
+        self.filtros = filtros
+        self.relatorios = 0
+        self.erros = []
+        self.total = total
+        self.gerados = 0
+        self.pronto = False
+        self.falha = None
+        self._cancel = threading.Event()
+        self._finalizer = weakref.finalize(self, _remove_file, self.path)
+
+    def start(self, records, processes=None):
+        """Gera o ZIP de `records` numa thread em segundo plano"""
+        threading.Thread(target=self._run, args=(records, processes), name="monitorai-export", daemon=True).start()
+
+    def _run(self, records, processes):
+        try:
+            self.relatorios, self.erros = export_zip(records, self.path, processes, on_progress=self._progress)
+        except ExportCancelled:
+            pass
+        except Exception as error:
+            self.falha = f"{type(error).__name__}: {error}"
+        finally:
+            self.pronto = True
+
+    def _progress(self, gerados):
+        if self._cancel.is_set():
+            raise ExportCancelled
+        self.gerados = gerados
+
+    def read(self):
+        """Conteúdo do ZIP; a página passa o método ao st.download_button, que só o chama no clique"""
+        with open(self.path, "rb") as zip_file:
+            return zip_file.read()
+
+    def discard(self):
+        """Interrompe a exportação em andamento (no próximo relatório) e apaga o arquivo"""
+        self._cancel.set()
+        self._finalizer()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def default_processes():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def pdf_name(chave):
+    """Nome do relatório no ZIP (como os PDFs do modo em lote)"""
+    return Path(str(chave)).with_suffix(".pdf").as_posix().replace("/", "__")
+
+
+def jsonl_records(path):
+    """Registros de exportação a partir do JSONL do modo em lote (apenas ligações com status "ok")"""
+    with open(path, encoding="utf-8") as results:
+        for line in results:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") != "ok":
+                continue
+            yield {
+                "chave": record["id"],
+                "modelo": record.get("modelo"),
+                "analise": record["analise"],
+                "transcricao": record.get("transcricao"),
+                "tempos": record.get("tempos"),
+                "indice": record.get("indice"),
+            }
+
+
+def render_record(record):
+    """Executado nos processos de trabalho: (nome, bytes do PDF, erro)"""
+    from monitorai.report import create_pdf
+
+    name = pdf_name(record["chave"])
+    try:
+        data = create_pdf(record["analise"], record.get("transcricao") or "", record.get("modelo") or "N/A",
+                          record.get("tempos"), record.get("indice"))
+    except Exception as error:
+        return name, None, f"{type(error).__name__}: {error}"
+    return name, data, None
+
+
+def render_all(records, processes=None):
+    """Gera (nome, bytes, erro) de cada registro, na ordem, com uma janela limitada de relatórios pendentes"""
+    processes = processes or default_processes()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        pending = deque()
+        for record in records:
+            pending.append(pool.submit(render_record, record))
+            if len(pending) >= processes * IN_FLIGHT_PER_PROCESS:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def export_zip(records, out, processes=None, on_progress=None):
+    """Grava os relatórios de `records` num ZIP em `out` (caminho ou arquivo binário); devolve (gerados, erros)
+
+    Falhas de um relatório não interrompem a exportação: ficam listadas em erros.txt dentro do ZIP.
+    `on_progress(gerados)` é chamado a cada relatório gravado.
+    """
+    names, errors = set(), []
+    count = 0
+    # Os PDFs já saem comprimidos pelo fpdf: guardados sem nova compressão
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, data, error in render_all(records, processes):
+            if error is not None:
+                errors.append(f"{name}: {error}")
+                continue
+            unique, suffix = name, 2
+            while unique in names:
+                unique = f"{Path(name).stem}-{suffix}.pdf"
+                suffix += 1
+            names.add(unique)
+            archive.writestr(unique, data)
+            count += 1
+            if on_progress is not None:
+                on_progress(count)
+        if errors:
+            archive.writestr(ERRORS_NAME, "\n".join(errors) + "\n")
+    return count, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m monitorai.export", description="Exporta os relatórios em PDF num ZIP")
+    parser.add_argument("out", help="Arquivo ZIP de saída (- para a saída padrão)")
+    parser.add_argument("--jsonl", help="Exporta do JSONL do modo em lote (com a transcrição) em vez do banco de resultados")
+    parser.add_argument("--store", help="Banco de resultados (padrão: MONITORAI_STORE ou ~/.local/share/monitorai/resultados.sqlite)")
+    parser.add_argument("--agente", action="append", help="Filtra por agente (pode repetir)")
+    parser.add_argument("--semana-inicio", help="Primeira semana ISO, ex.: 2025-W01")
+    parser.add_argument("--semana-fim", help="Última semana ISO")
+    parser.add_argument("--processos", type=int, default=default_processes(), help="Processos que geram os PDFs")
+    args = parser.parse_args(argv)
+
+    if args.jsonl:
+        records = jsonl_records(args.jsonl)
+    else:
+        records = ResultsStore(args.store).iter_analyses(args.agente, args.semana_inicio, args.semana_fim)
+    started = time.perf_counter()
+    out = sys.stdout.buffer if args.out == "-" else args.out
+    count, errors = export_zip(records, out, args.processos)
+    print(f"{count} relatórios exportados em {time.perf_counter() - started:.1f} s ({len(errors)} com erro)", file=sys.stderr)
+    return 0 if not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
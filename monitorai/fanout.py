@@ -0,0 +1,254 @@
+"""Avaliação por grupo: uma requisição menor por grupo (A–F), critérios eliminatórios e resumo, em paralelo.
+
+Os itens que seguem regras mecânicas (monitorai.rules) são decididos localmente antes e ficam fora
+das requisições. Todas as requisições começam com o mesmo prefixo (instrução de sistema, rubrica e
+transcrição), o que permite ao provedor reaproveitar o cache de prompt entre elas. Com o índice de
+segmentos (monitorai.segments), os grupos cujos itens pendentes dependem só da abertura ou só do
+encerramento recebem apenas esse trecho da ligação, com timestamps. O status de cada grupo e a
+pontuação total são calculados localmente (monitorai.scoring), não pelo modelo.
+"""
+
+import asyncio
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from monitorai.jsonstream import parse_tolerant
+from monitorai.pipeline import SAMPLING_PARAMS
+from monitorai.prompt import PROMPT_INTRO, RUBRICA, SYSTEM_PROMPT, TRANSCRIPT_BLOCK, audio_facts_block
+from monitorai.rules import RULES_VERSION, decided, prescore
+from monitorai.scoring import CRITERIOS_ELIMINATORIOS, GRUPOS, ITENS, group_done, total_percentual
+from monitorai.segments import index_duration, resolve_window, timestamped_lines
+from monitorai.vad import format_clock
+from monitorai.telemetry import ETAPA_AVALIACAO, ETAPA_PROMPT, span
+
+TAREFA_ELIMINATORIOS = "eliminatorios"
+TAREFA_RESUMO = "resumo"
+
+_RETORNO = "\nRETORNE APENAS JSON (sem ``` ou texto adicional):\n"
+
+# Trecho da ligação de que cada item depende: (início, fim) em segundos, com valores negativos
+# contados a partir do fim. O eco (5) acompanha a confirmação de dados do item 3, na abertura
+JANELA_ABERTURA = (0, 240)
+JANELA_ENCERRAMENTO = (-180, None)
+ITEM_WINDOWS = {1: JANELA_ABERTURA, 3: JANELA_ABERTURA, 4: JANELA_ABERTURA, 5: JANELA_ABERTURA,
+                14: JANELA_ENCERRAMENTO, 15: JANELA_ENCERRAMENTO}
+# A janela só é usada quando deixa de fora ao menos 20% da ligação
+MAX_WINDOW_FRACTION = 0.8
+
+WINDOW_BLOCK = """TRANSCRIÇÃO (trecho de {inicio} a {fim} de uma ligação de {duracao}, com o início de cada fala; os itens desta tarefa dependem apenas deste trecho):
+\"\"\"{trecho}\"\"\"
+
+"""
+
+
+def _json_example(value):
+    return json.dumps(value, ensure_ascii=False, indent=2).replace('"true/false"', "true/false")
+
+
+def _group_task(grupo, skip_items=()):
+    cabecalho = f"TAREFA: avalie APENAS o GRUPO {grupo['grupo']} ({grupo['percentual']}%): {grupo['nome']}\n"
+    if grupo["itens"]:
+        pendentes = [numero for numero in grupo["itens"] if numero not in skip_items]
+        itens = ", ".join(str(numero) for numero in pendentes)
+        exemplo = {
+            "checklist_detalhado": [
+                {"item": numero, "resposta": "sim/não", "justificativa": "..."} for numero in pendentes
+            ],
+            "justificativa": f"Explicação detalhada considerando TODOS os itens ({itens}) do grupo",
+        }
+        regras = f"Avalie cada um dos itens {itens} seguindo as instruções detalhadas acima.\n"
+        ja_avaliados = [str(numero) for numero in grupo["itens"] if numero in skip_items]
+        if ja_avaliados:
+            regras += f"Os itens {', '.join(ja_avaliados)} já foram avaliados automaticamente: não os avalie.\n"
+        regras += "Não informe se o grupo foi feito nem calcule pontuação: isso é feito pelo sistema.\n"
+    else:
+        exemplo = {"feito": "true/false", "justificativa": "..."}
+        regras = "Siga as regras deste grupo descritas acima.\n"
+    return cabecalho + regras + _RETORNO + _json_example(exemplo)
+
+
+def _eliminatorios_task():
+    exemplo = {
+        "criterios_eliminatorios": [
+            {"criterio": criterio, "ocorreu": "true/false", "justificativa": "..."} for criterio in CRITERIOS_ELIMINATORIOS
+        ]
+    }
+    return "TAREFA: avalie APENAS os CRITÉRIOS ELIMINATÓRIOS listados acima.\n" + _RETORNO + _json_example(exemplo)
+
+
+def _resumo_task():
+    exemplo = {
+        "status_final": {
+            "satisfacao": "satisfeito/insatisfeito/neutro",
+            "risco": "baixo/médio/alto",
+            "desfecho": "resolvido/pendente/não resolvido",
+        },
+        "resumo_geral": "Resumo executivo do atendimento, destacando pontos fortes e áreas de melhoria",
+    }
+    return "TAREFA: informe APENAS o status final e o resumo geral do atendimento.\n" + _RETORNO + _json_example(exemplo)
+
+
+def build_tasks(skip_items=()):
+    """Texto de cada tarefa; grupos cujos itens foram todos decididos localmente não geram requisição"""
+    tasks = {}
+    for grupo in GRUPOS:
+        if grupo["itens"] and all(numero in skip_items for numero in grupo["itens"]):
+            continue
+        tasks[grupo["grupo"]] = _group_task(grupo, skip_items)
+    tasks[TAREFA_ELIMINATORIOS] = _eliminatorios_task()
+    tasks[TAREFA_RESUMO] = _resumo_task()
+    return tasks
+
+
+TASKS = build_tasks()
+
+# Versão do motor por grupo para o cache de análises (muda com a rubrica, com as tarefas ou com as regras locais)
+FANOUT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + PROMPT_INTRO + RUBRICA + "".join(TASKS.values()) + RULES_VERSION
+     + WINDOW_BLOCK + repr(sorted(ITEM_WINDOWS.items())) + str(MAX_WINDOW_FRACTION)).encode("utf-8")
+).hexdigest()[:16]
+
+
+def build_preamble(transcript_text, tempos=None):
+    """Prefixo comum a todas as tarefas: rubrica antes da transcrição (e das medições), para maximizar o cache de prompt"""
+    return PROMPT_INTRO + RUBRICA + TRANSCRIPT_BLOCK.format(transcript_text=transcript_text) + audio_facts_block(tempos)
+
+
+def task_window(task, local_items, indice):
+    """(início, fim) do trecho de que dependem os itens pendentes de um grupo; None se a tarefa precisa da ligação inteira"""
+    grupo = next((grupo for grupo in GRUPOS if grupo["grupo"] == task), None)
+    if not indice or grupo is None or not grupo["itens"]:
+        return None
+    windows = {ITEM_WINDOWS.get(numero) for numero in grupo["itens"] if numero not in local_items}
+    if len(windows) != 1 or None in windows:
+        return None
+    start, end = resolve_window(indice, windows.pop())
+    duration = index_duration(indice)
+    if duration <= 0 or end - start > MAX_WINDOW_FRACTION * duration:
+        return None
+    return start, end
+
+
+def build_preambles(transcript_text, tasks, local_items, tempos=None, indice=None):
+    """Prefixo de cada tarefa: o comum (ligação inteira) ou, quando há janela, só o trecho com timestamps"""
+    shared = build_preamble(transcript_text, tempos)
+    preambles = {}
+    for task in tasks:
+        window = task_window(task, local_items, indice)
+        if window is None:
+            preambles[task] = shared
+            continue
+        start, end = window
+        trecho = WINDOW_BLOCK.format(inicio=format_clock(start), fim=format_clock(end),
+                                     duracao=format_clock(index_duration(indice)),
+                                     trecho=timestamped_lines(indice, start, end))
+        preambles[task] = PROMPT_INTRO + RUBRICA + trecho + audio_facts_block(tempos)
+    return preambles
+
+
+def task_messages(preamble, task_text):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": preamble + task_text},
+    ]
+
+
+def merge_partials(partials, local_items=None):
+    """Monta a estrutura `analysis` do prompt único a partir das respostas parciais e dos itens decididos localmente"""
+    local_items = local_items or {}
+    checklist = []
+    grupos_avaliacao = []
+    for grupo in GRUPOS:
+        parcial = partials.get(grupo["grupo"], {})
+        if grupo["itens"]:
+            respostas = {item.get("item"): item for item in parcial.get("checklist_detalhado", [])}
+            respostas.update({numero: local_items[numero] for numero in grupo["itens"] if numero in local_items})
+            itens = []
+            for numero in grupo["itens"]:
+                if numero not in respostas:
+                    continue
+                item = {
+                    "item": numero,
+                    "grupo": grupo["grupo"],
+                    "criterio": ITENS[numero]["criterio"],
+                    "resposta": respostas[numero].get("resposta"),
+                    "justificativa": respostas[numero].get("justificativa", ""),
+                }
+                if numero in local_items:
+                    item["origem"] = local_items[numero]["origem"]
+                    item["evidencias"] = local_items[numero]["evidencias"]
+                itens.append(item)
+            checklist.extend(itens)
+            feito = group_done(grupo, itens)
+            justificativa = parcial.get("justificativa") or " ".join(item["justificativa"] for item in itens)
+        else:
+            feito = parcial.get("feito")
+            justificativa = parcial.get("justificativa", "")
+        grupos_avaliacao.append({
+            "grupo": grupo["grupo"],
+            "nome": grupo["nome"],
+            "percentual": grupo["percentual"],
+            "feito": feito,
+            "justificativa": justificativa,
+        })
+
+    return {
+        "status_final": partials[TAREFA_RESUMO].get("status_final", {}),
+        "grupos_avaliacao": grupos_avaliacao,
+        "checklist_detalhado": checklist,
+        "criterios_eliminatorios": partials[TAREFA_ELIMINATORIOS].get("criterios_eliminatorios", []),
+        "pontuacao_total_percentual": total_percentual(grupos_avaliacao),
+        "resumo_geral": partials[TAREFA_RESUMO].get("resumo_geral", ""),
+    }
+
+
+def _prepare(transcript_text, use_rules, tempos, indice):
+    with span(ETAPA_PROMPT, caracteres=len(transcript_text), grupos=True) as sp:
+        local_items = decided(prescore(transcript_text)) if use_rules else {}
+        tasks = build_tasks(local_items)
+        preambles = build_preambles(transcript_text, tasks, local_items, tempos, indice)
+        sp.set(tarefas=len(tasks), itens_locais=len(local_items),
+               caracteres_enviados=sum(len(preamble) for preamble in preambles.values()))
+        return preambles, tasks, local_items
+
+
+def _finish(tasks, contents, local_items):
+    raw = json.dumps({**dict(zip(tasks, contents)), "regras_locais": local_items}, ensure_ascii=False, indent=2)
+    partials = {task: parse_tolerant(content) for task, content in zip(tasks, contents)}
+    return raw, merge_partials(partials, local_items)
+
+
+def evaluate_by_group(client, transcript_text, model, max_workers=None, use_rules=True, tempos=None, indice=None):
+    """Executa as tarefas em paralelo (threads); devolve (respostas brutas em JSON, analysis)"""
+    preambles, tasks, local_items = _prepare(transcript_text, use_rules, tempos, indice)
+
+    def call(task):
+        messages = task_messages(preambles[task], tasks[task])
+        with span(ETAPA_AVALIACAO, modelo=model, tarefa=task) as sp:
+            response = client.chat.completions.create(model=model, messages=messages, **SAMPLING_PARAMS)
+            sp.usage(response.usage)
+        return response.choices[0].message.content.strip()
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(tasks)) as pool:
+        contents = list(pool.map(call, tasks))
+    return _finish(list(tasks), contents, local_items)
+
+
+async def evaluate_by_group_async(client, transcript_text, model, run=None, use_rules=True, tempos=None, indice=None):
+    """Versão assíncrona (AsyncOpenAI); `run(make_call, prompt)` permite aplicar limites e novas tentativas"""
+    preambles, tasks, local_items = _prepare(transcript_text, use_rules, tempos, indice)
+
+    async def call(task):
+        messages = task_messages(preambles[task], tasks[task])
+
+        async def make_call():
+            with span(ETAPA_AVALIACAO, modelo=model, tarefa=task) as sp:
+                response = await client.chat.completions.create(model=model, messages=messages, **SAMPLING_PARAMS)
+                sp.usage(response.usage)
+            return response.choices[0].message.content.strip()
+
+        return await (run(make_call, messages[-1]["content"]) if run else make_call())
+
+    contents = await asyncio.gather(*(call(task) for task in tasks))
+    return _finish(list(tasks), contents, local_items)
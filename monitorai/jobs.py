@@ -0,0 +1,513 @@
+"""Fila de análises em SQLite com processos de trabalho: o app só envia os jobs e exibe os resultados.
+
+Cada análise pedida no app vira um job (transcrição → avaliação → PDF) numa fila em SQLite (WAL,
+uma conexão por operação, como monitorai.store). Processos de trabalho separados retiram os jobs
+da fila e gravam no banco a etapa, o progresso, o que já chegou do streaming da avaliação e o
+resultado final. O áudio e o PDF ficam no diretório do job. Nada depende da sessão do navegador:
+com o id do job (?job=<id> na URL) o resultado pode ser reaberto depois de fechar a página.
+
+Se um processo morrer no meio de um job, o heartbeat para de ser atualizado e o job volta para a
+fila (até MAX_ATTEMPTS tentativas).
+
+A telemetria dos processos de trabalho (transcrição, avaliação, JSON, PDF...) vai para a tabela
+"telemetria" do mesmo banco; o app a consome (take_telemetry) e a soma à do próprio processo no
+painel de administração e no /metrics.
+
+Variáveis de ambiente (opcionais):
+    MONITORAI_JOBS_DIR       diretório da fila e dos jobs (padrão ~/.local/share/monitorai/jobs)
+    MONITORAI_JOB_WORKERS    processos de trabalho iniciados pelo app (padrão 2; 0 = só processos externos)
+
+Uso em linha de comando (processos de trabalho fora do servidor do Streamlit):
+    python -m monitorai.jobs trabalhar [--processos 2]
+    python -m monitorai.jobs listar
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from monitorai.cache import DiskCache, default_cache_dir
+from monitorai.cascade import cascade_cache_key, escalation_failed, evaluate_cascade
+from monitorai.clients import ETAPA_ANALISE, ETAPA_TRANSCRICAO, for_stage, make_client
+from monitorai.compact import expand_compact
+from monitorai.fanout import FANOUT_VERSION, evaluate_by_group
+from monitorai.jsonstream import IncrementalJSONParser, parse_tolerant
+from monitorai.pipeline import analysis_cache_key, stream_analysis, transcribe_audio
+from monitorai.prompt import COMPACT_RUBRIC_VERSION, ENGINE_CASCADE, ENGINE_GROUPS, RUBRIC_VERSION, final_model
+from monitorai.store import ResultsStore
+from monitorai.telemetry import ETAPA_AVALIACAO, ETAPA_PDF, telemetry
+
+STATUS_NA_FILA = "na_fila"
+STATUS_EXECUTANDO = "executando"
+STATUS_CONCLUIDO = "concluido"
+STATUS_ERRO = "erro"
+PENDENTES = (STATUS_NA_FILA, STATUS_EXECUTANDO)
+
+POLL_SECONDS = 0.5
+HEARTBEAT_SECONDS = 10
+# Sem heartbeat por STALE_SECONDS, o processo do job é dado como morto e o job volta para a fila
+STALE_SECONDS = 60
+MAX_ATTEMPTS = 3
+# Ao encerrar, os processos terminam o job atual por até SHUTDOWN_SECONDS antes de serem interrompidos
+SHUTDOWN_SECONDS = 30
+# Jobs encerrados há mais de MAX_AGE_SECONDS são apagados (com o áudio e o PDF) quando um processo começa
+MAX_AGE_SECONDS = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    etapa TEXT,
+    progresso REAL NOT NULL DEFAULT 0,
+    criado_em REAL NOT NULL,
+    iniciado_em REAL,
+    concluido_em REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    processo TEXT,
+    heartbeat REAL,
+    parametros TEXT NOT NULL,
+    parcial TEXT,
+    resultado TEXT,
+    erro TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_fila ON jobs(status, criado_em);
+CREATE TABLE IF NOT EXISTS telemetria (
+    id INTEGER PRIMARY KEY,
+    criado_em REAL NOT NULL,
+    evento TEXT NOT NULL
+);
+"""
+
+_JSON_COLUMNS = ("parametros", "parcial", "resultado")
+
+
+def default_jobs_dir():
+    return Path(os.environ.get("MONITORAI_JOBS_DIR") or Path.home() / ".local" / "share" / "monitorai" / "jobs")
+
+
+def job_worker_count():
+    return int(os.environ.get("MONITORAI_JOB_WORKERS") or 2)
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+class AnalysisParseError(ValueError):
+    """Resposta da avaliação que não pôde ser lida; `raw` guarda o texto para exibição"""
+
+    def __init__(self, message, raw):
+        super().__init__(message)
+        self.raw = raw
+
+
+class JobQueue:
+    """Fila e estado dos jobs; segura para vários processos (uma conexão por operação, WAL)"""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or default_jobs_dir())
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / "jobs.sqlite"
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _execute(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).rowcount
+        finally:
+            conn.close()
+
+    def job_dir(self, job_id):
+        return self.directory / job_id
+
+    def submit(self, audio_path, **params):
+        """Copia o áudio para o diretório do job e o põe na fila; devolve o id"""
+        job_id = uuid.uuid4().hex[:16]
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir()
+        audio = job_dir / ("audio" + Path(audio_path).suffix)
+        shutil.copyfile(audio_path, audio)
+        params["audio"] = str(audio)
+        self._execute("INSERT INTO jobs (id, status, criado_em, parametros) VALUES (?, ?, ?, ?)",
+                      (job_id, STATUS_NA_FILA, time.time(), _dumps(params)))
+        return job_id
+
+    def claim(self, processo):
+        """Retira o job mais antigo da fila (ou um abandonado por um processo morto); None se não houver"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, erro = ?, concluido_em = ? WHERE status = ? AND heartbeat < ? AND tentativas >= ?",
+                (STATUS_ERRO, "Processo de trabalho interrompido repetidamente", now, STATUS_EXECUTANDO,
+                 now - STALE_SECONDS, MAX_ATTEMPTS),
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? OR (status = ? AND heartbeat < ?) ORDER BY criado_em LIMIT 1",
+                (STATUS_NA_FILA, STATUS_EXECUTANDO, now - STALE_SECONDS),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, processo = ?, heartbeat = ?, iniciado_em = ?, tentativas = tentativas + 1, "
+                "etapa = NULL, progresso = 0, parcial = NULL WHERE id = ?",
+                (STATUS_EXECUTANDO, processo, now, now, row[0]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(row[0])
+
+    def heartbeat(self, job_id, processo):
+        self._execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND processo = ?", (time.time(), job_id, processo))
+
+    # progress, finish e fail só valem para o processo dono do job: um processo dado como morto, cujo
+    # job voltou para a fila, não sobrescreve o estado da nova tentativa
+
+    def progress(self, job_id, processo, etapa, progresso, parcial=None):
+        """Etapa atual, fração concluída e, se houver, o resultado parcial (status e grupos já recebidos)"""
+        if parcial is None:
+            self._execute("UPDATE jobs SET etapa = ?, progresso = ?, heartbeat = ? WHERE id = ? AND processo = ? AND status = ?",
+                          (etapa, progresso, time.time(), job_id, processo, STATUS_EXECUTANDO))
+        else:
+            self._execute("UPDATE jobs SET etapa = ?, progresso = ?, heartbeat = ?, parcial = ? WHERE id = ? AND processo = ? AND status = ?",
+                          (etapa, progresso, time.time(), _dumps(parcial), job_id, processo, STATUS_EXECUTANDO))
+
+    def finish(self, job_id, processo, resultado):
+        self._execute("UPDATE jobs SET status = ?, etapa = NULL, progresso = 1, concluido_em = ?, resultado = ? "
+                      "WHERE id = ? AND processo = ? AND status = ?",
+                      (STATUS_CONCLUIDO, time.time(), _dumps(resultado), job_id, processo, STATUS_EXECUTANDO))
+
+    def fail(self, job_id, processo, erro, resultado=None):
+        self._execute("UPDATE jobs SET status = ?, concluido_em = ?, erro = ?, resultado = ? WHERE id = ? AND processo = ? AND status = ?",
+                      (STATUS_ERRO, time.time(), erro, _dumps(resultado), job_id, processo, STATUS_EXECUTANDO))
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        for column in _JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    def recent(self, limit=20):
+        """Últimos jobs: [(id, status, etapa, progresso, criado_em, concluido_em, erro)]"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT id, status, etapa, progresso, criado_em, concluido_em, erro FROM jobs ORDER BY criado_em DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def purge(self, max_age=MAX_AGE_SECONDS):
+        """Apaga os jobs encerrados há mais de `max_age` segundos, com os arquivos; devolve quantos
+
+        Também descarta a telemetria que nenhum app consumiu nesse prazo (processos só da linha de comando).
+        """
+        conn = self._connect()
+        try:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND concluido_em < ?",
+                (STATUS_CONCLUIDO, STATUS_ERRO, time.time() - max_age),
+            )]
+            for job_id in ids:
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            conn.execute("DELETE FROM telemetria WHERE criado_em < ?", (time.time() - max_age,))
+        finally:
+            conn.close()
+        return len(ids)
+
+    def add_telemetry(self, events):
+        """Grava os eventos de telemetria de um processo de trabalho numa transação"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO telemetria (criado_em, evento) VALUES (?, ?)",
+                             [(now, json.dumps(event, ensure_ascii=False, default=str)) for event in events])
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def take_telemetry(self):
+        """Retira (lê e apaga) os eventos gravados pelos processos de trabalho, em ordem"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id, evento FROM telemetria ORDER BY id").fetchall()
+            if rows:
+                conn.execute("DELETE FROM telemetria WHERE id <= ?", (rows[-1][0],))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [json.loads(evento) for _, evento in rows]
+
+
+def analysis_key(transcript_text, model, engine, compact=False, tempos=None, indice=None):
+    """Chave do cache de análises de cada modo (motor por grupo, cascata, prompt único ou modo compacto)"""
+    if engine == ENGINE_CASCADE:
+        return cascade_cache_key(transcript_text, model, tempos=tempos)
+    if engine == ENGINE_GROUPS:
+        return analysis_cache_key(transcript_text, model, rubric_version=FANOUT_VERSION, tempos=tempos, indice=indice)
+    version = COMPACT_RUBRIC_VERSION if compact else RUBRIC_VERSION
+    return analysis_cache_key(transcript_text, model, rubric_version=version, tempos=tempos)
+
+
+def evaluate(client, transcript_text, model, engine, compact=False, tempos=None, indice=None, cache=None, on_partial=None):
+    """Avalia a transcrição com o cache de análises; `on_partial` recebe o status e os grupos conforme chegam"""
+    key = None
+    if cache is not None:
+        started = time.perf_counter()
+        key = analysis_key(transcript_text, model, engine, compact, tempos, indice)
+        cached = cache.get(key)
+        if cached is not None:
+            telemetry.record(ETAPA_AVALIACAO, time.perf_counter() - started, modelo=model, cache_hit=True)
+            return cached["raw"], cached["analysis"]
+    if engine == ENGINE_GROUPS:
+        raw, analysis = evaluate_by_group(client, transcript_text, model, tempos=tempos, indice=indice)
+    elif engine == ENGINE_CASCADE:
+        raw, analysis = evaluate_cascade(client, transcript_text, model, tempos=tempos)
+    else:
+        parser = IncrementalJSONParser()
+        parcial = {}
+        for delta in stream_analysis(client, transcript_text, model, tempos, compact):
+            for name, index, value in parser.feed(delta):
+                if name == "status_final" and isinstance(value, dict):
+                    parcial["status_final"] = value
+                # No modo compacto os grupos só ficam completos depois de calculados localmente
+                elif name == "grupos_avaliacao" and index is not None and isinstance(value, dict) and not compact:
+                    parcial.setdefault("grupos_avaliacao", []).append(value)
+                else:
+                    continue
+                if on_partial is not None:
+                    on_partial(parcial)
+        raw = parser.text.strip()
+        try:
+            analysis = parse_tolerant(raw)
+        except ValueError as error:
+            raise AnalysisParseError(f"Erro ao processar JSON: {error}", raw) from error
+        if compact:
+            analysis = expand_compact(analysis)
+    if key is not None and not escalation_failed(analysis):
+        cache.set(key, {"raw": raw, "analysis": analysis})
+    return raw, analysis
+
+
+def run_job(queue, job, client, transcript_cache=None, analysis_cache=None, store=None):
+    """Transcrição → avaliação → banco de resultados → PDF, registrando o progresso na fila"""
+    from monitorai.report import render_report
+
+    job_id, processo, params = job["id"], job["processo"], job["parametros"]
+    model, engine, compact = params["modelo"], params["motor"], params.get("compacto", False)
+    queue.progress(job_id, processo, ETAPA_TRANSCRICAO, 0.05)
+    transcription = transcribe_audio(for_stage(client, ETAPA_TRANSCRICAO), params["audio"], cache=transcript_cache,
+                                     audio_sha256=params.get("sha256"), preprocess=params.get("preprocess", True))
+    text, tempos, indice = transcription["text"], transcription.get("tempos"), transcription.get("indice")
+    resultado = {"transcricao": text, "tempos": tempos, "indice": indice,
+                 "preprocessamento": transcription.get("preprocessamento")}
+
+    queue.progress(job_id, processo, ETAPA_AVALIACAO, 0.4)
+    raw, analysis = evaluate(
+        for_stage(client, ETAPA_ANALISE), text, model, engine, compact, tempos,
+        indice if engine == ENGINE_GROUPS else None, cache=analysis_cache,
+        on_partial=lambda parcial: queue.progress(job_id, processo, ETAPA_AVALIACAO, 0.6, parcial),
+    )
+    resultado.update(raw=raw, analise=analysis)
+    model = final_model(analysis, model)
+    if store is not None:
+        try:
+            store.add(params.get("sha256") or job_id, analysis, agente=params.get("agente"), modelo=model, origem="app")
+        except Exception as error:
+            resultado["aviso"] = f"A análise não foi gravada no banco de resultados: {error}"
+
+    # No modo compacto o PDF depende das justificativas, geradas sob demanda no app (monitorai.compact)
+    if not compact:
+        queue.progress(job_id, processo, ETAPA_PDF, 0.9)
+        pdf_path = queue.job_dir(job_id) / "relatorio.pdf"
+        render_report(analysis, text, model, pdf_path, tempos, indice)
+        resultado["pdf"] = str(pdf_path)
+    queue.finish(job_id, processo, resultado)
+
+
+def _beat(queue, job_id, processo, stop):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            queue.heartbeat(job_id, processo)
+        except sqlite3.Error:
+            # Banco ocupado: tenta de novo no próximo intervalo (o job só volta para a fila depois de STALE_SECONDS)
+            continue
+
+
+def _flush_telemetry(queue, events):
+    """Grava os eventos acumulados do processo; se o banco estiver ocupado, ficam para a próxima vez"""
+    pending = events[:]
+    if not pending:
+        return
+    try:
+        queue.add_telemetry(pending)
+    except sqlite3.Error:
+        return
+    del events[:len(pending)]
+
+
+def worker_loop(directory=None, api_key=None, base_url=None, stop=None, poll_interval=POLL_SECONDS, telemetry_events=None):
+    """Laço de um processo de trabalho: retira e executa jobs até `stop` (multiprocessing.Event) ser acionado
+
+    `telemetry_events` (lista alimentada por telemetry.forward_to) é gravada no banco da fila entre os jobs.
+    """
+    queue = JobQueue(directory)
+    try:
+        queue.purge()
+    except sqlite3.Error:
+        pass  # a limpeza fica para o próximo processo que começar
+    client = make_client(api_key=api_key, base_url=base_url)
+    cache_dir = default_cache_dir()
+    transcript_cache = DiskCache(cache_dir / "transcricoes.sqlite")
+    analysis_cache = DiskCache(cache_dir / "analises.sqlite")
+    store = ResultsStore()
+    processo = f"{socket.gethostname()}:{os.getpid()}"
+    events = telemetry_events if telemetry_events is not None else []
+    while stop is None or not stop.is_set():
+        _flush_telemetry(queue, events)
+        try:
+            job = queue.claim(processo)
+        except sqlite3.Error:
+            # Banco ocupado além do timeout da conexão: tenta de novo depois do intervalo
+            job = None
+        if job is None:
+            if stop is None:
+                time.sleep(poll_interval)
+            else:
+                stop.wait(poll_interval)
+            continue
+        beating = threading.Event()
+        heartbeat = threading.Thread(target=_beat, args=(queue, job["id"], processo, beating), daemon=True)
+        heartbeat.start()
+        try:
+            run_job(queue, job, client, transcript_cache, analysis_cache, store)
+        except Exception as error:
+            raw = getattr(error, "raw", None)
+            try:
+                queue.fail(job["id"], processo, f"{type(error).__name__}: {error}", {"raw": raw} if raw is not None else None)
+            except sqlite3.Error:
+                pass  # sem heartbeat, o job volta para a fila depois de STALE_SECONDS
+        finally:
+            beating.set()
+            heartbeat.join()
+    _flush_telemetry(queue, events)
+
+
+def _worker_process(*args):
+    # Ctrl+C chega a todo o grupo de processos; quem encerra os processos de trabalho é o processo pai (stop_workers)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Os eventos de telemetria deste processo vão para o banco da fila, de onde o app os lê
+    events = []
+    telemetry.forward_to(events.append)
+    worker_loop(*args, telemetry_events=events)
+
+
+def start_workers(count, directory=None, api_key=None, base_url=None):
+    """Inicia `count` processos de trabalho (spawn, daemon: terminam junto com o processo que os criou)
+
+    Devolve (processos, stop): acionar `stop` faz cada processo sair depois do job atual (stop_workers).
+    """
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    workers = []
+    for _ in range(count):
+        worker = context.Process(target=_worker_process, args=(str(directory) if directory else None, api_key, base_url, stop),
+                                 daemon=True, name="monitorai-job")
+        worker.start()
+        workers.append(worker)
+    return workers, stop
+
+
+def stop_workers(workers, stop, timeout=SHUTDOWN_SECONDS):
+    """Pede que os processos saiam depois do job atual; os que passarem de `timeout` são interrompidos"""
+    stop.set()
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        worker.join(max(0.0, deadline - time.monotonic()))
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+            worker.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m monitorai.jobs", description="Fila de análises do app")
+    commands = parser.add_subparsers(dest="command", required=True)
+    trabalhar = commands.add_parser("trabalhar", help="Executa os jobs da fila (OPENAI_API_KEY/OPENAI_BASE_URL do ambiente)")
+    trabalhar.add_argument("--processos", type=int, default=job_worker_count() or 1)
+    listar = commands.add_parser("listar", help="Mostra os últimos jobs")
+    listar.add_argument("--limite", type=int, default=20)
+    for command in (trabalhar, listar):
+        command.add_argument("--jobs", help="Diretório da fila (padrão: MONITORAI_JOBS_DIR ou ~/.local/share/monitorai/jobs)")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.jobs)
+    if args.command == "listar":
+        for job_id, status, etapa, progresso, criado_em, _, erro in queue.recent(args.limite):
+            criado = time.strftime("%d/%m %H:%M:%S", time.localtime(criado_em))
+            print(f"{job_id}  {criado}  {status:<10} {etapa or '':<12} {progresso:>4.0%}  {erro or ''}")
+        return 0
+    workers, stop = start_workers(args.processos, queue.directory)
+    print(f"{len(workers)} processo(s) de trabalho em {queue.directory}", file=sys.stderr)
+    # SIGTERM encerra como Ctrl+C; um job interrompido depois de SHUTDOWN_SECONDS volta para a fila quando o heartbeat expira
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Encerrando depois dos jobs em andamento...", file=sys.stderr)
+        stop_workers(workers, stop)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
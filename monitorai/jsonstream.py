@@ -0,0 +1,191 @@
+"""Leitura incremental e tolerante do JSON de análise enquanto a resposta do modelo chega em streaming."""
+
+import json
+import re
+
+from monitorai.pipeline import parse_analysis
+from monitorai.telemetry import ETAPA_JSON, span
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_PARTIAL_LITERALS = {"t": "true", "tr": "true", "tru": "true", "f": "false", "fa": "false", "fal": "false",
+                     "fals": "false", "n": "null", "nu": "null", "nul": "null"}
+_PARTIAL_LITERAL_RE = re.compile(r"([\[:,]\s*)(tru|tr|t|fals|fal|fa|f|nul|nu|n)$")
+_PARTIAL_NUMBER_RE = re.compile(r"(-?\d+)(\.|[eE][+-]?|\.\d+[eE][+-]?)$")
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """Recebe o texto em pedaços e emite cada valor assim que ele fica completo.
+
+    Emite ("chave", None, valor) para cada valor de primeiro nível do objeto raiz e
+    ("chave", índice, valor) para cada elemento de uma lista de primeiro nível — por exemplo,
+    ("status_final", None, {...}) ou ("grupos_avaliacao", 2, {...}).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._element_start = None
+        self._element_index = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        events = []
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            pos = self._pos
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:pos + 1])
+                        self._key_start = None
+                continue
+            depth = len(self._stack)
+            if ch in _WHITESPACE:
+                continue
+            if depth == 1 and self._value_start is None and ch not in ",:}":
+                if ch == '"' and self._key is None:
+                    self._key_start = pos
+                    self._in_string = True
+                    continue
+                self._value_start = pos
+            if depth == 2 and self._stack[1] == "[" and self._element_start is None and ch not in ",]":
+                self._element_start = pos
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                if ch == "]" and depth == 2 and self._element_start is not None:
+                    # Último elemento escalar da lista (sem vírgula depois)
+                    events.append(self._emit_element(pos))
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 2 and self._stack[1] == "[" and self._element_start is not None:
+                    events.append(self._emit_element(pos + 1))
+                elif depth == 1 and self._value_start is not None:
+                    events.append(self._emit_value(pos + 1))
+                elif depth == 0 and self._value_start is not None:
+                    # Valor escalar que fecha o objeto raiz
+                    events.append(self._emit_value(pos))
+            elif ch == ",":
+                if depth == 1 and self._value_start is not None:
+                    events.append(self._emit_value(pos))
+                elif depth == 2 and self._stack[1] == "[" and self._element_start is not None:
+                    events.append(self._emit_element(pos))
+        return [event for event in events if event is not None]
+
+    def _emit_value(self, end):
+        key, start = self._key, self._value_start
+        self._key = self._value_start = None
+        self._element_start, self._element_index = None, 0
+        try:
+            return (key, None, json.loads(self.text[start:end]))
+        except json.JSONDecodeError:
+            return None
+
+    def _emit_element(self, end):
+        start, index = self._element_start, self._element_index
+        self._element_start = None
+        self._element_index += 1
+        try:
+            return (self._key, index, json.loads(self.text[start:end]))
+        except json.JSONDecodeError:
+            return None
+
+
+def _is_object_key(out, stack):
+    """O texto termina numa string que é chave de objeto (ainda sem ':')?"""
+    if not stack or stack[-1] != "{" or not out.endswith('"'):
+        return None
+    index = len(out) - 2
+    while index >= 0:
+        if out[index] == '"' and (index == 0 or out[index - 1] != "\\"):
+            break
+        index -= 1
+    before = out[:index].rstrip(_WHITESPACE)
+    if before.endswith(("{", ",")):
+        return index
+    return None
+
+
+def repair_json(text):
+    """Fecha strings, listas e objetos truncados e remove vírgulas sobrando, devolvendo um JSON válido"""
+    text = _FENCE_RE.sub("", text)
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("Não foi possível extrair JSON válido")
+    out = []
+    stack = []
+    in_string = escape = False
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            while out and out[-1] in _WHITESPACE + ",":
+                out.pop()
+            out.append("}" if stack.pop() == "{" else "]")
+            if not stack:
+                break
+            continue
+        out.append(ch)
+
+    repaired = "".join(out)
+    if in_string:
+        if escape:
+            repaired = repaired[:-1]
+        repaired += '"'
+    while stack:
+        repaired = repaired.rstrip(_WHITESPACE + ",")
+        key_index = _is_object_key(repaired, stack)
+        if key_index is not None:
+            # Chave sem valor: descarta
+            repaired = repaired[:key_index].rstrip(_WHITESPACE + ",")
+        elif repaired.endswith(":"):
+            repaired += " null"
+        else:
+            literal = _PARTIAL_LITERAL_RE.search(repaired)
+            if literal:
+                repaired = repaired[:literal.start(2)] + _PARTIAL_LITERALS[literal.group(2)]
+            else:
+                repaired = _PARTIAL_NUMBER_RE.sub(lambda m: m.group(1), repaired)
+        repaired += "}" if stack.pop() == "{" else "]"
+    return repaired
+
+
+def parse_tolerant(text):
+    """parse_analysis com reparo local de JSON truncado ou levemente malformado"""
+    with span(ETAPA_JSON, caracteres=len(text), reparado=False) as sp:
+        try:
+            return parse_analysis(text)
+        except (ValueError, json.JSONDecodeError):
+            sp.set(reparado=True)
+            return json.loads(repair_json(text))
@@ -0,0 +1,189 @@
+"""Transcrição de ligações longas: divide o áudio em trechos nos silêncios, transcreve em paralelo e recompõe.
+
+Cada trecho é estendido por uma pequena sobreposição nas duas pontas para não cortar palavras. Na
+recomposição, cada segmento com timestamp pertence ao trecho que contém o seu ponto médio, e as
+palavras repetidas na emenda são removidas.
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from monitorai.audio import detect_silences, extract_segment
+from monitorai.prompt import MODELO_TRANSCRICAO
+
+# Limite de upload do endpoint de transcrição é 25 MB; acima disso o áudio precisa ser dividido
+MAX_UPLOAD_BYTES = 24 * 1024 * 1024
+CHUNK_SECONDS = 600
+OVERLAP_SECONDS = 2.0
+# Janela (antes do ponto ideal de corte) em que se procura um silêncio para cortar
+SILENCE_SEARCH_SECONDS = 90
+MAX_OVERLAP_WORDS = 25
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def needs_chunking(path, max_bytes=MAX_UPLOAD_BYTES):
+    return os.path.getsize(path) > max_bytes
+
+
+def plan_chunks(duration, silences, chunk_seconds=CHUNK_SECONDS, overlap=OVERLAP_SECONDS,
+                search_seconds=SILENCE_SEARCH_SECONDS):
+    """Pontos de corte (incluindo 0 e a duração), escolhidos no meio dos silêncios sempre que possível"""
+    boundaries = [0.0]
+    while duration - boundaries[-1] > chunk_seconds:
+        ideal = boundaries[-1] + chunk_seconds
+        candidates = [
+            (start + end) / 2 for start, end in silences
+            if ideal - search_seconds <= (start + end) / 2 <= ideal and (start + end) / 2 > boundaries[-1] + overlap
+        ]
+        # O silêncio mais próximo do tamanho ideal mantém os trechos equilibrados
+        boundaries.append(max(candidates) if candidates else ideal)
+    boundaries.append(duration)
+    return boundaries
+
+
+def chunk_ranges(boundaries, overlap=OVERLAP_SECONDS):
+    """Intervalos de áudio enviados para cada trecho, com a sobreposição aplicada"""
+    duration = boundaries[-1]
+    return [
+        (max(0.0, boundaries[i] - overlap), min(duration, boundaries[i + 1] + overlap))
+        for i in range(len(boundaries) - 1)
+    ]
+
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def response_segments(transcript, offset, end):
+    """Segmentos da resposta (verbose_json) com tempos absolutos; sem segmentos, o trecho vira um só"""
+    segments = _field(transcript, "segments") or []
+    if not segments:
+        return [{"start": offset, "end": end, "text": (_field(transcript, "text") or "").strip()}]
+    return [
+        {
+            "start": round(offset + float(_field(seg, "start")), 3),
+            "end": round(offset + float(_field(seg, "end")), 3),
+            "text": (_field(seg, "text") or "").strip(),
+        }
+        for seg in segments
+    ]
+
+
+def _words(text):
+    return [w.lower() for w in _WORD_RE.findall(text)]
+
+
+def _drop_repeated_prefix(previous_text, text, max_words=MAX_OVERLAP_WORDS):
+    """Remove do início de `text` as palavras que repetem o final de `previous_text`"""
+    tail = _words(previous_text)[-max_words:]
+    head_matches = list(_WORD_RE.finditer(text))[:max_words]
+    head = [m.group(0).lower() for m in head_matches]
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return text[head_matches[size - 1].end():].lstrip(" ,.;:!?-")
+    return text
+
+
+def stitch(chunk_segments, boundaries):
+    """Une os segmentos dos trechos, descartando as duplicatas da sobreposição"""
+    stitched = []
+    for index, segments in enumerate(chunk_segments):
+        owned_start, owned_end = boundaries[index], boundaries[index + 1]
+        last = index == len(chunk_segments) - 1
+        first_of_chunk = True
+        for seg in segments:
+            middle = (seg["start"] + seg["end"]) / 2
+            if middle < owned_start or (middle >= owned_end and not last):
+                continue
+            text = seg["text"]
+            if first_of_chunk and stitched:
+                text = _drop_repeated_prefix(stitched[-1]["text"], text)
+            first_of_chunk = False
+            if text:
+                stitched.append({"start": seg["start"], "end": seg["end"], "text": text})
+    return {"text": " ".join(seg["text"] for seg in stitched), "segments": stitched}
+
+
+class _ChunkedAudio:
+    """Planeja e extrai os trechos para um diretório temporário removido ao sair"""
+
+    def __init__(self, path, chunk_seconds, overlap):
+        self.path = Path(path)
+        self.chunk_seconds = chunk_seconds
+        self.overlap = overlap
+
+    def prepare(self):
+        duration, silences = detect_silences(self.path)
+        self.boundaries = plan_chunks(duration, silences, self.chunk_seconds, self.overlap)
+        self.ranges = chunk_ranges(self.boundaries, self.overlap)
+        self.tmpdir = tempfile.mkdtemp(prefix="monitorai-chunks-")
+        suffix = self.path.suffix or ".mp3"
+        self.files = [os.path.join(self.tmpdir, f"trecho_{i:03d}{suffix}") for i in range(len(self.ranges))]
+        return self
+
+    def extract(self, index):
+        start, end = self.ranges[index]
+        return extract_segment(self.path, start, end, self.files[index])
+
+    def cleanup(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.prepare()
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+def _transcribe_chunk(client, chunk_path, offset, end, model):
+    with open(chunk_path, "rb") as audio_file:
+        transcript = client.audio.transcriptions.create(
+            model=model, file=audio_file, response_format="verbose_json", timestamp_granularities=["segment"]
+        )
+    return response_segments(transcript, offset, end)
+
+
+def transcribe_long(client, path, model=MODELO_TRANSCRICAO, max_workers=4,
+                    chunk_seconds=CHUNK_SECONDS, overlap=OVERLAP_SECONDS):
+    """Transcreve um áudio longo em trechos paralelos; devolve {"text", "segments"}"""
+    with _ChunkedAudio(path, chunk_seconds, overlap) as chunks:
+
+        def work(index):
+            start, end = chunks.ranges[index]
+            return _transcribe_chunk(client, chunks.extract(index), start, end, model)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(work, range(len(chunks.ranges))))
+        return stitch(results, chunks.boundaries)
+
+
+async def transcribe_long_async(client, path, model=MODELO_TRANSCRICAO, concurrency=4,
+                                chunk_seconds=CHUNK_SECONDS, overlap=OVERLAP_SECONDS, run=None):
+    """Versão assíncrona (AsyncOpenAI); `run(make_call)` permite aplicar limites e novas tentativas por trecho"""
+    semaphore = asyncio.Semaphore(concurrency)
+    chunks = await asyncio.to_thread(_ChunkedAudio(path, chunk_seconds, overlap).prepare)
+    try:
+        async def call(chunk_path):
+            with open(chunk_path, "rb") as audio_file:
+                return await client.audio.transcriptions.create(
+                    model=model, file=audio_file, response_format="verbose_json", timestamp_granularities=["segment"]
+                )
+
+        async def work(index):
+            start, end = chunks.ranges[index]
+            async with semaphore:
+                chunk_path = await asyncio.to_thread(chunks.extract, index)
+                make_call = lambda: call(chunk_path)  # noqa: E731
+                transcript = await (run(make_call) if run else make_call())
+            return response_segments(transcript, start, end)
+
+        results = await asyncio.gather(*(work(i) for i in range(len(chunks.ranges))))
+        return stitch(results, chunks.boundaries)
+    finally:
+        chunks.cleanup()
@@ -0,0 +1,63 @@
+"""Memória da sessão do app: resultados por job, com limite de entradas e de bytes.
+
+Guarda o job concluído, as justificativas, as evidências e os PDFs já gerados de cada análise, para
+que os reruns do Streamlit (abrir um expander, trocar uma opção) apenas redesenhem a tela, sem reler
+o banco de jobs nem chamar a API.
+"""
+
+import json
+from collections import OrderedDict
+
+
+def _sizeof(value):
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+class SessionMemo:
+    """LRU de jobs: cada entrada é um dicionário campo -> valor (ex.: "job", "justificativas", "pdf")
+
+    Quando o limite de entradas ou de bytes é ultrapassado, o job usado há mais tempo sai inteiro.
+    """
+
+    def __init__(self, max_entries=4, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return sum(sum(sizes.values()) for sizes in self._sizes.values())
+
+    def get(self, key, field):
+        entry = self._entries.get(key)
+        if entry is None or field not in entry:
+            return None
+        self._entries.move_to_end(key)
+        return entry[field]
+
+    def put(self, key, field, value):
+        entry = self._entries.setdefault(key, {})
+        entry[field] = value
+        self._sizes.setdefault(key, {})[field] = _sizeof(value)
+        self._entries.move_to_end(key)
+        self._evict()
+        return value
+
+    def get_or_put(self, key, field, compute):
+        value = self.get(key, field)
+        return value if value is not None else self.put(key, field, compute())
+
+    def _evict(self):
+        # A entrada recém-usada (a última) nunca sai, mesmo que sozinha passe do limite de bytes
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self.discard(next(iter(self._entries)))
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+        self._sizes.pop(key, None)
@@ -0,0 +1,231 @@
+"""Etapas da análise (transcrição, avaliação e leitura do JSON) sem dependência do Streamlit."""
+
+import hashlib
+import json
+import time
+
+from monitorai.audio import AudioError
+from monitorai.cache import file_sha256, make_key
+from monitorai.longaudio import needs_chunking, transcribe_long
+from monitorai.preprocess import PREPROCESS_VERSION, PreparedAudio, prepare_audio
+from monitorai.prompt import AUDIO_FACTS_VERSION, MODELO_TRANSCRICAO, RUBRIC_VERSION, TEMPERATURA, build_messages
+from monitorai.segments import build_index, response_timestamps
+from monitorai.telemetry import (
+    ETAPA_AVALIACAO,
+    ETAPA_PREPROCESSAMENTO,
+    ETAPA_PROMPT,
+    ETAPA_TRANSCRICAO,
+    count,
+    span,
+    telemetry,
+)
+from monitorai.vad import measure_file, timing_metrics
+
+SAMPLING_PARAMS = {"temperature": TEMPERATURA, "response_format": {"type": "json_object"}}
+# Tempos por segmento e por palavra (índice de segmentos, em monitorai.segments)
+TIMESTAMP_GRANULARITIES = ["segment", "word"]
+
+
+def extract_json(text):
+    start_idx = text.find('{')
+    end_idx = text.rfind('}')
+    if start_idx != -1 and end_idx != -1:
+        try:
+            return json.loads(text[start_idx:end_idx+1])
+        except Exception:
+            pass
+    raise ValueError("Não foi possível extrair JSON válido")
+
+
+def parse_analysis(result):
+    """Converte a resposta bruta do modelo no dicionário de análise"""
+    result = result.strip()
+    if not result.startswith("{"):
+        return extract_json(result)
+    return json.loads(result)
+
+
+def completion_kwargs(transcript_text, model, tempos=None, compact=False):
+    """Parâmetros do chat completions usados na avaliação (`tempos`: medições de monitorai.vad; `compact`: monitorai.compact)"""
+    with span(ETAPA_PROMPT, caracteres=len(transcript_text)):
+        return {"model": model, "messages": build_messages(transcript_text, tempos, compact), **SAMPLING_PARAMS}
+
+
+def analysis_cache_key(transcript_text, model, rubric_version=RUBRIC_VERSION, params=None, tempos=None, indice=None):
+    """Chave do cache de análise: transcrição + versão da rubrica + modelo + parâmetros de amostragem
+
+    As medições do áudio e o índice de segmentos (motor por grupo, com janelas) entram quando usados no prompt.
+    """
+    transcript_sha256 = hashlib.sha256(transcript_text.encode("utf-8")).hexdigest()
+    context = {}
+    if tempos:
+        context.update(tempos=tempos, versao=AUDIO_FACTS_VERSION)
+    if indice:
+        context["indice"] = make_key(indice.get("segmentos"))
+    if context:
+        return make_key("analise", transcript_sha256, rubric_version, model, params or SAMPLING_PARAMS, context)
+    return make_key("analise", transcript_sha256, rubric_version, model, params or SAMPLING_PARAMS)
+
+
+def transcript_cache_key(audio_sha256, model, params=None):
+    """Chave do cache de transcrição: conteúdo do áudio + modelo + parâmetros da transcrição"""
+    return make_key("transcricao", audio_sha256, model, params or {})
+
+
+def _audio_seconds(result):
+    """Duração do áudio informada pelo verbose_json (ou o fim do último segmento)"""
+    if result.get("duration"):
+        return float(result["duration"])
+    segments = result.get("segments") or []
+    return float(segments[-1]["end"]) if segments else 0.0
+
+
+def transcript_params(preprocess):
+    """Parâmetros da chave do cache de transcrição (o áudio pré-processado tem transcrição própria)"""
+    return {"preprocess": PREPROCESS_VERSION} if preprocess else None
+
+
+def prepare_upload(path):
+    """Pré-processa o áudio para o upload; se o ffmpeg falhar, segue com o arquivo original"""
+    with span(ETAPA_PREPROCESSAMENTO) as sp:
+        try:
+            prepared = prepare_audio(path)
+        except AudioError as error:
+            sp.set(erro=f"AudioError: {error}")
+            return PreparedAudio(path, None)
+        sp.set(**{name: prepared.stats[name] for name in ("bytes_economizados", "segundos_economizados")})
+    count("bytes_economizados", prepared.stats["bytes_economizados"])
+    count("segundos_economizados", prepared.stats["segundos_economizados"])
+    return prepared
+
+
+def measure_timing(path, prepared=None):
+    """Tempos da ligação (monitorai.vad) pelos níveis do pré-processamento ou decodificando o arquivo; None se falhar"""
+    if prepared is not None and prepared.levels is not None:
+        return timing_metrics(prepared.levels)
+    with span(ETAPA_PREPROCESSAMENTO, vad=True) as sp:
+        try:
+            return measure_file(path)
+        except AudioError as error:
+            sp.set(erro=f"AudioError: {error}")
+            return None
+
+
+def verbose_result(transcript):
+    """Resultado de uma resposta verbose_json: text, duration, segments e words"""
+    segments, words = response_timestamps(transcript)
+    return {"text": transcript.text, "duration": getattr(transcript, "duration", None), "segments": segments, "words": words}
+
+
+def finish_transcription(result, prepared):
+    """Troca segments/words pelo índice compacto (no tempo da gravação original) e anota o pré-processamento"""
+    # A duração (segundos cobrados) é a do áudio enviado; só os tempos do índice voltam ao tempo da gravação
+    result["duration"] = _audio_seconds(result)
+    segments, words = result.pop("segments", None) or [], result.pop("words", None) or []
+    offset = prepared.offset if prepared.stats is not None else 0.0
+    for entry in segments + words:
+        entry["start"] += offset
+        if "end" in entry:
+            entry["end"] += offset
+    result["indice"] = build_index(segments, words)
+    if prepared.stats is not None:
+        result["preprocessamento"] = prepared.stats
+    return result
+
+
+def transcribe_audio(client, path, model=MODELO_TRANSCRICAO, cache=None, audio_sha256=None, preprocess=False):
+    """Transcreve um arquivo de áudio e devolve o resultado (text, duration, indice, tempos e, com `preprocess`, preprocessamento)"""
+    key = None
+    if cache is not None:
+        started = time.perf_counter()
+        key = transcript_cache_key(audio_sha256 or file_sha256(path), model, transcript_params(preprocess))
+        cached = cache.get(key)
+        if cached is not None:
+            telemetry.record(ETAPA_TRANSCRICAO, time.perf_counter() - started, modelo=model, cache_hit=True,
+                             audio_s=_audio_seconds(cached))
+            if "tempos" not in cached:
+                # Transcrição gravada antes das medições de tempo: mede agora e completa o cache
+                cached["tempos"] = measure_timing(path)
+                cache.set(key, cached)
+            return cached
+    prepared = prepare_upload(path) if preprocess else PreparedAudio(path, None)
+    with prepared, span(ETAPA_TRANSCRICAO, modelo=model, cache_hit=False) as sp:
+        if needs_chunking(prepared.path):
+            # Acima do limite de upload: trechos transcritos em paralelo e recompostos
+            result = transcribe_long(client, prepared.path, model)
+            sp.set(trechos=True)
+        else:
+            with open(prepared.path, "rb") as audio_file:
+                # verbose_json informa a duração do áudio (segundos transcritos, base do custo) e os timestamps
+                transcript = client.audio.transcriptions.create(
+                    model=model, file=audio_file, response_format="verbose_json", timestamp_granularities=TIMESTAMP_GRANULARITIES
+                )
+            result = verbose_result(transcript)
+        sp.set(audio_s=_audio_seconds(result))
+    finish_transcription(result, prepared)
+    result["tempos"] = measure_timing(path, prepared)
+    if key is not None:
+        cache.set(key, result)
+    return result
+
+
+def transcribe_file(client, path, model=MODELO_TRANSCRICAO, cache=None, audio_sha256=None, preprocess=False):
+    """Transcreve um arquivo de áudio e devolve o texto (consultando o cache, se houver)"""
+    return transcribe_audio(client, path, model, cache, audio_sha256, preprocess)["text"]
+
+
+def request_completion(client, transcript_text, model, tempos=None, compact=False):
+    """Envia a transcrição para avaliação; devolve (conteúdo bruto, finish_reason)"""
+    kwargs = completion_kwargs(transcript_text, model, tempos, compact)
+    with span(ETAPA_AVALIACAO, modelo=model) as sp:
+        response = client.chat.completions.create(**kwargs)
+        sp.usage(response.usage)
+    choice = response.choices[0]
+    return choice.message.content.strip(), choice.finish_reason
+
+
+def request_analysis(client, transcript_text, model, tempos=None, compact=False):
+    """Envia a transcrição para avaliação e devolve o conteúdo bruto da resposta"""
+    return request_completion(client, transcript_text, model, tempos, compact)[0]
+
+
+def stream_analysis(client, transcript_text, model, tempos=None, compact=False):
+    """Gera os pedaços de texto da resposta da avaliação conforme chegam (stream=True)"""
+    kwargs = completion_kwargs(transcript_text, model, tempos, compact)
+    with span(ETAPA_AVALIACAO, modelo=model, stream=True, compacto=compact) as sp:
+        started = time.perf_counter()
+        # include_usage: o último pedaço (sem choices) traz a contagem de tokens
+        stream = client.chat.completions.create(**kwargs, stream=True, stream_options={"include_usage": True})
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if "primeiro_token_s" not in sp.attrs:
+                    sp.set(primeiro_token_s=round(time.perf_counter() - started, 3))
+                yield chunk.choices[0].delta.content
+            if getattr(chunk, "usage", None):
+                sp.usage(chunk.usage)
+
+
+async def transcribe_audio_async(client, path, model=MODELO_TRANSCRICAO):
+    """Versão assíncrona da chamada de transcribe_audio (AsyncOpenAI); devolve o resultado de verbose_result"""
+    with span(ETAPA_TRANSCRICAO, modelo=model, cache_hit=False) as sp:
+        with open(path, "rb") as audio_file:
+            transcript = await client.audio.transcriptions.create(
+                model=model, file=audio_file, response_format="verbose_json", timestamp_granularities=TIMESTAMP_GRANULARITIES
+            )
+        sp.set(audio_s=float(getattr(transcript, "duration", None) or 0.0))
+    return verbose_result(transcript)
+
+
+async def request_completion_async(client, transcript_text, model, tempos=None):
+    """Versão assíncrona de request_completion (AsyncOpenAI)"""
+    kwargs = completion_kwargs(transcript_text, model, tempos)
+    with span(ETAPA_AVALIACAO, modelo=model) as sp:
+        response = await client.chat.completions.create(**kwargs)
+        sp.usage(response.usage)
+    choice = response.choices[0]
+    return choice.message.content.strip(), choice.finish_reason
+
+
+async def request_analysis_async(client, transcript_text, model, tempos=None):
+    """Versão assíncrona de request_analysis (AsyncOpenAI)"""
+    return (await request_completion_async(client, transcript_text, model, tempos))[0]
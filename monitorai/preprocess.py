@@ -0,0 +1,184 @@
+"""Pré-processamento do áudio antes da transcrição: mono, 16 kHz, Opus compacto e sem silêncio nas pontas.
+
+Uma única execução do ffmpeg decodifica o arquivo e produz ao mesmo tempo o PCM (mono, 16 kHz,
+lido em blocos de tamanho fixo, com memória constante mesmo em gravações de horas) e a versão
+recodificada em Opus. A energia de cada quadro de 20 ms é calculada com NumPy sobre o PCM; o
+início e o fim da fala definem o corte, feito em seguida sem recodificar.
+
+A transcrição fica mais rápida (upload menor) e mais barata (menos segundos cobrados), e uma
+hora de ligação cabe num único upload sem precisar ser dividida em trechos.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+# O NumPy é importado dentro das funções: o app importa este módulo (e o vad, pelo prompt) sem carregá-lo
+from monitorai.audio import FFMPEG, AudioError, run_ffmpeg
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.02
+BLOCK_SECONDS = 30
+# Opus em modo voz: ~180 KB por minuto de ligação
+CODEC_ARGS = ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]
+OUTPUT_SUFFIX = ".ogg"
+# Limiar de fala: ao menos NOISE_MARGIN_DB acima do ruído de fundo (percentil NOISE_PERCENTILE dos
+# quadros) e nunca abaixo de SILENCE_DB (dBFS)
+SILENCE_DB = -45.0
+NOISE_MARGIN_DB = 10.0
+NOISE_PERCENTILE = 5
+MIN_SPEECH_SECONDS = 0.2
+TRIM_PADDING_SECONDS = 0.3
+MIN_TRIM_SECONDS = 1.0
+# Muda quando o pré-processamento muda (entra na chave do cache de transcrições)
+PREPROCESS_VERSION = "opus24k-mono16k-trim2"
+
+FRAME = int(SAMPLE_RATE * FRAME_SECONDS)
+
+
+def preprocess_enabled():
+    """Ligado por padrão; MONITORAI_PREPROCESS=0 envia o arquivo original"""
+    return os.environ.get("MONITORAI_PREPROCESS", "1").strip().lower() not in ("0", "false", "nao", "não", "")
+
+
+def stream_pcm(path, block_seconds=BLOCK_SECONDS, extra_outputs=()):
+    """Gera blocos de amostras int16 (mono, 16 kHz); `extra_outputs` acrescenta saídas ao mesmo ffmpeg"""
+    import numpy as np
+    command = [
+        FFMPEG, "-hide_banner", "-nostdin", "-loglevel", "error", "-i", str(path),
+        "-map", "0:a:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1", *extra_outputs,
+    ]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError as error:
+        raise AudioError(f"ffmpeg não encontrado ({FFMPEG}); instale-o ou defina FFMPEG_BINARY") from error
+    block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[: len(data) - len(data) % 2], dtype=np.int16)
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read().decode("utf-8", errors="replace").strip()
+        process.stderr.close()
+        process.wait()
+    if process.returncode != 0:
+        raise AudioError(stderr.splitlines()[-1] if stderr else "ffmpeg falhou ao decodificar o áudio")
+
+
+def frame_levels(samples, frame=FRAME):
+    """Nível RMS (dBFS) de cada quadro completo de `frame` amostras"""
+    import numpy as np
+    count = len(samples) // frame
+    frames = samples[: count * frame].astype(np.float32).reshape(count, frame) / 32768.0
+    return 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+
+def levels_from_blocks(blocks, frame=FRAME):
+    """(níveis de todos os quadros, duração em segundos) a partir dos blocos de stream_pcm"""
+    import numpy as np
+    levels = []
+    carry = np.empty(0, dtype=np.int16)
+    total = 0
+    for block in blocks:
+        total += len(block)
+        samples = np.concatenate((carry, block)) if len(carry) else block
+        usable = len(samples) - len(samples) % frame
+        levels.append(frame_levels(samples[:usable], frame))
+        carry = samples[usable:]
+    levels = np.concatenate(levels) if levels else np.empty(0, dtype=np.float32)
+    return levels.astype(np.float32), total / SAMPLE_RATE
+
+
+def speech_threshold(levels):
+    import numpy as np
+    if not len(levels):
+        return SILENCE_DB
+    return max(SILENCE_DB, float(np.percentile(levels, NOISE_PERCENTILE)) + NOISE_MARGIN_DB)
+
+
+def speech_bounds(levels, threshold=None, min_speech=MIN_SPEECH_SECONDS):
+    """(início, fim) da fala em segundos, ignorando estalos mais curtos que `min_speech`; None sem fala"""
+    import numpy as np
+    threshold = speech_threshold(levels) if threshold is None else threshold
+    run = max(1, int(round(min_speech / FRAME_SECONDS)))
+    active = (levels > threshold).astype(np.int32)
+    if len(active) < run:
+        return None
+    # Quadros que iniciam uma sequência de `run` quadros com fala
+    starts = np.flatnonzero(np.convolve(active, np.ones(run, dtype=np.int32), mode="valid") == run)
+    if not len(starts):
+        return None
+    return float(starts[0] * FRAME_SECONDS), float((starts[-1] + run) * FRAME_SECONDS)
+
+
+class PreparedAudio:
+    """Áudio pronto para a transcrição; `offset` é o trecho cortado do início (para ajustar timestamps)"""
+
+    def __init__(self, path, stats, offset=0.0, levels=None, tmpdir=None):
+        self.path = path
+        self.stats = stats
+        self.offset = offset
+        self.levels = levels
+        self._tmpdir = tmpdir
+
+    def cleanup(self):
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+def prepare_audio(path, padding=TRIM_PADDING_SECONDS, min_trim=MIN_TRIM_SECONDS):
+    """Recodifica e corta os silêncios das pontas; devolve PreparedAudio (o original, se não houver ganho)"""
+    original_bytes = os.path.getsize(path)
+    tmpdir = tempfile.mkdtemp(prefix="monitorai-audio-")
+    try:
+        encoded = os.path.join(tmpdir, "completo" + OUTPUT_SUFFIX)
+        outputs = ["-map", "0:a:0", "-ac", "1", "-ar", str(SAMPLE_RATE), *CODEC_ARGS, "-y", encoded]
+        levels, duration = levels_from_blocks(stream_pcm(path, extra_outputs=outputs))
+
+        start, end = 0.0, duration
+        bounds = speech_bounds(levels)
+        if bounds is not None:
+            start = max(0.0, bounds[0] - padding)
+            end = min(duration, bounds[1] + padding)
+        output = encoded
+        if bounds is not None and start + (duration - end) >= min_trim:
+            output = os.path.join(tmpdir, "cortado" + OUTPUT_SUFFIX)
+            run_ffmpeg(["-loglevel", "error", "-ss", f"{start:.3f}", "-to", f"{end:.3f}", "-i", encoded,
+                        "-c", "copy", "-y", output])
+        else:
+            start, end = 0.0, duration
+
+        size = os.path.getsize(output)
+        stats = {
+            "bytes_originais": original_bytes,
+            "bytes": size,
+            "duracao_original_s": round(duration, 3),
+            "duracao_s": round(end - start, 3),
+            "corte_inicio_s": round(start, 3),
+            "corte_fim_s": round(duration - end, 3),
+        }
+        if size >= original_bytes and start == 0.0 and end == duration:
+            # Nada a ganhar (arquivo já compacto e sem silêncio nas pontas): envia o original
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            stats.update(bytes=original_bytes, bytes_economizados=0, segundos_economizados=0.0)
+            return PreparedAudio(path, stats, levels=levels)
+        stats.update(bytes_economizados=original_bytes - size, segundos_economizados=round(duration - (end - start), 3))
+        return PreparedAudio(output, stats, offset=start, levels=levels, tmpdir=tmpdir)
+    except BaseException:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
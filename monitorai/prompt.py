@@ -0,0 +1,340 @@
+"""Prompt de avaliação por grupos (rubrica Carglass) compartilhado entre a interface e o modo em lote."""
+
+import hashlib
+
+from monitorai.vad import ESPERA_MIN_SECONDS, PAUSA_MIN_SECONDS, format_clock
+
+MODELO_PADRAO = "gpt-4o"
+# Modelo rápido e barato da avaliação em cascata (monitorai.cascade)
+MODELO_RAPIDO = "gpt-4o-mini"
+MODELO_TRANSCRICAO = "whisper-1"
+TEMPERATURA = 0.3
+
+# Motores de avaliação (app, fila de análises, modo em lote e reavaliação)
+ENGINE_SINGLE = "unico"
+ENGINE_GROUPS = "grupos"
+ENGINE_CASCADE = "cascata"
+
+
+
+def final_model(analysis, model):
+    """Modelo que produziu a análise (na cascata, o rápido quando não houve escalonamento)"""
+    return (analysis.get("cascata") or {}).get("modelo_final", model)
+
+
+SYSTEM_PROMPT = "Você é um analista especializado em atendimento. Responda APENAS com JSON, sem texto adicional."
+
+# Blocos do prompt. A rubrica fica separada da transcrição e do formato de saída para ser
+# reaproveitada pelo motor de avaliação por grupo (monitorai.fanout)
+PROMPT_INTRO = """
+Você é um especialista em atendimento ao cliente da Carglass. Avalie a transcrição usando o sistema de GRUPOS.
+
+"""
+
+TRANSCRIPT_BLOCK = """TRANSCRIÇÃO:
+\"\"\"{transcript_text}\"\"\"
+
+"""
+
+RUBRICA = """⚠️ LÓGICA DE AVALIAÇÃO POR GRUPOS - REGRA CRÍTICA:
+Cada GRUPO só é considerado "FEITO" se TODOS os itens dentro dele receberem "sim".
+Se QUALQUER item de um grupo receber "não", o GRUPO INTEIRO é marcado como "NÃO FEITO" e recebe 0%.
+
+ESTRUTURA DE GRUPOS:
+
+**GRUPO A (10%): Utilizou adequadamente as técnicas do atendimento?**
+Itens que compõem este grupo:
+- Item 1 (peso interno 10): Atendeu a ligação prontamente, dentro de 5 seg. e utilizou a saudação correta com as técnicas do atendimento encantador?
+- Item 3 (peso interno 6): Confirmou os dados do cadastro e pediu 2 telefones para contato?
+- Item 4 (peso interno 2): Verbalizou o script da LGPD?
+- Item 5 (peso interno 5): Utilizou a técnica do eco para garantir o entendimento sobre as informações coletadas?
+
+**GRUPO B (30%): Adotou o procedimento de acordo com a rotina/transmitiu informações corretas e completas?**
+Itens que compõem este grupo:
+- Item 6 (peso interno 3): Escutou atentamente a solicitação do segurado evitando solicitações em duplicidade?
+- Item 7 (peso interno 5): Compreendeu a solicitação do cliente em linha e demonstrou domínio sobre o produto/serviço?
+- Item 9 (peso interno 10): Confirmou as informações completas sobre o dano no veículo?
+- Item 10 (peso interno 10): Confirmou cidade para o atendimento e selecionou corretamente a primeira opção de loja identificada pelo sistema?
+
+**GRUPO C (10%): Foi objetivo, contribuindo para redução do TMA?**
+Itens que compõem este grupo:
+- Item 11 (peso interno 5): A comunicação com o cliente foi eficaz: não houve uso de gírias, linguagem inadequada ou conversas paralelas? O analista informou quando ficou ausente da linha e quando retornou?
+- Item 12 (peso interno 4): A conduta do analista foi acolhedora, com sorriso na voz, empatia e desejo verdadeiro em entender e solucionar a solicitação do cliente?
+
+**GRUPO D (20%): Utilizou adequadamente o sistema e efetuou os registros de maneira correta e completa?**
+Itens que compõem este grupo:
+- Item 14 (peso interno 15): Realizou o script de encerramento completo, informando: prazo de validade, franquia, link de acompanhamento e vistoria, e orientou que o cliente aguarde o contato para agendamento?
+- Item 15 (peso interno 6): Orientou o cliente sobre a pesquisa de satisfação do atendimento?
+
+**GRUPO E (10%): Transferiu a ligação ao superior quando solicitado e/ou necessário?**
+REGRA ESPECIAL PARA GRUPO E:
+- No modelo atual, colaboradores são incentivados a serem protagonistas do atendimento (autonomia)
+- Buscam auxílio quando necessário, mas são responsáveis por concluir as solicitações
+- Superiores monitoram e apoiam, mas NÃO assumem as chamadas
+
+AVALIAÇÃO:
+- Se NÃO transferiu/acionou superior = VERDE (Totalmente Certo) = +10% na pontuação
+- Se transferiu/acionou superior = VERMELHO (Totalmente Incorreto) = 0% na pontuação
+
+Marque "feito: true" se o atendente NÃO transferiu e resolveu com autonomia.
+Marque "feito: false" se o atendente transferiu ou acionou o superior.
+
+**GRUPO F (20%): Teve foco no cliente?**
+Avalie o foco no cliente durante TODO o atendimento:
+- Priorizou as necessidades do cliente?
+- Manteve empatia e interesse genuíno?
+- Buscou a melhor solução para o cliente?
+- Demonstrou comprometimento em resolver o problema?
+Este grupo conta 20% na pontuação total.
+
+INSTRUÇÕES DETALHADAS PARA CADA ITEM:
+
+**ITEM 5 - TÉCNICA DO ECO (AVALIAÇÃO RIGOROSA):**
+Marque como "SIM" SE QUALQUER UMA das condições abaixo for atendida:
+
+CONDIÇÃO A - SOLETRAÇÃO FONÉTICA (APROVAÇÃO AUTOMÁTICA):
+- Soletração fonética de QUALQUER informação (placa, telefone, CPF)
+- Exemplos: "R de rato, W de Washington", "rato, sapo, xícara", "A de avião, B de bola"
+- Uma única soletração fonética é suficiente
+
+CONDIÇÃO B - ECO MÚLTIPLO:
+- Repetiu (completa ou parcialmente) PELO MENOS 2 informações: placa, telefone principal, CPF, telefone secundário
+
+CONDIÇÃO C - ECO PARCIAL (APROVAÇÃO FLEXÍVEL):
+- Repetiu parte significativa de uma informação principal
+- Exemplos: "0800-703-0203" → "0203" (últimos dígitos)
+- Eco parcial de 3+ dígitos finais é válido mesmo sem confirmação explícita
+
+CONDIÇÃO D - ECO INTERROGATIVO CONFIRMADO:
+- Repetiu informação com tom interrogativo E cliente confirmou
+- Exemplos: "54-3381-5775?" → Cliente: "Isso"
+
+NÃO É ECO VÁLIDO: Apenas "ok", "certo", "entendi" sem repetir informação
+
+**ITEM 3 - SOLICITAÇÃO DE DADOS (AVALIAÇÃO RIGOROSA):**
+Marque como "SIM" APENAS se o atendente solicitou EXPLICITAMENTE TODOS os 6 dados:
+1. NOME do cliente
+2. CPF do cliente
+3. PLACA do veículo
+4. ENDEREÇO do cliente
+5. TELEFONE PRINCIPAL
+6. TELEFONE SECUNDÁRIO
+
+EXCEÇÃO BRADESCO/SURA/ALD: CPF e endereço podem ser dispensados APENAS se o atendente CONFIRMAR que já estão no sistema.
+
+**ITEM 4 - SCRIPT LGPD:**
+Válido se mencionar compartilhamento do telefone com prestador, com ênfase em privacidade/consentimento.
+Variações aceitas:
+- "Você permite que compartilhemos seu telefone com o prestador?"
+- "Podemos informar seu telefone ao prestador que irá atender?"
+- "Você autoriza o envio de notificações no WhatsApp?"
+
+**ITEM 14 - SCRIPT DE ENCERRAMENTO:**
+Deve incluir TODOS os elementos:
+- Prazo de validade
+- Franquia
+- Link de acompanhamento e vistoria
+- Orientação para aguardar contato para agendamento
+
+**CRITÉRIOS ELIMINATÓRIOS:**
+- Ofereceu serviço sem direito
+- Preencheu veículo/peça incorretos
+- Agiu com rudeza
+- Encerrou/transferiu sem conhecimento do cliente
+- Falou negativamente da empresa
+- Forneceu informações incorretas ou fez suposições infundadas
+- Comentou sobre serviços externos
+
+"""
+
+# Formato de saída do prompt único; usado com str.format, por isso as chaves literais ficam duplicadas ({{ }})
+OUTPUT_SPEC = """RETORNE APENAS JSON (sem ``` ou texto adicional):
+
+{{
+  "status_final": {{
+    "satisfacao": "satisfeito/insatisfeito/neutro",
+    "risco": "baixo/médio/alto",
+    "desfecho": "resolvido/pendente/não resolvido"
+  }},
+  "grupos_avaliacao": [
+    {{
+      "grupo": "A",
+      "nome": "Utilizou adequadamente as técnicas do atendimento?",
+      "percentual": 10,
+      "feito": true/false,
+      "justificativa": "Explicação detalhada considerando TODOS os itens (1, 3, 4, 5) do grupo"
+    }},
+    {{
+      "grupo": "B",
+      "nome": "Adotou o procedimento de acordo com a rotina/transmitiu informações corretas e completas?",
+      "percentual": 30,
+      "feito": true/false,
+      "justificativa": "Explicação detalhada considerando TODOS os itens (6, 7, 9, 10) do grupo"
+    }},
+    {{
+      "grupo": "C",
+      "nome": "Foi objetivo, contribuindo para redução do TMA?",
+      "percentual": 10,
+      "feito": true/false,
+      "justificativa": "Explicação detalhada considerando TODOS os itens (11, 12) do grupo"
+    }},
+    {{
+      "grupo": "D",
+      "nome": "Utilizou adequadamente o sistema e efetuou os registros de maneira correta e completa?",
+      "percentual": 20,
+      "feito": true/false,
+      "justificativa": "Explicação detalhada considerando TODOS os itens (14, 15) do grupo"
+    }},
+    {{
+      "grupo": "E",
+      "nome": "Transferiu a ligação ao superior quando solicitado e/ou necessário?",
+      "percentual": 10,
+      "feito": true/false,
+      "justificativa": "Se NÃO transferiu (autonomia) = true (+10%). Se transferiu = false (0%). Explicar se houve transferência ou se resolveu com autonomia."
+    }},
+    {{
+      "grupo": "F",
+      "nome": "Teve foco no cliente?",
+      "percentual": 20,
+      "feito": true/false,
+      "justificativa": "Análise detalhada do foco no cliente durante TODO o atendimento: priorizou necessidades, manteve empatia, buscou melhor solução, demonstrou comprometimento"
+    }}
+  ],
+  "checklist_detalhado": [
+    {{"item": 1, "grupo": "A", "criterio": "Atendeu prontamente e usou saudação correta", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 3, "grupo": "A", "criterio": "Confirmou cadastro e pediu 2 telefones", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 4, "grupo": "A", "criterio": "Verbalizou script LGPD", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 5, "grupo": "A", "criterio": "Utilizou técnica do eco", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 6, "grupo": "B", "criterio": "Escutou atentamente", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 7, "grupo": "B", "criterio": "Demonstrou domínio", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 9, "grupo": "B", "criterio": "Confirmou danos no veículo", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 10, "grupo": "B", "criterio": "Confirmou cidade", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 11, "grupo": "C", "criterio": "Comunicação eficaz", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 12, "grupo": "C", "criterio": "Conduta acolhedora", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 14, "grupo": "D", "criterio": "Script encerramento completo", "resposta": "sim/não", "justificativa": "..."}},
+    {{"item": 15, "grupo": "D", "criterio": "Orientou sobre pesquisa", "resposta": "sim/não", "justificativa": "..."}}
+  ],
+  "criterios_eliminatorios": [
+    {{"criterio": "Ofereceu serviço sem direito?", "ocorreu": false, "justificativa": "..."}},
+    {{"criterio": "Preencheu veículo/peça incorretos?", "ocorreu": false, "justificativa": "..."}},
+    {{"criterio": "Agiu de forma rude?", "ocorreu": false, "justificativa": "..."}},
+    {{"criterio": "Encerrou/transferiu sem conhecimento?", "ocorreu": false, "justificativa": "..."}},
+    {{"criterio": "Falou negativamente da empresa?", "ocorreu": false, "justificativa": "..."}},
+    {{"criterio": "Forneceu informações incorretas?", "ocorreu": false, "justificativa": "..."}},
+    {{"criterio": "Comentou sobre serviços externos?", "ocorreu": false, "justificativa": "..."}}
+  ],
+  "pontuacao_total_percentual": (soma dos percentuais dos grupos onde feito=true),
+  "resumo_geral": "Resumo executivo do atendimento, destacando pontos fortes e áreas de melhoria"
+}}
+
+CÁLCULO DA PONTUAÇÃO:
+- Some APENAS os percentuais dos grupos onde TODOS os itens = "sim" (feito=true)
+- Exemplo: Se grupos A, C, E e F estão completos → 10% + 10% + 10% + 20% = 50%
+- IMPORTANTE: Grupo E vale 10% SE o atendente NÃO transferiu (demonstrou autonomia)
+- Pontuação máxima possível: 100%
+"""
+
+# Formato de saída do modo compacto (monitorai.compact): só veredictos e evidências curtas. Nomes,
+# critérios, grupos A–D e pontuação são completados localmente; as justificativas são pedidas depois
+COMPACT_OUTPUT_SPEC = """RETORNE APENAS JSON (sem ``` ou texto adicional), SEM justificativas:
+
+{{
+  "status_final": {{
+    "satisfacao": "satisfeito/insatisfeito/neutro",
+    "risco": "baixo/médio/alto",
+    "desfecho": "resolvido/pendente/não resolvido"
+  }},
+  "checklist_detalhado": [
+    {{"item": 1, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 3, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 4, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 5, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 6, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 7, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 9, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 10, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 11, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 12, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 14, "resposta": "sim/não", "evidencia": "..."}},
+    {{"item": 15, "resposta": "sim/não", "evidencia": "..."}}
+  ],
+  "grupos_avaliacao": [
+    {{"grupo": "E", "feito": true/false}},
+    {{"grupo": "F", "feito": true/false}}
+  ],
+  "criterios_eliminatorios": [
+    {{"criterio": "Ofereceu serviço sem direito?", "ocorreu": false}},
+    {{"criterio": "Preencheu veículo/peça incorretos?", "ocorreu": false}},
+    {{"criterio": "Agiu de forma rude?", "ocorreu": false}},
+    {{"criterio": "Encerrou/transferiu sem conhecimento?", "ocorreu": false}},
+    {{"criterio": "Falou negativamente da empresa?", "ocorreu": false}},
+    {{"criterio": "Forneceu informações incorretas?", "ocorreu": false}},
+    {{"criterio": "Comentou sobre serviços externos?", "ocorreu": false}}
+  ],
+  "resumo_geral": "Resumo executivo do atendimento em até 2 frases"
+}}
+
+EVIDÊNCIA: copie da transcrição, sem alterar, o trecho curto (até 12 palavras) que decide o item; use "" quando a decisão vem da falta de uma fala.
+Quando um critério eliminatório ocorreu, acrescente "evidencia" a ele da mesma forma.
+Os grupos A a D e a pontuação total são calculados pelo sistema a partir dos itens: não os informe.
+"""
+
+# Tempos medidos na gravação (monitorai.vad), logo depois da transcrição quando disponíveis
+AUDIO_FACTS_BLOCK = """MEDIÇÕES DO ÁUDIO (calculadas diretamente da gravação; use-as como FATOS, não estime tempos pela transcrição):
+{audio_facts}
+- Item 1: o prazo de 5 seg. é verificado pela primeira fala medida acima.
+- Item 11: silêncios longos indicam que o analista deixou a linha; confira na transcrição se houve aviso ao sair e ao retornar.
+
+"""
+
+PROMPT_TEMPLATE = PROMPT_INTRO + TRANSCRIPT_BLOCK + RUBRICA + OUTPUT_SPEC
+PROMPT_TEMPLATE_WITH_FACTS = PROMPT_INTRO + TRANSCRIPT_BLOCK + AUDIO_FACTS_BLOCK + RUBRICA + OUTPUT_SPEC
+PROMPT_TEMPLATE_COMPACT = PROMPT_INTRO + TRANSCRIPT_BLOCK + RUBRICA + COMPACT_OUTPUT_SPEC
+PROMPT_TEMPLATE_COMPACT_WITH_FACTS = PROMPT_INTRO + TRANSCRIPT_BLOCK + AUDIO_FACTS_BLOCK + RUBRICA + COMPACT_OUTPUT_SPEC
+
+# Identifica a versão da rubrica: qualquer alteração no texto do prompt invalida os resultados em cache
+RUBRIC_VERSION = hashlib.sha256((SYSTEM_PROMPT + PROMPT_TEMPLATE).encode("utf-8")).hexdigest()[:16]
+COMPACT_RUBRIC_VERSION = hashlib.sha256((SYSTEM_PROMPT + PROMPT_TEMPLATE_COMPACT).encode("utf-8")).hexdigest()[:16]
+AUDIO_FACTS_VERSION = hashlib.sha256(AUDIO_FACTS_BLOCK.encode("utf-8")).hexdigest()[:16]
+
+
+def format_audio_facts(tempos):
+    """Linhas do bloco de medições a partir de monitorai.vad.timing_metrics"""
+    if tempos.get("primeira_fala_s") is None:
+        return "- Nenhuma fala detectada na gravação."
+    lines = [
+        f"- Primeira fala: {tempos['primeira_fala_s']:.1f} s após o início da gravação",
+        f"- Duração da gravação: {format_clock(tempos['duracao_s'])}; fala em {tempos['proporcao_fala']:.0%} do tempo, "
+        f"silêncio em {tempos['proporcao_silencio']:.0%}",
+        f"- Pausas de {PAUSA_MIN_SECONDS:g} s ou mais durante a conversa: {tempos['pausas']}; maior silêncio: {tempos['maior_silencio_s']:.0f} s",
+    ]
+    if tempos["esperas"]:
+        esperas = "; ".join(f"aos {format_clock(espera['inicio_s'])} por {espera['duracao_s']:.0f} s" for espera in tempos["esperas"])
+        lines.append(f"- Silêncios de {ESPERA_MIN_SECONDS:g} s ou mais (linha muda / espera): {len(tempos['esperas'])} ({esperas})")
+    else:
+        lines.append(f"- Nenhum silêncio de {ESPERA_MIN_SECONDS:g} s ou mais (linha muda / espera)")
+    return "\n".join(lines)
+
+
+def audio_facts_block(tempos):
+    """Bloco de medições para o prompt; vazio sem medições"""
+    return AUDIO_FACTS_BLOCK.format(audio_facts=format_audio_facts(tempos)) if tempos else ""
+
+
+def build_prompt(transcript_text, tempos=None, compact=False):
+    """Monta o prompt de avaliação para uma transcrição (com as medições do áudio, se houver)"""
+    if compact:
+        template = PROMPT_TEMPLATE_COMPACT_WITH_FACTS if tempos else PROMPT_TEMPLATE_COMPACT
+    else:
+        template = PROMPT_TEMPLATE_WITH_FACTS if tempos else PROMPT_TEMPLATE
+    if tempos:
+        return template.format(transcript_text=transcript_text, audio_facts=format_audio_facts(tempos))
+    return template.format(transcript_text=transcript_text)
+
+
+def build_messages(transcript_text, tempos=None, compact=False):
+    """Mensagens do chat completions para a avaliação de uma transcrição (`compact`: só veredictos)"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_prompt(transcript_text, tempos, compact)},
+    ]
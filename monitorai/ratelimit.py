@@ -0,0 +1,105 @@
+"""Limite de requisições/tokens por minuto e novas tentativas com backoff para chamadas assíncronas."""
+
+import asyncio
+import random
+import time
+
+from monitorai.telemetry import count
+
+
+def retryable_errors():
+    """Erros transitórios da API que justificam uma nova tentativa (o openai só é importado aqui)"""
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+
+def estimate_tokens(text):
+    """Estimativa grosseira de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """Token bucket duplo (RPM e TPM) compartilhado entre as tarefas de um event loop.
+
+    Um limite None ou 0 desativa o respectivo balde.
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm or None
+        self.tpm = tpm or None
+        self._requests = float(self.rpm or 0)
+        self._tokens = float(self.tpm or 0)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _wait_time(self, tokens):
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+        return wait
+
+    async def acquire(self, tokens=0):
+        """Aguarda até haver capacidade para uma requisição com `tokens` tokens"""
+        if self.tpm:
+            # Uma requisição maior que o TPM inteiro nunca caberia no balde
+            tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+
+def _retry_after(error):
+    """Lê o cabeçalho retry-after da resposta de erro, se houver"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def call_with_retry(make_call, limiter=None, tokens=0, max_retries=5, base_delay=1.0, max_delay=60.0):
+    """Executa `make_call()` respeitando o limitador e repetindo erros transitórios com backoff exponencial"""
+    retryable = retryable_errors()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire(tokens)
+        try:
+            return await make_call()
+        except retryable as error:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            count("retries", erro=type(error).__name__)
+            delay = _retry_after(error)
+            if delay is None:
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.5)
+            await asyncio.sleep(delay)
@@ -0,0 +1,310 @@
+"""Geração do relatório em PDF de uma análise.
+
+O texto é escrito com uma fonte TrueType Unicode (DejaVu Sans por padrão; ver packages.txt), então
+acentos, travessões e aspas tipográficas saem como na transcrição. A fonte é lida e medida uma única
+vez por processo; cada relatório recebe uma cópia leve dela. A cópia depende de atributos internos
+do fpdf2 (FONT_INTERNALS); se eles mudarem, cada relatório registra a fonte pelo add_font público,
+mais lento. Sem a fonte TrueType o relatório cai para a fonte padrão Helvetica, limitada ao latin-1.
+"""
+
+import copy
+import io
+import os
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from fontTools.ttLib import TTFont
+
+try:
+    from fpdf.fonts import SubsetMap
+except ImportError:  # API interna: sem ela, a fonte é registrada pelo add_font público
+    SubsetMap = None
+
+from monitorai.segments import evidence_times, timestamped_lines
+from monitorai.telemetry import ETAPA_PDF, span
+from monitorai.vad import PAUSA_MIN_SECONDS, format_clock
+
+FONT_DIR = Path(os.environ.get("MONITORAI_PDF_FONT_DIR", "/usr/share/fonts/truetype/dejavu"))
+FONT_FAMILY = "DejaVu"
+FONT_FILES = {"": "DejaVuSans.ttf", "B": "DejaVuSans-Bold.ttf"}
+FALLBACK_FAMILY = "helvetica"
+# Atributos internos do TTFFont do fpdf2 (2.8) que _attach_fonts recria em cada cópia da fonte
+FONT_INTERNALS = ("i", "fontkey", "ttfont", "subset", "missing_glyphs", "biggest_size_pt", "_hbfont")
+
+TITULO = "MonitorAI - Relatório de Atendimento"
+COR_DESTAQUE = (193, 0, 0)
+
+# Substituições aplicadas antes do filtro de glifos; o resto do que a fonte não tem é removido
+_REPLACEMENTS = {ord("\t"): "    ", ord("\r"): None, 0xA0: " "}
+# Transliterações necessárias apenas na fonte padrão (latin-1)
+_LATIN1_REPLACEMENTS = {
+    0x2026: "...",  # Reticências
+    0x2013: "-",    # En dash
+    0x2014: "--",   # Em dash
+    0x2018: "'",    # Left single quote
+    0x2019: "'",    # Right single quote
+    0x201C: '"',    # Left double quote
+    0x201D: '"',    # Right double quote
+    0x2022: "*",    # Bullet
+    0x2032: "'",    # Prime
+    0x2033: '"',    # Double prime
+    0x2122: "(TM)", # Trademark
+}
+
+
+class _GlyphTable(dict):
+    """Tabela para str.translate: mantém os caracteres que a fonte desenha e remove os demais (emoji etc.)
+
+    Cada caractere é decidido uma vez e memorizado; as próximas ocorrências custam uma consulta ao dict.
+    """
+
+    def __init__(self, supported, replacements):
+        super().__init__(replacements)
+        self.supported = supported
+
+    def __missing__(self, code):
+        value = code if code == 10 or code in self.supported else None
+        self[code] = value
+        return value
+
+
+@lru_cache(maxsize=None)
+def _font_prototypes():
+    """Fontes TrueType lidas e medidas uma vez por processo ({estilo: (TTFFont, bytes do arquivo)}); None se ausentes"""
+    paths = {style: FONT_DIR / name for style, name in FONT_FILES.items()}
+    if not all(path.is_file() for path in paths.values()):
+        return None
+    loader = FPDF()
+    prototypes = {}
+    for style, path in paths.items():
+        loader.add_font(FONT_FAMILY, style, path)
+        prototypes[style] = (loader.fonts[f"{FONT_FAMILY.lower()}{style}"], path.read_bytes())
+    return prototypes
+
+
+@lru_cache(maxsize=None)
+def _can_copy_fonts():
+    """Se a cópia leve das fontes funciona com esta versão do fpdf2 (senão, add_font a cada relatório)"""
+    return SubsetMap is not None and all(
+        hasattr(prototype, name) for prototype, _ in _font_prototypes().values() for name in FONT_INTERNALS
+    )
+
+
+@lru_cache(maxsize=None)
+def _translation_table(unicode_font):
+    if unicode_font:
+        regular, _ = _font_prototypes()[""]
+        return _GlyphTable(set(regular.cmap), _REPLACEMENTS)
+    return _GlyphTable(range(0x20, 0x100), {**_REPLACEMENTS, **_LATIN1_REPLACEMENTS})
+
+
+def clean_text(text, unicode_font=True):
+    """Texto pronto para o PDF: só caracteres que a fonte consegue desenhar"""
+    if not text:
+        return ""
+    return str(text).translate(_translation_table(unicode_font))
+
+
+class ReportPDF(FPDF):
+    """Modelo de página do relatório: faixa de título, rodapé numerado e blocos de texto com quebra de linha própria"""
+
+    def __init__(self, unicode_font=None):
+        super().__init__()
+        if unicode_font is None:
+            unicode_font = _font_prototypes() is not None
+        self.unicode_font = unicode_font
+        self.family = FONT_FAMILY if unicode_font else FALLBACK_FAMILY
+        if unicode_font:
+            self._attach_fonts()
+        self._word_widths = {}
+        self.set_auto_page_break(True, margin=15)
+        self.alias_nb_pages()
+
+    def _attach_fonts(self):
+        if not _can_copy_fonts():
+            for style, name in FONT_FILES.items():
+                self.add_font(FONT_FAMILY, style, FONT_DIR / name)
+            return
+        # O subsetting do fpdf2 altera o TTFont ao gerar o PDF: cada documento reabre o arquivo (já em
+        # memória) e reaproveita as métricas e o mapa de caracteres lidos na primeira vez
+        for prototype, data in _font_prototypes().values():
+            font = copy.copy(prototype)
+            font.i = len(self.fonts) + 1
+            font.ttfont = TTFont(io.BytesIO(data), recalcTimestamp=False, lazy=True)
+            font.subset = SubsetMap(font)
+            font.missing_glyphs = []
+            font.biggest_size_pt = 0
+            font._hbfont = None
+            self.fonts[font.fontkey] = font
+
+    def text_style(self, size, bold=False):
+        self.set_font(self.family, "B" if bold else "", size)
+
+    def footer(self):
+        self.set_y(-12)
+        self.text_style(8)
+        self.set_text_color(120, 120, 120)
+        self.cell(0, 6, f"Página {self.page_no()}/{{nb}}", align="C")
+        self.set_text_color(0, 0, 0)
+
+    def banner(self, text):
+        self.text_style(16, bold=True)
+        self.set_fill_color(*COR_DESTAQUE)
+        self.set_text_color(255, 255, 255)
+        self.cell(0, 10, clean_text(text, self.unicode_font), border=1, align="C", fill=True,
+                  new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.set_text_color(0, 0, 0)
+        self.ln(5)
+
+    def heading(self, text, size=14):
+        self.text_style(size, bold=True)
+        self.cell(0, 10, clean_text(text, self.unicode_font), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def field(self, text, size=12, bold=False, height=8):
+        self.text_style(size, bold)
+        self.cell(0, height, clean_text(text, self.unicode_font), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def paragraph(self, text, size=10, bold=False, height=5):
+        """Texto corrido com quebra de linha por palavra (larguras memorizadas por documento)"""
+        self.text_style(size, bold)
+        for row in self._wrap(clean_text(text, self.unicode_font)):
+            self.cell(0, height, row, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def _width(self, word):
+        key = (self.font_family, self.font_style, self.font_size_pt, word)
+        width = self._word_widths.get(key)
+        if width is None:
+            width = self._word_widths[key] = self.get_string_width(word)
+        return width
+
+    def _wrap(self, text):
+        max_width = self.epw - 2 * self.c_margin
+        space = self._width(" ")
+        for source_line in text.split("\n"):
+            row, row_width = [], 0.0
+            for word in source_line.split(" "):
+                width = self._width(word)
+                if width > max_width:
+                    # Palavra maior que a linha (URL, sequência sem espaços): quebra por caractere
+                    if row:
+                        yield " ".join(row)
+                        row, row_width = [], 0.0
+                    chunk = ""
+                    for ch in word:
+                        if self._width(chunk + ch) > max_width:
+                            yield chunk
+                            chunk = ""
+                        chunk += ch
+                    word, width = chunk, self._width(chunk)
+                if row and row_width + space + width > max_width:
+                    yield " ".join(row)
+                    row, row_width = [], 0.0
+                row_width += width + (space if row else 0.0)
+                row.append(word)
+            yield " ".join(row)
+
+
+def _timing_section(pdf, tempos):
+    pdf.heading("Tempos da Ligação (medidos no áudio)")
+    primeira = tempos.get("primeira_fala_s")
+    pdf.field(f"Primeira fala: {f'{primeira:.1f} s' if primeira is not None else 'não detectada'}")
+    pdf.field(f"Duração: {format_clock(tempos['duracao_s'])} - fala {tempos['proporcao_fala']:.0%}, silêncio {tempos['proporcao_silencio']:.0%}")
+    pdf.field(f"Pausas ({PAUSA_MIN_SECONDS:g} s ou mais): {tempos['pausas']} - maior silêncio: {tempos['maior_silencio_s']:.0f} s")
+    for espera in tempos.get("esperas", []):
+        pdf.field(f"Linha muda aos {format_clock(espera['inicio_s'])} por {espera['duracao_s']:.0f} s", size=10, height=6)
+    pdf.ln(5)
+
+
+def _build_report(analysis, transcript_text, model_name, tempos=None, indice=None):
+    pdf = ReportPDF()
+    pdf.add_page()
+    pdf.banner(TITULO)
+    pdf.field(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}", bold=True)
+    pdf.field(f"Modelo: {model_name}", bold=True)
+    pdf.ln(5)
+
+    # Status Final
+    pdf.heading("Status Final")
+    final = analysis.get("status_final", {})
+    pdf.field(f"Satisfação: {final.get('satisfacao', 'N/A')}")
+    pdf.field(f"Desfecho: {final.get('desfecho', 'N/A')}")
+    pdf.field(f"Risco: {final.get('risco', 'N/A')}")
+    pdf.ln(5)
+
+    # Pontuação Total
+    pdf.heading("Pontuação Total")
+    pdf.field(f"{analysis.get('pontuacao_total_percentual', 'N/A')}% (avaliação por grupos)", bold=True)
+    pdf.ln(5)
+
+    # Tempos da Ligação
+    if tempos:
+        _timing_section(pdf, tempos)
+
+    # Avaliação por Grupos
+    pdf.heading("Avaliação por Grupos")
+    pdf.ln(3)
+    for grupo in analysis.get("grupos_avaliacao", []):
+        feito = grupo.get("feito")
+        if feito is None:
+            continue  # Pular não avaliados
+        status_text = "TOTALMENTE CERTO" if feito else "TOTALMENTE INCORRETO"
+        pdf.paragraph(f"{grupo.get('nome', '')} ({grupo.get('percentual', 0)}%) - {status_text}", size=12, bold=True, height=7)
+        pdf.paragraph(f"Justificativa: {grupo.get('justificativa', 'N/A')}")
+        pdf.ln(3)
+
+    # Resumo Geral
+    pdf.add_page()
+    pdf.heading("Resumo Geral")
+    pdf.paragraph(analysis.get("resumo_geral", "N/A"), size=12, height=6)
+    pdf.ln(5)
+
+    # Critérios Eliminatórios
+    pdf.heading("Critérios Eliminatórios")
+    pdf.ln(3)
+    for criterio in analysis.get("criterios_eliminatorios", []):
+        if criterio.get("ocorreu", False):
+            pdf.paragraph(f"VIOLADO: {criterio.get('criterio', 'N/A')}", size=11, bold=True, height=6)
+            pdf.paragraph(criterio.get("justificativa", ""))
+            pdf.ln(3)
+
+    # Detalhamento Técnico
+    pdf.add_page()
+    pdf.heading("Detalhamento Técnico por Item")
+    pdf.ln(5)
+    evidencias = evidence_times(indice, analysis) if indice else {}
+    for item in analysis.get("checklist_detalhado", []):
+        pdf.paragraph(f"Item {item.get('item')}: {item.get('criterio', '')}", size=11, bold=True, height=6)
+        pdf.field(f"Resposta: {item.get('resposta', '')}", size=10, height=5)
+        pdf.paragraph(f"Justificativa: {item.get('justificativa', '')}")
+        if item.get("evidencia"):
+            pdf.paragraph(f'Trecho: "{item["evidencia"]}"')
+        if item.get("item") in evidencias:
+            pdf.field(f"Evidência na transcrição: [{format_clock(evidencias[item['item']])}]", size=10, height=5)
+        pdf.ln(3)
+
+    # Transcrição (com o início de cada fala, quando há índice de segmentos); o banco de resultados não a guarda
+    if transcript_text or indice:
+        pdf.add_page()
+        pdf.heading("Transcrição")
+        pdf.paragraph(timestamped_lines(indice) if indice else transcript_text)
+    return pdf
+
+
+def render_report(analysis, transcript_text, model_name, out, tempos=None, indice=None):
+    """Escreve o relatório direto em `out` (caminho ou arquivo binário aberto), sem cópias intermediárias"""
+    with span(ETAPA_PDF) as sp:
+        pdf = _build_report(analysis, transcript_text, model_name, tempos, indice)
+        pdf.output(out)
+        sp.set(paginas=pdf.page)
+
+
+def create_pdf(analysis, transcript_text, model_name, tempos=None, indice=None):
+    """Relatório em bytes (para download no app)"""
+    with span(ETAPA_PDF) as sp:
+        pdf = _build_report(analysis, transcript_text, model_name, tempos, indice)
+        data = bytes(pdf.output())
+        sp.set(paginas=pdf.page, bytes=len(data))
+        return data
@@ -0,0 +1,388 @@
+"""Reavaliação em massa de transcrições já feitas pela Batch API da OpenAI (assíncrona, mais barata e fora dos limites de RPM/TPM).
+
+Uso:
+    python -m monitorai.rescore resultados.jsonl --work-dir reavaliacao/ --output reavaliacoes.jsonl
+
+A entrada é um JSONL com "id" e "transcricao" por linha (por exemplo, a saída do modo em lote;
+linhas com status diferente de "ok" são ignoradas). Os "tempos" medidos no áudio e o "indice" de
+segmentos, quando presentes, entram no prompt como no modo em lote. As etapas são:
+
+1. compilar o prompt de avaliação de cada transcrição em arquivos JSONL de requisições da Batch
+   API (divididos em até 50.000 requisições / ~190 MB por arquivo);
+2. enviar cada arquivo (files.create) e criar o job (batches.create);
+3. acompanhar os jobs até terminarem;
+4. ler os arquivos de resultado linha a linha e gravar cada `analysis` no JSONL de saída (e no
+   banco de resultados, com --store).
+
+O andamento fica em <work-dir>/estado.json: reexecutar o mesmo comando retoma de onde parou
+(os jobs podem levar até 24 h). Com --engine grupos, cada ligação gera uma requisição por tarefa
+do motor por grupo, e os itens decididos por regras locais ficam em <work-dir>/locais.jsonl.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from monitorai.batch import ResultWriter
+from monitorai.clients import ETAPA_TRANSCRICAO, for_stage, make_client
+from monitorai.fanout import FANOUT_VERSION, build_preambles, build_tasks, merge_partials, task_messages
+from monitorai.jsonstream import parse_tolerant
+from monitorai.pipeline import SAMPLING_PARAMS, completion_kwargs
+from monitorai.prompt import ENGINE_GROUPS, ENGINE_SINGLE, MODELO_PADRAO, RUBRIC_VERSION
+from monitorai.rules import decided, prescore
+from monitorai.store import ResultsStore
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Limites da Batch API por arquivo de entrada (com folga no tamanho)
+MAX_REQUESTS_PER_FILE = 50_000
+MAX_BYTES_PER_FILE = 190 * 1024 * 1024
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+TASK_SEPARATOR = "#"
+
+
+def load_transcripts(path):
+    """(id, transcrição, metadados, contexto) de cada linha válida, sem repetir ids
+
+    O contexto traz os "tempos" e o "indice" de segmentos da linha, quando houver.
+    """
+    seen = set()
+    with open(path, encoding="utf-8") as source:
+        for line in source:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status", "ok") != "ok" or not record.get("transcricao") or record.get("id") is None:
+                continue
+            call_id = str(record["id"])
+            if call_id in seen:
+                continue
+            seen.add(call_id)
+            metadata = record.get("metadados") or {k: record[k] for k in ("agente", "data") if k in record}
+            context = {name: record[name] for name in ("tempos", "indice") if record.get(name)}
+            yield call_id, record["transcricao"], metadata, context
+
+
+def call_requests(call_id, transcript_text, model, engine, tempos=None, indice=None):
+    """Linhas da Batch API de uma ligação e os itens decididos localmente (motor por grupo)"""
+    if engine == ENGINE_SINGLE:
+        body = completion_kwargs(transcript_text, model, tempos)
+        return [{"custom_id": call_id, "method": "POST", "url": ENDPOINT, "body": body}], None
+    local_items = decided(prescore(transcript_text))
+    tasks = build_tasks(local_items)
+    preambles = build_preambles(transcript_text, tasks, local_items, tempos, indice)
+    lines = [
+        {"custom_id": f"{call_id}{TASK_SEPARATOR}{task}", "method": "POST", "url": ENDPOINT,
+         "body": {"model": model, "messages": task_messages(preambles[task], task_text), **SAMPLING_PARAMS}}
+        for task, task_text in tasks.items()
+    ]
+    return lines, local_items
+
+
+class _RequestFiles:
+    """Grava as requisições em arquivos numerados, abrindo outro antes de passar dos limites"""
+
+    def __init__(self, work_dir, max_requests, max_bytes):
+        self.work_dir = work_dir
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.files = []
+        self._file = None
+
+    def _open(self):
+        self.close()
+        path = self.work_dir / f"requisicoes_{len(self.files):03d}.jsonl"
+        self._file = open(path, "w", encoding="utf-8")
+        self.files.append({"caminho": str(path), "requisicoes": 0, "bytes": 0, "ligacoes": 0})
+
+    def write_call(self, lines):
+        # As tarefas de uma ligação ficam sempre no mesmo arquivo (e no mesmo job)
+        encoded = [json.dumps(line, ensure_ascii=False) + "\n" for line in lines]
+        size = sum(len(line.encode("utf-8")) for line in encoded)
+        current = self.files[-1] if self.files else None
+        if current is None or (current["requisicoes"] and (
+            current["requisicoes"] + len(encoded) > self.max_requests or current["bytes"] + size > self.max_bytes
+        )):
+            self._open()
+            current = self.files[-1]
+        self._file.writelines(encoded)
+        current["requisicoes"] += len(encoded)
+        current["bytes"] += size
+        current["ligacoes"] += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def prepare(source, work_dir, model=MODELO_PADRAO, engine=ENGINE_SINGLE,
+            max_requests=MAX_REQUESTS_PER_FILE, max_bytes=MAX_BYTES_PER_FILE):
+    """Compila as requisições em arquivos JSONL; devolve o estado inicial (ainda não gravado)"""
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    writer = _RequestFiles(work_dir, max_requests, max_bytes)
+    metadata_path = work_dir / "locais.jsonl"
+    with open(metadata_path, "w", encoding="utf-8") as sidecar:
+        try:
+            for call_id, transcript_text, metadata, context in load_transcripts(source):
+                lines, local_items = call_requests(call_id, transcript_text, model, engine, **context)
+                writer.write_call(lines)
+                sidecar.write(json.dumps({"id": call_id, "metadados": metadata, "itens_locais": local_items},
+                                         ensure_ascii=False) + "\n")
+        finally:
+            writer.close()
+    return {
+        "origem": str(source),
+        "modelo": model,
+        "engine": engine,
+        "versao_rubrica": FANOUT_VERSION if engine == ENGINE_GROUPS else RUBRIC_VERSION,
+        "arquivos": writer.files,
+    }
+
+
+def load_state(work_dir):
+    path = Path(work_dir) / "estado.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_state(work_dir, state):
+    # Grava num temporário e renomeia: uma interrupção nunca deixa o estado pela metade
+    path = Path(work_dir) / "estado.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def submit(client, work_dir, state):
+    """Envia os arquivos ainda não enviados e cria um job para cada um"""
+    upload_client = for_stage(client, ETAPA_TRANSCRICAO)  # timeouts de upload de arquivo grande
+    for entry in state["arquivos"]:
+        if entry.get("batch_id"):
+            continue
+        if not entry.get("file_id"):
+            with open(entry["caminho"], "rb") as requests_file:
+                entry["file_id"] = upload_client.files.create(file=requests_file, purpose="batch").id
+            save_state(work_dir, state)
+        batch = client.batches.create(
+            input_file_id=entry["file_id"], endpoint=ENDPOINT, completion_window=COMPLETION_WINDOW,
+            metadata={"origem": "monitorai.rescore", "arquivo": Path(entry["caminho"]).name},
+        )
+        entry.update(batch_id=batch.id, status=batch.status)
+        save_state(work_dir, state)
+
+
+def poll(client, work_dir, state, interval=60.0, max_interval=600.0, log=None):
+    """Consulta os jobs até todos terminarem, espaçando as consultas aos poucos"""
+    delay = interval
+    while True:
+        pending = 0
+        for entry in state["arquivos"]:
+            if entry.get("status") in TERMINAL_STATUSES:
+                continue
+            batch = client.batches.retrieve(entry["batch_id"])
+            counts = batch.request_counts
+            entry.update(
+                status=batch.status, output_file_id=batch.output_file_id, error_file_id=batch.error_file_id,
+                concluidas=getattr(counts, "completed", 0), falhas=getattr(counts, "failed", 0),
+            )
+            pending += batch.status not in TERMINAL_STATUSES
+        save_state(work_dir, state)
+        if log is not None:
+            log(", ".join(f"{Path(e['caminho']).name}: {e['status']} ({e.get('concluidas', 0)}/{e['requisicoes']})"
+                          for e in state["arquivos"]))
+        if not pending:
+            return state
+        time.sleep(delay)
+        delay = min(max_interval, delay * 1.5)
+
+
+def iter_result_lines(client, file_id):
+    """Linhas de um arquivo de resultado, lidas em streaming (sem carregar o arquivo inteiro)"""
+    with client.files.with_streaming_response.content(file_id) as response:
+        for line in response.iter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def _result_content(line):
+    """(conteúdo, erro) de uma linha de resultado da Batch API"""
+    if line.get("error"):
+        error = line["error"]
+        return None, f"{error.get('code')}: {error.get('message')}"
+    response = line.get("response") or {}
+    if response.get("status_code") != 200:
+        body = response.get("body") or {}
+        return None, f"HTTP {response.get('status_code')}: {(body.get('error') or {}).get('message', '')}"
+    return response["body"]["choices"][0]["message"]["content"].strip(), None
+
+
+def _sidecar(work_dir):
+    with open(Path(work_dir) / "locais.jsonl", encoding="utf-8") as sidecar:
+        return {entry["id"]: entry for entry in map(json.loads, sidecar)}
+
+
+def _entry_lines(client, entry):
+    # Requisições que falharam na validação ou na execução vêm no arquivo de erros
+    for file_id in (entry.get("output_file_id"), entry.get("error_file_id")):
+        if file_id:
+            yield from iter_result_lines(client, file_id)
+
+
+def collect_file(client, entry, state, sidecar):
+    """Gera um registro (no formato da saída do modo em lote) por ligação do arquivo"""
+    model, engine = state["modelo"], state["engine"]
+    partials = {}
+
+    def record(call_id, **fields):
+        info = sidecar.get(call_id, {})
+        result = {"id": call_id, "modelo": model, "versao_rubrica": state["versao_rubrica"], "origem": "batch_api", **fields}
+        if info.get("metadados"):
+            result["metadados"] = info["metadados"]
+        return result
+
+    for line in _entry_lines(client, entry):
+        custom_id = line["custom_id"]
+        content, error = _result_content(line)
+        if engine == ENGINE_SINGLE:
+            if error:
+                yield record(custom_id, status="erro", erro=error)
+                continue
+            try:
+                yield record(custom_id, status="ok", analise=parse_tolerant(content))
+            except ValueError as parse_error:
+                yield record(custom_id, status="erro", erro=f"JSON inválido: {parse_error}")
+            continue
+        call_id, task = custom_id.rsplit(TASK_SEPARATOR, 1)
+        partials.setdefault(call_id, {})[task] = (content, error)
+
+    # Motor por grupo: junta as tarefas de cada ligação quando o arquivo termina
+    for call_id, tasks in partials.items():
+        local_items = sidecar.get(call_id, {}).get("itens_locais") or {}
+        local_items = {int(numero): item for numero, item in local_items.items()}
+        expected = build_tasks(local_items)
+        errors = [f"{task}: {error}" for task, (_, error) in tasks.items() if error]
+        missing = [task for task in expected if task not in tasks]
+        if errors or missing:
+            yield record(call_id, status="erro", erro="; ".join(errors + [f"{task}: sem resultado" for task in missing]))
+            continue
+        try:
+            parsed = {task: parse_tolerant(content) for task, (content, _) in tasks.items()}
+        except ValueError as parse_error:
+            yield record(call_id, status="erro", erro=f"JSON inválido: {parse_error}")
+            continue
+        yield record(call_id, status="ok", analise=merge_partials(parsed, local_items))
+
+
+def written_ids(output_path):
+    """IDs já gravados no JSONL de saída, com qualquer status (linhas truncadas são ignoradas)"""
+    written = set()
+    if output_path is None or not os.path.exists(output_path):
+        return written
+    with open(output_path, encoding="utf-8") as output:
+        for line in output:
+            try:
+                written.add(json.loads(line).get("id"))
+            except json.JSONDecodeError:
+                continue
+    return written
+
+
+def collect(client, work_dir, state, writer, store=None, store_batch=1000, output_path=None):
+    """Lê os resultados dos jobs terminados ainda não coletados; devolve (ok, erros)
+
+    Um arquivo cuja coleta foi interrompida é lido de novo, mas as ligações já gravadas em
+    `output_path` não são repetidas no JSONL (no banco, a nova gravação só substitui a anterior).
+    """
+    sidecar = _sidecar(work_dir)
+    ok = failed = 0
+    written = None
+    for entry in state["arquivos"]:
+        if entry.get("coletado") or entry.get("status") not in TERMINAL_STATUSES:
+            continue
+        if entry.get("coletando"):
+            written = written_ids(output_path) if written is None else written
+            skip = written
+        else:
+            entry["coletando"] = True
+            save_state(work_dir, state)
+            skip = ()
+        pending = []
+        for record in collect_file(client, entry, state, sidecar):
+            repeated = record["id"] in skip
+            if not repeated:
+                writer.write(record)
+            if record["status"] != "ok":
+                failed += not repeated
+                continue
+            ok += not repeated
+            if store is not None:
+                metadata = record.get("metadados") or {}
+                pending.append({"chave": record["id"], "analise": record["analise"], "agente": metadata.get("agente"),
+                                "data": metadata.get("data"), "modelo": record["modelo"], "origem": "reavaliacao"})
+                if len(pending) >= store_batch:
+                    store.add_many(pending)
+                    pending = []
+        if store is not None:
+            store.add_many(pending)
+        entry["coletado"] = True
+        entry.pop("coletando", None)
+        save_state(work_dir, state)
+    return ok, failed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m monitorai.rescore", description="Reavaliação em massa pela Batch API")
+    parser.add_argument("source", help="JSONL com id e transcricao (por exemplo, a saída do modo em lote)")
+    parser.add_argument("--work-dir", default="reavaliacao", help="Arquivos de requisição e estado (reexecute para retomar)")
+    parser.add_argument("--output", default="reavaliacoes.jsonl", help="JSONL com as análises reavaliadas")
+    parser.add_argument("--model", default=MODELO_PADRAO, help="Modelo de avaliação")
+    parser.add_argument("--engine", choices=[ENGINE_SINGLE, ENGINE_GROUPS], default=ENGINE_SINGLE,
+                        help="unico: um prompt com toda a rubrica; grupos: uma requisição por tarefa do motor por grupo")
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="Segundos entre as primeiras consultas aos jobs")
+    parser.add_argument("--no-wait", action="store_true", help="Só prepara e envia; reexecute depois para acompanhar e coletar")
+    parser.add_argument("--store", nargs="?", const="", help="Grava as análises no banco de resultados (caminho opcional)")
+    parser.add_argument("--max-requests-per-file", type=int, default=MAX_REQUESTS_PER_FILE)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    log = lambda message: print(message, file=sys.stderr)  # noqa: E731
+    state = load_state(args.work_dir)
+    if state is None:
+        state = prepare(args.source, args.work_dir, args.model, args.engine, max_requests=args.max_requests_per_file)
+        save_state(args.work_dir, state)
+        total = sum(entry["requisicoes"] for entry in state["arquivos"])
+        log(f"{sum(e['ligacoes'] for e in state['arquivos'])} ligações, {total} requisições em {len(state['arquivos'])} arquivo(s)")
+    elif (state["modelo"], state["engine"]) != (args.model, args.engine):
+        log(f"{args.work_dir} já tem uma reavaliação com {state['modelo']}/{state['engine']}; use outro --work-dir")
+        return 2
+
+    client = make_client()
+    try:
+        submit(client, args.work_dir, state)
+        if args.no_wait:
+            log("Jobs enviados; reexecute o mesmo comando para acompanhar e coletar os resultados")
+            return 0
+        poll(client, args.work_dir, state, interval=args.poll_interval, log=log)
+        writer = ResultWriter(args.output)
+        store = ResultsStore(args.store or None) if args.store is not None else None
+        try:
+            ok, failed = collect(client, args.work_dir, state, writer, store, output_path=args.output)
+        finally:
+            writer.close()
+    finally:
+        client.close()
+    log(f"Concluído: {ok} reavaliadas, {failed} com erro")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
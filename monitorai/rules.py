@@ -0,0 +1,267 @@
+"""Pré-avaliação local e determinística dos itens da rubrica que seguem regras mecânicas.
+
+Decide em milissegundos, com trechos de evidência, os itens 4 (script LGPD), 5 (técnica do eco) e
+14 (script de encerramento). As regras só confirmam ("sim") o que o atendente verbalizou: quando a
+transcrição não permite uma decisão segura, o item fica sem resposta (None) e continua sendo
+avaliado pelo modelo.
+
+A transcrição normalmente não separa os falantes. Frases em perguntas ou com negação ("Não recebi
+link") não contam como script, e, se a transcrição tiver rótulos ("Cliente: ..."), as falas do
+cliente são ignoradas.
+"""
+
+import hashlib
+import re
+from bisect import bisect_right
+import unicodedata
+
+ORIGEM_REGRAS = "regras"
+# Distância máxima (em caracteres) entre uma informação e a sua repetição para contar como eco
+ECHO_WINDOW = 400
+# Só ecoa quem repete um telefone, CPF ou placa (7+ dígitos), e não um valor ou um ano
+ECHO_MIN_DIGITS = 7
+# Confirmação pelo final ("final 0203?") de um número longo
+ECHO_SUFFIX_MIN_DIGITS = 4
+
+# Tabela pré-compilada caractere -> caractere (minúsculo, sem acento) para os blocos latinos; o
+# mapeamento 1:1 preserva o comprimento do texto, então as posições valem para o original
+_NORMALIZE_TABLE = str.maketrans({
+    chr(code): unicodedata.normalize("NFKD", chr(code))[0].lower()
+    for code in range(0x41, 0x250)
+    if unicodedata.normalize("NFKD", chr(code))[0].lower() != chr(code)
+})
+
+
+def normalize(text):
+    """Minúsculas sem acentos, com o mesmo comprimento do texto original"""
+    return text.translate(_NORMALIZE_TABLE)
+
+
+# Item 5, condição A: soletração fonética ("R de rato", "A de avião") — a palavra começa com a letra
+_PHONETIC_RE = re.compile(r"\b([a-z])\s+de\s+([a-z]{3,})\b")
+# Item 5, condições B/C/D: números de telefone, placa, CPF (dígitos com separadores opcionais)
+_NUMBER_RE = re.compile(r"\d+(?:[ .\-/]\d+)*")
+_PLATE_RE = re.compile(r"\b[a-z]{3}[ -]?\d[a-z0-9]\d{2}\b")
+# Sem separação de falantes, o eco é a repetição numa fala seguinte que confirma a informação
+_CONFIRM_RE = re.compile(r"\b(confirm\w*|correto|certo)\b")
+_SENTENCE_END_RE = re.compile(r"[.?!](?=\s|$)")
+# Valores em dinheiro não são informação a ecoar ("1500000 reais", "R$ 1.500,00")
+_MONEY_BEFORE_RE = re.compile(r"r\$\s*$")
+_MONEY_AFTER_RE = re.compile(r"^(,\d+)?\s*(reais|real|mil)\b")
+# Rótulos de falante, quando a transcrição os tiver
+_SPEAKER_RE = re.compile(r"\b(cliente|agente|atendente|operador\w*)\s*:")
+# Frases que não verbalizam o script: negações e falas do cliente sobre ele ("vou aguardar o retorno")
+_NOT_SCRIPT_RE = re.compile(r"\b(nao|nem|nunca|sem|recebi|sei|vou aguardar|aguardo|(fico|vou ficar) (aguardando|esperando))\b")
+
+# Item 4: o script da LGPD pede o consentimento para compartilhar os dados DO CLIENTE com o prestador
+# (destinatário, e não dono dos dados: "o contato da loja" não conta); todos os elementos na mesma frase
+_LGPD_CONSENT_RES = [
+    re.compile(r"\b(permite|autoriza\w*|podemos|posso)\b"),
+    re.compile(r"\b(compartilh\w*|informar|passar|repassar|enviar|fornecer)\b"),
+    re.compile(r"\b(seus?|suas?)\s+(dados|telefones?|numeros?|contatos?|informac\w*)\b"
+               r"|\b(dados|telefones?|numeros?|contatos?)\s+(do senhor|da senhora|de voce)\b"),
+    re.compile(r"\b(com|ao|aos|para)\s+(o\s+|os\s+|a\s+|as\s+)?(nossos?\s+|nossas?\s+)?"
+               r"(prestador\w*|parceir\w*|terceir\w*|loja que (vai|ira) (fazer|realizar|atender))\b"),
+]
+# Variação aceita: consentimento para as notificações do atendimento
+_LGPD_NOTIFICATION_RE = re.compile(
+    r"\b(autoriza|permite)\b[^.?!]{0,40}?\b(envio|receber)\b[^.?!]{0,40}?\b(notificac\w*|mensage\w*|whats ?app)\b"
+)
+
+# Item 14: elementos obrigatórios do script de encerramento, cada um numa frase afirmativa do atendente
+_CLOSING_RES = {
+    "prazo de validade": re.compile(r"\bvalidade\b|\bvalid[oa] (por|ate)\b|\bprazo de \d+ dias\b"),
+    "franquia": re.compile(r"\bfranquia\b|\bcoparticipac\w*\b"),
+    "link de acompanhamento": re.compile(r"\blink\b"),
+    "aguardar contato para agendamento": re.compile(
+        r"\b(aguarde|aguardem|aguardar)\s+(o\s+|um\s+|nosso\s+|a\s+)?(contato|ligacao|retorno)\b"
+        r"|\b(entrar\w*|entraremos)\s+em\s+contato\b[^.?!]{0,40}?\bagend\w*"
+        r"|\b(vai|vao|ira|irao)\s+(te\s+|lhe\s+)?(ligar|entrar em contato)\b"
+    ),
+}
+
+# Versão das regras: entra na chave do cache de análises do motor por grupo
+RULES_VERSION = hashlib.sha256(
+    "|".join(
+        [_PHONETIC_RE.pattern, _NUMBER_RE.pattern, _PLATE_RE.pattern, _CONFIRM_RE.pattern, _SENTENCE_END_RE.pattern,
+         _MONEY_BEFORE_RE.pattern, _MONEY_AFTER_RE.pattern, _SPEAKER_RE.pattern, _NOT_SCRIPT_RE.pattern,
+         str(ECHO_WINDOW), str(ECHO_MIN_DIGITS), str(ECHO_SUFFIX_MIN_DIGITS), _LGPD_NOTIFICATION_RE.pattern]
+        + [regex.pattern for regex in _LGPD_CONSENT_RES]
+        + [regex.pattern for regex in _CLOSING_RES.values()]
+    ).encode("utf-8")
+).hexdigest()[:16]
+
+
+def _evidence(text, start, end):
+    return {"inicio": start, "fim": end, "trecho": text[start:end]}
+
+
+def _result(item, resposta, justificativa, evidencias):
+    return {
+        "item": item,
+        "resposta": resposta,
+        "justificativa": justificativa,
+        "evidencias": evidencias,
+        "origem": ORIGEM_REGRAS,
+    }
+
+
+def _phonetic_spellings(normalized):
+    return [m for m in _PHONETIC_RE.finditer(normalized) if m.group(2).startswith(m.group(1))]
+
+
+def _sentence_ends(normalized):
+    return [match.end() for match in _SENTENCE_END_RE.finditer(normalized)]
+
+
+def _sentence(normalized, ends, position):
+    """(índice, texto) da frase que contém `position`"""
+    index = bisect_right(ends, position)
+    start = ends[index - 1] if index else 0
+    end = ends[index] if index < len(ends) else len(normalized)
+    return index, normalized[start:end]
+
+
+def _customer_turns(normalized):
+    """Trechos (início, fim) rotulados como fala do cliente; vazio numa transcrição sem rótulos"""
+    labels = list(_SPEAKER_RE.finditer(normalized))
+    turns = []
+    for index, label in enumerate(labels):
+        if label.group(1) == "cliente":
+            turns.append((label.start(), labels[index + 1].start() if index + 1 < len(labels) else len(normalized)))
+    return turns
+
+
+def _in_turns(position, turns):
+    return any(start <= position < end for start, end in turns)
+
+
+def _script_sentences(normalized):
+    """(início, fim) das frases que podem verbalizar um script: afirmativas, sem negação e fora das falas do cliente"""
+    turns = _customer_turns(normalized)
+    sentences = []
+    start = 0
+    for end in _sentence_ends(normalized) + [len(normalized)]:
+        sentence = normalized[start:end]
+        if sentence.strip() and not sentence.rstrip().endswith("?") and not _NOT_SCRIPT_RE.search(sentence) \
+                and not _in_turns(start + len(sentence) - len(sentence.lstrip()), turns):
+            sentences.append((start, end))
+        start = end
+    return sentences
+
+
+def _is_money(normalized, match):
+    return bool(_MONEY_BEFORE_RE.search(normalized[max(0, match.start() - 4):match.start()])
+                or _MONEY_AFTER_RE.match(normalized[match.end():match.end() + 12]))
+
+
+def _identifiers(normalized):
+    """Placas e números (só os dígitos), na ordem do texto, sem os valores em dinheiro"""
+    found = [(match, re.sub(r"[ -]", "", match.group(0))) for match in _PLATE_RE.finditer(normalized)]
+    plates = [(match.start(), match.end()) for match, _ in found]
+    numbers, money = [], set()
+    for match in _NUMBER_RE.finditer(normalized):
+        if not any(start <= match.start() < end for start, end in plates):
+            key = re.sub(r"\D", "", match.group(0))
+            numbers.append((match, key))
+            if _is_money(normalized, match):
+                money.add(key)
+    # Um valor repetido sem a moeda ("1500000 reais" → "1500000, certo?") também fica de fora
+    found += [(match, key) for match, key in numbers if key not in money]
+    return sorted(found, key=lambda pair: pair[0].start())
+
+
+def _is_echo(key, later_key):
+    if key == later_key:
+        return True
+    # Confirmação pelos dígitos finais: só de números
+    return key.isdigit() and later_key.isdigit() and len(later_key) >= ECHO_SUFFIX_MIN_DIGITS and key.endswith(later_key)
+
+
+def _number_echoes(normalized):
+    """Pares (original, repetição) em que um telefone, CPF ou placa é repetido, numa fala seguinte, para confirmação"""
+    ends = _sentence_ends(normalized)
+    identifiers = _identifiers(normalized)
+    turns = _customer_turns(normalized)
+    echoes = []
+    for index, (match, key) in enumerate(identifiers):
+        if key.isdigit() and len(key) < ECHO_MIN_DIGITS:
+            continue
+        sentence = _sentence(normalized, ends, match.start())[0]
+        for later, later_key in identifiers[index + 1:]:
+            if later.start() - match.end() > ECHO_WINDOW:
+                break
+            later_sentence, text = _sentence(normalized, ends, later.start())
+            if later_sentence == sentence or not _is_echo(key, later_key) or _in_turns(later.start(), turns):
+                continue
+            if text.rstrip().endswith("?") or _CONFIRM_RE.search(text):
+                echoes.append((match, later))
+                break
+    return echoes
+
+
+def score_item_5(text, normalized):
+    spellings = _phonetic_spellings(normalized)
+    # Uma ocorrência isolada pode ser coincidência ("a de abril"); uma sequência de soletrações não
+    if len(spellings) >= 2 and spellings[1].start() - spellings[0].end() <= ECHO_WINDOW:
+        evidencias = [_evidence(text, m.start(), m.end()) for m in spellings[:4]]
+        trechos = ", ".join(f'"{e["trecho"]}"' for e in evidencias)
+        return _result(5, "sim", f"Soletração fonética identificada (condição A): {trechos}.", evidencias)
+    echoes = _number_echoes(normalized)
+    if echoes:
+        evidencias = []
+        for original, repeticao in echoes[:2]:
+            evidencias += [_evidence(text, original.start(), original.end()), _evidence(text, repeticao.start(), repeticao.end())]
+        pares = "; ".join(f'"{evidencias[i]["trecho"]}" → "{evidencias[i + 1]["trecho"]}"' for i in range(0, len(evidencias), 2))
+        return _result(5, "sim", f"Eco de informação numérica identificado: {pares}.", evidencias)
+    return _result(5, None, "", [])
+
+
+def score_item_4(text, normalized):
+    # Perguntas contam aqui: o consentimento é pedido ao cliente ("Podemos informar seu telefone ao prestador?")
+    turns = _customer_turns(normalized)
+    start = 0
+    for end in _sentence_ends(normalized) + [len(normalized)]:
+        sentence = normalized[start:end]
+        offset = len(sentence) - len(sentence.lstrip())
+        if all(regex.search(sentence) for regex in _LGPD_CONSENT_RES) and not _NOT_SCRIPT_RE.search(sentence) \
+                and not _in_turns(start + offset, turns):
+            evidencia = _evidence(text, start + offset, end)
+            return _result(4, "sim", f'Script da LGPD verbalizado: "{evidencia["trecho"]}".', [evidencia])
+        start = end
+    for match in _LGPD_NOTIFICATION_RE.finditer(normalized):
+        if not _in_turns(match.start(), turns):
+            evidencia = _evidence(text, match.start(), match.end())
+            return _result(4, "sim", f'Script da LGPD verbalizado: "{evidencia["trecho"]}".', [evidencia])
+    return _result(4, None, "", [])
+
+
+def score_item_14(text, normalized):
+    sentences = _script_sentences(normalized)
+    encontrados = {}
+    for elemento, regex in _CLOSING_RES.items():
+        # O script de encerramento fica no fim da ligação: usa a última ocorrência
+        for start, end in reversed(sentences):
+            match = regex.search(normalized, start, end)
+            if match:
+                encontrados[elemento] = _evidence(text, match.start(), match.end())
+                break
+    if len(encontrados) == len(_CLOSING_RES):
+        return _result(14, "sim", "Script de encerramento completo: " + ", ".join(encontrados) + ".", list(encontrados.values()))
+    # Script ausente ou parcial: pode ser falha da transcrição ou fala do cliente; a decisão fica com o modelo
+    faltando = [elemento for elemento in _CLOSING_RES if elemento not in encontrados]
+    return _result(14, None, "Elementos ausentes: " + ", ".join(faltando) + ".", list(encontrados.values()))
+
+
+RULES = {4: score_item_4, 5: score_item_5, 14: score_item_14}
+
+
+def prescore(transcript_text):
+    """Resultados por item; "resposta" None indica que o item deve ser avaliado pelo modelo"""
+    normalized = normalize(transcript_text)
+    return {item: rule(transcript_text, normalized) for item, rule in RULES.items()}
+
+
+def decided(results):
+    """Somente os itens decididos localmente"""
+    return {item: result for item, result in results.items() if result["resposta"] is not None}
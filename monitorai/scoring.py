@@ -0,0 +1,70 @@
+"""Estrutura da rubrica e cálculo local do status dos grupos e da pontuação total."""
+
+# Grupos na ordem do relatório; "itens" vazio indica grupo avaliado diretamente (E e F)
+GRUPOS = [
+    {"grupo": "A", "nome": "Utilizou adequadamente as técnicas do atendimento?", "percentual": 10, "itens": [1, 3, 4, 5]},
+    {"grupo": "B", "nome": "Adotou o procedimento de acordo com a rotina/transmitiu informações corretas e completas?", "percentual": 30, "itens": [6, 7, 9, 10]},
+    {"grupo": "C", "nome": "Foi objetivo, contribuindo para redução do TMA?", "percentual": 10, "itens": [11, 12]},
+    {"grupo": "D", "nome": "Utilizou adequadamente o sistema e efetuou os registros de maneira correta e completa?", "percentual": 20, "itens": [14, 15]},
+    {"grupo": "E", "nome": "Transferiu a ligação ao superior quando solicitado e/ou necessário?", "percentual": 10, "itens": []},
+    {"grupo": "F", "nome": "Teve foco no cliente?", "percentual": 20, "itens": []},
+]
+
+ITENS = {
+    1: {"grupo": "A", "criterio": "Atendeu prontamente e usou saudação correta"},
+    3: {"grupo": "A", "criterio": "Confirmou cadastro e pediu 2 telefones"},
+    4: {"grupo": "A", "criterio": "Verbalizou script LGPD"},
+    5: {"grupo": "A", "criterio": "Utilizou técnica do eco"},
+    6: {"grupo": "B", "criterio": "Escutou atentamente"},
+    7: {"grupo": "B", "criterio": "Demonstrou domínio"},
+    9: {"grupo": "B", "criterio": "Confirmou danos no veículo"},
+    10: {"grupo": "B", "criterio": "Confirmou cidade"},
+    11: {"grupo": "C", "criterio": "Comunicação eficaz"},
+    12: {"grupo": "C", "criterio": "Conduta acolhedora"},
+    14: {"grupo": "D", "criterio": "Script encerramento completo"},
+    15: {"grupo": "D", "criterio": "Orientou sobre pesquisa"},
+}
+
+CRITERIOS_ELIMINATORIOS = [
+    "Ofereceu serviço sem direito?",
+    "Preencheu veículo/peça incorretos?",
+    "Agiu de forma rude?",
+    "Encerrou/transferiu sem conhecimento?",
+    "Falou negativamente da empresa?",
+    "Forneceu informações incorretas?",
+    "Comentou sobre serviços externos?",
+]
+
+
+def is_yes(resposta):
+    return str(resposta or "").strip().lower() == "sim"
+
+
+def group_done(grupo, checklist):
+    """Regra dos grupos: feito somente se TODOS os itens do grupo forem "sim" (None se faltar item)"""
+    respostas = {item.get("item"): item.get("resposta") for item in checklist}
+    if any(numero not in respostas for numero in grupo["itens"]):
+        return None
+    return all(is_yes(respostas[numero]) for numero in grupo["itens"])
+
+
+def total_percentual(grupos_avaliacao):
+    """Soma dos percentuais dos grupos feitos"""
+    return sum(grupo.get("percentual", 0) for grupo in grupos_avaliacao if grupo.get("feito") is True)
+
+
+def score_groups(analysis):
+    """Recalcula na análise, pelos veredictos dos itens, o status dos grupos e a pontuação total (E e F, sem
+    itens, ficam como o modelo avaliou); devolve a própria análise"""
+    checklist = analysis.get("checklist_detalhado", [])
+    avaliados = {grupo.get("grupo"): grupo for grupo in analysis.get("grupos_avaliacao", []) if isinstance(grupo, dict)}
+    grupos_avaliacao = []
+    for grupo in GRUPOS:
+        avaliado = avaliados.get(grupo["grupo"], {})
+        grupos_avaliacao.append({
+            **avaliado, "grupo": grupo["grupo"], "nome": avaliado.get("nome") or grupo["nome"], "percentual": grupo["percentual"],
+            "feito": group_done(grupo, checklist) if grupo["itens"] else avaliado.get("feito"),
+        })
+    analysis["grupos_avaliacao"] = grupos_avaliacao
+    analysis["pontuacao_total_percentual"] = total_percentual(grupos_avaliacao)
+    return analysis
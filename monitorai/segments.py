@@ -0,0 +1,117 @@
+"""Índice compacto dos segmentos da transcrição, com timestamps, e localização das evidências.
+
+Do verbose_json da transcrição (segmentos e palavras com tempos) fica guardado só o necessário:
+{"segmentos": [[início, fim, texto], ...], "palavras": [[início, palavra], ...]}, em segundos.
+A partir dele saem os trechos da ligação com timestamps ("[m:ss] texto"), usados nos prompts
+dos itens que dependem só da abertura ou do encerramento (monitorai.fanout). Ele também dá o
+instante em que começa o trecho citado na justificativa de cada item, usado no app e no PDF.
+"""
+
+import re
+
+from monitorai.rules import normalize
+from monitorai.vad import format_clock
+
+# Trechos entre aspas na justificativa; citações com menos palavras são ambíguas demais
+_QUOTE_RE = re.compile(r'"([^"]+)"|“([^”]+)”|\'([^\']+)\'')
+_TOKEN_RE = re.compile(r"\w+")
+MIN_QUOTE_WORDS = 3
+# Citações longas costumam ser parafraseadas no fim: procura também só o começo
+QUOTE_PREFIX_WORDS = 5
+
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def response_timestamps(transcript, offset=0.0):
+    """Segmentos e palavras de uma resposta verbose_json como dicionários, deslocados por `offset`"""
+    segments = [
+        {"start": offset + float(_field(seg, "start")), "end": offset + float(_field(seg, "end")),
+         "text": (_field(seg, "text") or "").strip()}
+        for seg in _field(transcript, "segments") or []
+    ]
+    words = [
+        {"start": offset + float(_field(word, "start")), "word": (_field(word, "word") or "").strip()}
+        for word in _field(transcript, "words") or []
+    ]
+    return segments, words
+
+
+def build_index(segments, words=()):
+    """Índice compacto a partir das listas de segmentos e de palavras (ver response_timestamps)"""
+    index = {"segmentos": [[round(seg["start"], 2), round(seg["end"], 2), seg["text"]] for seg in segments if seg["text"]]}
+    if words:
+        index["palavras"] = [[round(word["start"], 2), word["word"]] for word in words if word["word"]]
+    return index
+
+
+def index_duration(index):
+    segmentos = index.get("segmentos") or []
+    return segmentos[-1][1] if segmentos else 0.0
+
+
+def resolve_window(index, window):
+    """(início, fim) absolutos de uma janela em que valores negativos contam a partir do fim da ligação"""
+    duration = index_duration(index)
+    start, end = window
+    start = max(0.0, duration + start if start < 0 else start)
+    end = duration if end is None else min(duration, duration + end if end < 0 else end)
+    return start, end
+
+
+def timestamped_lines(index, start=0.0, end=None):
+    """Linhas "[m:ss] texto" dos segmentos que se sobrepõem a [start, end]"""
+    return "\n".join(
+        f"[{format_clock(inicio)}] {texto}"
+        for inicio, fim, texto in index.get("segmentos") or []
+        if fim > start and (end is None or inicio < end)
+    )
+
+
+class EvidenceLocator:
+    """Busca trechos citados no texto da ligação (por palavra, se houver timestamps por palavra)"""
+
+    def __init__(self, index):
+        if index.get("palavras"):
+            timed = index["palavras"]
+        else:
+            timed = [(inicio, texto) for inicio, _, texto in index.get("segmentos") or []]
+        self._starts = []
+        tokens = []
+        for start, text in timed:
+            for token in _TOKEN_RE.findall(normalize(text)):
+                self._starts.append(start)
+                tokens.append(token)
+        self._text = " " + " ".join(tokens) + " "
+
+    def locate(self, quote):
+        """Instante (s) em que `quote` começa na ligação; None se não for encontrado"""
+        tokens = _TOKEN_RE.findall(normalize(quote))
+        if len(tokens) < MIN_QUOTE_WORDS:
+            return None
+        for size in (len(tokens), QUOTE_PREFIX_WORDS):
+            position = self._text.find(" " + " ".join(tokens[:size]) + " ")
+            if position >= 0:
+                return self._starts[self._text.count(" ", 0, position)]
+        return None
+
+
+def quotes(text):
+    return [next(group for group in match.groups() if group) for match in _QUOTE_RE.finditer(text or "")]
+
+
+def evidence_times(index, analysis):
+    """{item: instante da primeira evidência localizada}: evidências das regras locais, trecho do modo compacto e citações da justificativa"""
+    locator = EvidenceLocator(index)
+    times = {}
+    for item in analysis.get("checklist_detalhado", []):
+        candidates = [evidencia.get("trecho", "") for evidencia in item.get("evidencias") or []]
+        candidates += [item["evidencia"]] if item.get("evidencia") else []
+        candidates += quotes(item.get("justificativa"))
+        for candidate in candidates:
+            start = locator.locate(candidate)
+            if start is not None:
+                times[item.get("item")] = start
+                break
+    return times
@@ -0,0 +1,477 @@
+"""Armazenamento das análises em SQLite normalizado, com agregados mantidos incrementalmente.
+
+Cada análise vira uma linha em `chamadas` (pontuação e status final) e linhas em `grupos`,
+`itens` e `eliminatorios`; o JSON completo fica à parte em `analises`, fora do caminho das
+consultas. As inserções são em lote, numa única transação.
+
+Os painéis não varrem as chamadas: leem tabelas de agregados por agente e semana ISO
+(`agg_semana`, `agg_grupos`, `agg_eliminatorios`, `agg_pontuacao`), atualizadas na mesma
+transação de cada inserção. Reinserir uma chamada (mesma chave) substitui a análise anterior e
+desconta a contribuição dela dos agregados.
+
+Uso em linha de comando (importa o JSONL do modo em lote):
+    python -m monitorai.store importar resultados.jsonl [--store resultados.sqlite]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+
+from monitorai.scoring import CRITERIOS_ELIMINATORIOS, is_yes
+
+SEM_AGENTE = ""
+INSERT_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chamadas (
+    id INTEGER PRIMARY KEY,
+    chave TEXT NOT NULL UNIQUE,
+    agente TEXT NOT NULL,
+    semana TEXT NOT NULL,
+    criado_em REAL NOT NULL,
+    modelo TEXT,
+    origem TEXT,
+    pontuacao INTEGER,
+    satisfacao TEXT,
+    risco TEXT,
+    desfecho TEXT
+);
+CREATE INDEX IF NOT EXISTS chamadas_agente_semana ON chamadas(agente, semana);
+CREATE INDEX IF NOT EXISTS chamadas_semana ON chamadas(semana);
+CREATE INDEX IF NOT EXISTS chamadas_criado_em ON chamadas(criado_em);
+
+CREATE TABLE IF NOT EXISTS grupos (
+    chamada_id INTEGER NOT NULL REFERENCES chamadas(id) ON DELETE CASCADE,
+    grupo TEXT NOT NULL,
+    feito INTEGER,
+    PRIMARY KEY (chamada_id, grupo)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS itens (
+    chamada_id INTEGER NOT NULL REFERENCES chamadas(id) ON DELETE CASCADE,
+    item INTEGER NOT NULL,
+    resposta INTEGER,
+    origem TEXT,
+    PRIMARY KEY (chamada_id, item)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS criterios (
+    id INTEGER PRIMARY KEY,
+    texto TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS eliminatorios (
+    chamada_id INTEGER NOT NULL REFERENCES chamadas(id) ON DELETE CASCADE,
+    criterio_id INTEGER NOT NULL REFERENCES criterios(id),
+    ocorreu INTEGER,
+    PRIMARY KEY (chamada_id, criterio_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS eliminatorios_ocorridos ON eliminatorios(criterio_id) WHERE ocorreu = 1;
+
+CREATE TABLE IF NOT EXISTS analises (
+    chamada_id INTEGER PRIMARY KEY REFERENCES chamadas(id) ON DELETE CASCADE,
+    analise TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS agg_semana (
+    agente TEXT NOT NULL,
+    semana TEXT NOT NULL,
+    chamadas INTEGER NOT NULL,
+    pontuadas INTEGER NOT NULL,
+    soma_pontuacao INTEGER NOT NULL,
+    PRIMARY KEY (agente, semana)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS agg_grupos (
+    agente TEXT NOT NULL,
+    semana TEXT NOT NULL,
+    grupo TEXT NOT NULL,
+    avaliados INTEGER NOT NULL,
+    feitos INTEGER NOT NULL,
+    PRIMARY KEY (agente, semana, grupo)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS agg_eliminatorios (
+    agente TEXT NOT NULL,
+    semana TEXT NOT NULL,
+    criterio_id INTEGER NOT NULL,
+    avaliadas INTEGER NOT NULL,
+    ocorrencias INTEGER NOT NULL,
+    PRIMARY KEY (agente, semana, criterio_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS agg_pontuacao (
+    agente TEXT NOT NULL,
+    semana TEXT NOT NULL,
+    pontuacao INTEGER NOT NULL,
+    chamadas INTEGER NOT NULL,
+    PRIMARY KEY (agente, semana, pontuacao)
+) WITHOUT ROWID;
+"""
+
+# Agregado -> (colunas da chave, colunas somadas)
+ROLLUPS = {
+    "agg_semana": (("agente", "semana"), ("chamadas", "pontuadas", "soma_pontuacao")),
+    "agg_grupos": (("agente", "semana", "grupo"), ("avaliados", "feitos")),
+    "agg_eliminatorios": (("agente", "semana", "criterio_id"), ("avaliadas", "ocorrencias")),
+    "agg_pontuacao": (("agente", "semana", "pontuacao"), ("chamadas",)),
+}
+
+
+def default_store_path():
+    """Banco de resultados (variável MONITORAI_STORE ou ~/.local/share/monitorai/resultados.sqlite)"""
+    return Path(os.environ.get("MONITORAI_STORE") or Path.home() / ".local" / "share" / "monitorai" / "resultados.sqlite")
+
+
+def week_of(value=None):
+    """Semana ISO ("2024-W07") de uma data, datetime, timestamp ou texto ISO; None ou data inválida usa hoje"""
+    try:
+        if isinstance(value, (int, float)):
+            value = datetime.fromtimestamp(value)
+        elif isinstance(value, str) and value:
+            value = datetime.fromisoformat(value)
+        year, week, _ = value.isocalendar()
+    except (AttributeError, OverflowError, OSError, ValueError):
+        year, week, _ = date.today().isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _flag(value):
+    """1/0/None a partir de true/false, "sim"/"não" ou ausente"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return int(is_yes(value) or value.strip().lower() == "true")
+    return int(bool(value))
+
+
+def _score(value):
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Deltas:
+    """Incrementos (ou decrementos, ao substituir) de cada agregado, somados em Python antes do upsert"""
+
+    def __init__(self):
+        self.tables = {name: defaultdict(lambda n=len(cols): [0] * n) for name, (_, cols) in ROLLUPS.items()}
+        self.removed = False
+
+    def add(self, call, groups, elims, sign=1):
+        self.removed |= sign < 0
+        agente, semana, pontuacao = call["agente"], call["semana"], call["pontuacao"]
+        row = self.tables["agg_semana"][(agente, semana)]
+        row[0] += sign
+        if pontuacao is not None:
+            row[1] += sign
+            row[2] += sign * pontuacao
+            self.tables["agg_pontuacao"][(agente, semana, pontuacao)][0] += sign
+        for grupo, feito in groups:
+            if feito is not None:
+                row = self.tables["agg_grupos"][(agente, semana, grupo)]
+                row[0] += sign
+                row[1] += sign * feito
+        for criterio_id, ocorreu in elims:
+            if ocorreu is not None:
+                row = self.tables["agg_eliminatorios"][(agente, semana, criterio_id)]
+                row[0] += sign
+                row[1] += sign * ocorreu
+
+    def apply(self, conn):
+        for name, (keys, cols) in ROLLUPS.items():
+            values = [key + tuple(row) for key, row in self.tables[name].items() if any(row)]
+            if not values:
+                continue
+            updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in cols)
+            conn.executemany(
+                f"INSERT INTO {name} ({', '.join(keys + cols)}) VALUES ({', '.join('?' * (len(keys) + len(cols)))}) "
+                f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates}",
+                values,
+            )
+            if self.removed:
+                # Agregados zerados por substituições não devem aparecer nos filtros
+                conn.execute(f"DELETE FROM {name} WHERE {cols[0]} <= 0")
+
+
+def _filters(agentes=None, semana_inicio=None, semana_fim=None):
+    clauses, params = [], []
+    if agentes:
+        clauses.append(f"agente IN ({', '.join('?' * len(agentes))})")
+        params.extend(agentes)
+    if semana_inicio:
+        clauses.append("semana >= ?")
+        params.append(semana_inicio)
+    if semana_fim:
+        clauses.append("semana <= ?")
+        params.append(semana_fim)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+class ResultsStore:
+    """Resultados das análises; seguro para várias sessões e processos (uma conexão por operação, WAL)"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or default_store_path())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._criterios = {}
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT OR IGNORE INTO criterios (texto) VALUES (?)", [(c,) for c in CRITERIOS_ELIMINATORIOS])
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _criterio_id(self, conn, texto, novos):
+        # Ids criados nesta transação ficam em `novos` e só entram no cache depois do COMMIT: um ROLLBACK
+        # desfaz o INSERT e o id em cache apontaria para um critério inexistente (falha de chave estrangeira)
+        if texto in self._criterios:
+            return self._criterios[texto]
+        if texto not in novos:
+            conn.execute("INSERT OR IGNORE INTO criterios (texto) VALUES (?)", (texto,))
+            novos[texto] = conn.execute("SELECT id FROM criterios WHERE texto = ?", (texto,)).fetchone()[0]
+        return novos[texto]
+
+    def add(self, chave, analysis, agente=None, data=None, modelo=None, origem=None):
+        """Grava (ou substitui) uma análise; `data` define a semana do agregado (padrão: agora)"""
+        return self.add_many([{"chave": chave, "analise": analysis, "agente": agente, "data": data,
+                               "modelo": modelo, "origem": origem}])
+
+    def add_many(self, records):
+        """Gravação em lote numa transação; registros: dicts com chave, analise e, opcionais, agente, data, modelo, origem"""
+        latest = {}
+        for record in records:
+            latest[record["chave"]] = record  # chave repetida no lote: vale a última
+        if not latest:
+            return 0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            deltas = _Deltas()
+            criterios = {}
+            self._remove(conn, list(latest), deltas)
+            next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM chamadas").fetchone()[0]
+            calls, groups, items, elims, raws = [], [], [], [], []
+            now = time.time()
+            for call_id, record in enumerate(latest.values(), start=next_id):
+                analysis = record["analise"]
+                status = analysis.get("status_final") or {}
+                call = {
+                    "agente": (record.get("agente") or SEM_AGENTE).strip(),
+                    "semana": week_of(record.get("data") or now),
+                    "pontuacao": _score(analysis.get("pontuacao_total_percentual")),
+                }
+                calls.append((call_id, record["chave"], call["agente"], call["semana"], now, record.get("modelo"),
+                              record.get("origem"), call["pontuacao"], status.get("satisfacao"), status.get("risco"),
+                              status.get("desfecho")))
+                call_groups = [(g.get("grupo"), _flag(g.get("feito"))) for g in analysis.get("grupos_avaliacao", []) if g.get("grupo")]
+                call_elims = [
+                    (self._criterio_id(conn, c["criterio"], criterios), _flag(c.get("ocorreu")))
+                    for c in analysis.get("criterios_eliminatorios", []) if c.get("criterio")
+                ]
+                groups.extend((call_id, grupo, feito) for grupo, feito in call_groups)
+                elims.extend((call_id, criterio_id, ocorreu) for criterio_id, ocorreu in call_elims)
+                items.extend(
+                    (call_id, int(item["item"]), _flag(item.get("resposta")), item.get("origem"))
+                    for item in analysis.get("checklist_detalhado", []) if str(item.get("item", "")).isdigit()
+                )
+                raws.append((call_id, json.dumps(analysis, ensure_ascii=False)))
+                deltas.add(call, call_groups, call_elims)
+            conn.executemany("INSERT INTO chamadas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", calls)
+            conn.executemany("INSERT OR REPLACE INTO grupos VALUES (?, ?, ?)", groups)
+            conn.executemany("INSERT OR REPLACE INTO itens VALUES (?, ?, ?, ?)", items)
+            conn.executemany("INSERT OR REPLACE INTO eliminatorios VALUES (?, ?, ?)", elims)
+            conn.executemany("INSERT INTO analises VALUES (?, ?)", raws)
+            deltas.apply(conn)
+            conn.execute("COMMIT")
+            self._criterios.update(criterios)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return len(calls)
+
+    def _remove(self, conn, keys, deltas):
+        """Apaga as chamadas com estas chaves, descontando dos agregados o que elas somaram"""
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ", ".join("?" * len(chunk))
+            old = {
+                row[0]: {"agente": row[1], "semana": row[2], "pontuacao": row[3], "grupos": [], "elims": []}
+                for row in conn.execute(f"SELECT id, agente, semana, pontuacao FROM chamadas WHERE chave IN ({marks})", chunk)
+            }
+            if not old:
+                continue
+            ids = list(old)
+            id_marks = ", ".join("?" * len(ids))
+            for call_id, grupo, feito in conn.execute(f"SELECT chamada_id, grupo, feito FROM grupos WHERE chamada_id IN ({id_marks})", ids):
+                old[call_id]["grupos"].append((grupo, feito))
+            for call_id, criterio_id, ocorreu in conn.execute(
+                f"SELECT chamada_id, criterio_id, ocorreu FROM eliminatorios WHERE chamada_id IN ({id_marks})", ids
+            ):
+                old[call_id]["elims"].append((criterio_id, ocorreu))
+            for call in old.values():
+                deltas.add(call, call["grupos"], call["elims"], sign=-1)
+            conn.execute(f"DELETE FROM chamadas WHERE id IN ({id_marks})", ids)
+
+    def rebuild_rollups(self):
+        """Recalcula todos os agregados a partir das tabelas normalizadas (verificação ou recuperação)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for name in ROLLUPS:
+                conn.execute(f"DELETE FROM {name}")
+            conn.execute("""INSERT INTO agg_semana
+                SELECT agente, semana, COUNT(*), COUNT(pontuacao), COALESCE(SUM(pontuacao), 0) FROM chamadas GROUP BY agente, semana""")
+            conn.execute("""INSERT INTO agg_pontuacao
+                SELECT agente, semana, pontuacao, COUNT(*) FROM chamadas WHERE pontuacao IS NOT NULL GROUP BY agente, semana, pontuacao""")
+            conn.execute("""INSERT INTO agg_grupos
+                SELECT c.agente, c.semana, g.grupo, COUNT(*), SUM(g.feito) FROM grupos g JOIN chamadas c ON c.id = g.chamada_id
+                WHERE g.feito IS NOT NULL GROUP BY c.agente, c.semana, g.grupo""")
+            conn.execute("""INSERT INTO agg_eliminatorios
+                SELECT c.agente, c.semana, e.criterio_id, COUNT(*), SUM(e.ocorreu) FROM eliminatorios e JOIN chamadas c ON c.id = e.chamada_id
+                WHERE e.ocorreu IS NOT NULL GROUP BY c.agente, c.semana, e.criterio_id""")
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def count(self):
+        return self._query("SELECT COUNT(*) FROM chamadas")[0][0]
+
+    def agents(self):
+        return [row[0] for row in self._query("SELECT DISTINCT agente FROM agg_semana ORDER BY agente")]
+
+    def weeks(self):
+        return [row[0] for row in self._query("SELECT DISTINCT semana FROM agg_semana ORDER BY semana")]
+
+    # As consultas abaixo leem apenas os agregados (agentes x semanas), não as chamadas
+
+    def by_agent_week(self, agentes=None, semana_inicio=None, semana_fim=None):
+        """[(agente, semana, chamadas, pontuadas, soma_pontuacao)]"""
+        where, params = _filters(agentes, semana_inicio, semana_fim)
+        return self._query(f"SELECT agente, semana, chamadas, pontuadas, soma_pontuacao FROM agg_semana{where} ORDER BY semana, agente", params)
+
+    def group_pass_rates(self, agentes=None, semana_inicio=None, semana_fim=None):
+        """[(grupo, avaliados, feitos)]"""
+        where, params = _filters(agentes, semana_inicio, semana_fim)
+        return self._query(f"SELECT grupo, SUM(avaliados), SUM(feitos) FROM agg_grupos{where} GROUP BY grupo ORDER BY grupo", params)
+
+    def eliminatory_frequencies(self, agentes=None, semana_inicio=None, semana_fim=None):
+        """[(criterio, avaliadas, ocorrencias)], dos mais frequentes para os menos"""
+        where, params = _filters(agentes, semana_inicio, semana_fim)
+        return self._query(
+            f"""SELECT c.texto, SUM(a.avaliadas), SUM(a.ocorrencias)
+                FROM (SELECT * FROM agg_eliminatorios{where}) a JOIN criterios c ON c.id = a.criterio_id
+                GROUP BY c.texto ORDER BY SUM(a.ocorrencias) DESC, c.texto""",
+            params,
+        )
+
+    def score_distribution(self, agentes=None, semana_inicio=None, semana_fim=None):
+        """[(pontuacao, chamadas)]"""
+        where, params = _filters(agentes, semana_inicio, semana_fim)
+        return self._query(f"SELECT pontuacao, SUM(chamadas) FROM agg_pontuacao{where} GROUP BY pontuacao ORDER BY pontuacao", params)
+
+    def recent(self, limit=50):
+        """Últimas chamadas gravadas: [(chave, agente, semana, criado_em, pontuacao, satisfacao, risco, desfecho)]"""
+        return self._query(
+            "SELECT chave, agente, semana, criado_em, pontuacao, satisfacao, risco, desfecho FROM chamadas ORDER BY criado_em DESC LIMIT ?",
+            (limit,),
+        )
+
+    def iter_analyses(self, agentes=None, semana_inicio=None, semana_fim=None):
+        """Análises completas com os filtros dos painéis, lidas aos poucos: gera dicts com chave, modelo e analise"""
+        where, params = _filters(agentes, semana_inicio, semana_fim)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT c.chave, c.modelo, a.analise FROM chamadas c JOIN analises a ON a.chamada_id = c.id{where} ORDER BY c.criado_em",
+                params,
+            )
+            for chave, modelo, analise in rows:
+                yield {"chave": chave, "modelo": modelo, "analise": json.loads(analise)}
+        finally:
+            conn.close()
+
+    def get(self, chave):
+        rows = self._query("SELECT a.analise FROM analises a JOIN chamadas c ON c.id = a.chamada_id WHERE c.chave = ?", (chave,))
+        return json.loads(rows[0][0]) if rows else None
+
+
+def batch_records(path):
+    """Registros para add_many a partir do JSONL do modo em lote (apenas ligações com status "ok")"""
+    with open(path, encoding="utf-8") as results:
+        for line in results:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") != "ok":
+                continue
+            metadata = record.get("metadados") or {}
+            yield {
+                "chave": record["id"],
+                "analise": record["analise"],
+                "agente": metadata.get("agente"),
+                "data": metadata.get("data") or record.get("concluido_em"),
+                "modelo": record.get("modelo"),
+                "origem": "lote",
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m monitorai.store", description="Banco de resultados das análises")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importar = commands.add_parser("importar", help="Importa o JSONL de resultados do modo em lote")
+    importar.add_argument("results", nargs="+")
+    reconstruir = commands.add_parser("reconstruir", help="Recalcula os agregados a partir das chamadas")
+    for command in (importar, reconstruir):
+        command.add_argument("--store", help="Banco de resultados (padrão: MONITORAI_STORE ou ~/.local/share/monitorai/resultados.sqlite)")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.store)
+    if args.command == "reconstruir":
+        store.rebuild_rollups()
+        print(f"Agregados recalculados ({store.count()} chamadas)", file=sys.stderr)
+        return 0
+    total = 0
+    for path in args.results:
+        batch = []
+        for record in batch_records(path):
+            batch.append(record)
+            if len(batch) >= INSERT_BATCH:
+                total += store.add_many(batch)
+                batch = []
+        total += store.add_many(batch)
+    print(f"{total} análises gravadas em {store.path} ({store.count()} no total)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
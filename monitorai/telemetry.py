@@ -0,0 +1,314 @@
+"""Telemetria leve por etapa: duração, segundos de áudio, tokens, custo estimado, acertos de cache e novas tentativas.
+
+Cada etapa instrumentada (transcrição, montagem do prompt, avaliação, leitura do JSON, renderização
+e PDF) gera um evento com a duração e os atributos anotados durante a execução:
+
+    with span("avaliacao", modelo=model) as sp:
+        response = client.chat.completions.create(...)
+        sp.usage(response.usage)
+
+Os eventos ficam numa janela móvel por etapa (percentis do painel de administração), alimentam
+contadores acumulados (texto do Prometheus) e, se configurado, são acrescentados a um JSONL.
+
+Eventos de outros processos (os processos de trabalho da fila, monitorai.jobs) chegam por
+forward_to() no processo que os gera e add_source() no que os exibe: antes de cada leitura do
+painel ou do /metrics, as fontes são consultadas e seus eventos entram nos mesmos agregados.
+
+Variáveis de ambiente (todas opcionais):
+    MONITORAI_TELEMETRY_JSONL    arquivo JSONL que recebe um evento por linha
+    MONITORAI_METRICS_PORT       porta do endpoint /metrics (formato texto do Prometheus)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ETAPA_PREPROCESSAMENTO = "preprocessamento"
+ETAPA_TRANSCRICAO = "transcricao"  # mesmo nome da etapa de timeouts em monitorai.clients
+ETAPA_PROMPT = "prompt"
+ETAPA_AVALIACAO = "avaliacao"
+ETAPA_JSON = "json"
+ETAPA_RENDER = "render"
+ETAPA_PDF = "pdf"
+ETAPAS = [ETAPA_PREPROCESSAMENTO, ETAPA_TRANSCRICAO, ETAPA_PROMPT, ETAPA_AVALIACAO, ETAPA_JSON, ETAPA_RENDER, ETAPA_PDF]
+
+# USD por milhão de tokens (entrada, saída) e por minuto de áudio; a busca é pelo prefixo mais longo do modelo
+PRECOS_TOKENS = {"gpt-4o": (2.50, 10.00), "gpt-4o-mini": (0.15, 0.60)}
+PRECOS_AUDIO_MINUTO = {"whisper-1": 0.006}
+
+WINDOW = 500
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _price(table, model):
+    matches = [name for name in table if model and model.startswith(name)]
+    return table[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0, audio_seconds=0.0):
+    """Custo estimado em USD (0 para modelos fora das tabelas de preço)"""
+    cost = 0.0
+    tokens = _price(PRECOS_TOKENS, model)
+    if tokens:
+        cost += (prompt_tokens * tokens[0] + completion_tokens * tokens[1]) / 1_000_000
+    audio = _price(PRECOS_AUDIO_MINUTO, model)
+    if audio:
+        cost += audio_seconds / 60 * audio
+    return cost
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class Span:
+    """Atributos de um evento em andamento"""
+
+    def __init__(self, stage, attrs):
+        self.stage = stage
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def usage(self, usage):
+        """Anota os tokens de `response.usage` (somando, se a etapa fizer mais de uma chamada)"""
+        if usage is None:
+            return self
+        for name in ("prompt_tokens", "completion_tokens"):
+            self.attrs[name] = self.attrs.get(name, 0) + (getattr(usage, name, None) or 0)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+        if cached:
+            self.attrs["cached_tokens"] = self.attrs.get("cached_tokens", 0) + cached
+        return self
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Telemetry:
+    """Coletor do processo (seguro entre threads)"""
+
+    def __init__(self, jsonl_path=None, window=WINDOW):
+        self.jsonl_path = jsonl_path
+        self.window = window
+        self._lock = threading.Lock()
+        self._forward = None
+        self._sources = []
+        self.reset()
+
+    def forward_to(self, callback):
+        """`callback(evento)` recebe também cada evento deste processo (None desliga)"""
+        self._forward = callback
+
+    def add_source(self, pull):
+        """`pull()` devolve eventos de outros processos, agregados antes de cada leitura"""
+        self._sources.append(pull)
+
+    def _pull(self):
+        for pull in self._sources:
+            try:
+                events = list(pull())
+            except Exception:
+                # Fonte indisponível (ex.: banco da fila ocupado): os eventos ficam para a próxima leitura
+                continue
+            for event in events:
+                self.merge(event)
+
+    def merge(self, event):
+        """Agrega um evento de outro processo (sem gravar no JSONL, que o processo de origem já grava)"""
+        if "contador" in event:
+            self._count(event["contador"], event.get("valor", 1), event.get("rotulos") or {})
+            return
+        attrs = {name: value for name, value in event.items() if name not in ("ts", "etapa", "duracao_s", "custo_usd")}
+        self._aggregate(event["etapa"], event["duracao_s"], attrs)
+
+    def reset(self):
+        with self._lock:
+            self._durations = defaultdict(lambda: deque(maxlen=self.window))
+            self._stage_totals = defaultdict(lambda: {"count": 0, "sum": 0.0, "errors": 0, "cache_hits": 0})
+            self._tokens = defaultdict(int)
+            self._cost = defaultdict(float)
+            self._audio_seconds = 0.0
+            self._counters = defaultdict(float)
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        current = Span(stage, attrs)
+        started = time.perf_counter()
+        try:
+            yield current
+        except GeneratorExit:
+            # Consumidor de um gerador que parou antes do fim: não é erro da etapa
+            raise
+        except BaseException as error:
+            current.attrs["erro"] = type(error).__name__
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, **current.attrs)
+
+    def record(self, stage, seconds, **attrs):
+        self._aggregate(stage, seconds, attrs)
+        if self.jsonl_path or self._forward is not None:
+            event = {"ts": round(time.time(), 3), "etapa": stage, "duracao_s": round(seconds, 6), **attrs}
+        if self._forward is not None:
+            self._forward(event)
+        if self.jsonl_path:
+            line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+            with self._lock, open(self.jsonl_path, "a", encoding="utf-8") as sink:
+                sink.write(line)
+
+    def _aggregate(self, stage, seconds, attrs):
+        model = attrs.get("modelo")
+        prompt_tokens = attrs.get("prompt_tokens", 0)
+        completion_tokens = attrs.get("completion_tokens", 0)
+        audio_seconds = 0.0 if attrs.get("cache_hit") else attrs.get("audio_s", 0.0) or 0.0
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, audio_seconds)
+        if cost:
+            attrs["custo_usd"] = round(cost, 6)
+        with self._lock:
+            self._durations[stage].append(seconds)
+            totals = self._stage_totals[stage]
+            totals["count"] += 1
+            totals["sum"] += seconds
+            totals["errors"] += "erro" in attrs
+            totals["cache_hits"] += bool(attrs.get("cache_hit"))
+            if prompt_tokens:
+                self._tokens[(stage, model, "prompt")] += prompt_tokens
+            if completion_tokens:
+                self._tokens[(stage, model, "completion")] += completion_tokens
+            if attrs.get("cached_tokens"):
+                self._tokens[(stage, model, "cached")] += attrs["cached_tokens"]
+            if cost:
+                self._cost[model] += cost
+            self._audio_seconds += audio_seconds
+
+    def count(self, name, value=1, **labels):
+        """Contador avulso, ex.: count("retries", erro="RateLimitError")"""
+        self._count(name, value, labels)
+        if self._forward is not None:
+            self._forward({"contador": name, "valor": value, "rotulos": labels})
+
+    def _count(self, name, value, labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def summary(self):
+        """Por etapa: eventos, erros, acertos de cache e p50/p95 (ms) da janela móvel, na ordem de ETAPAS"""
+        self._pull()
+        with self._lock:
+            durations = {stage: list(values) for stage, values in self._durations.items()}
+            totals = {stage: dict(values) for stage, values in self._stage_totals.items()}
+            tokens = dict(self._tokens)
+        rows = []
+        for stage in sorted(durations, key=lambda s: (ETAPAS.index(s) if s in ETAPAS else len(ETAPAS), s)):
+            window = durations[stage]
+            rows.append({
+                "etapa": stage,
+                "eventos": totals[stage]["count"],
+                "erros": totals[stage]["errors"],
+                "cache_hits": totals[stage]["cache_hits"],
+                "p50_ms": percentile(window, 0.5) * 1000,
+                "p95_ms": percentile(window, 0.95) * 1000,
+                "prompt_tokens": sum(n for (s, _, kind), n in tokens.items() if s == stage and kind == "prompt"),
+                "completion_tokens": sum(n for (s, _, kind), n in tokens.items() if s == stage and kind == "completion"),
+            })
+        return rows
+
+    def totals(self):
+        self._pull()
+        with self._lock:
+            return {"custo_usd": sum(self._cost.values()), "audio_s": self._audio_seconds,
+                    "contadores": {(name + _labels(**dict(labels))): value for (name, labels), value in self._counters.items()}}
+
+    def prometheus_text(self):
+        """Métricas no formato de exposição em texto do Prometheus"""
+        self._pull()
+        with self._lock:
+            durations = {stage: list(values) for stage, values in self._durations.items()}
+            totals = {stage: dict(values) for stage, values in self._stage_totals.items()}
+            tokens = dict(self._tokens)
+            cost = dict(self._cost)
+            audio_seconds = self._audio_seconds
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP monitorai_stage_duration_seconds Duração das etapas (quantis da janela móvel)",
+            "# TYPE monitorai_stage_duration_seconds summary",
+        ]
+        for stage, window in sorted(durations.items()):
+            for q in QUANTILES:
+                lines.append(f"monitorai_stage_duration_seconds{_labels(stage=stage, quantile=q)} {percentile(window, q):.6f}")
+            lines.append(f"monitorai_stage_duration_seconds_sum{_labels(stage=stage)} {totals[stage]['sum']:.6f}")
+            lines.append(f"monitorai_stage_duration_seconds_count{_labels(stage=stage)} {totals[stage]['count']}")
+        for metric, key, help_text in (
+            ("monitorai_stage_errors_total", "errors", "Etapas que terminaram com exceção"),
+            ("monitorai_cache_hits_total", "cache_hits", "Etapas atendidas pelo cache"),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f"{metric}{_labels(stage=stage)} {values[key]}" for stage, values in sorted(totals.items())]
+        lines += ["# HELP monitorai_tokens_total Tokens informados pela API (response.usage)", "# TYPE monitorai_tokens_total counter"]
+        lines += [
+            f"monitorai_tokens_total{_labels(stage=stage, model=model or '', kind=kind)} {value}"
+            for (stage, model, kind), value in sorted(tokens.items(), key=lambda item: tuple(map(str, item[0])))
+        ]
+        lines += ["# HELP monitorai_cost_usd_total Custo estimado em USD", "# TYPE monitorai_cost_usd_total counter"]
+        lines += [f"monitorai_cost_usd_total{_labels(model=model or '')} {value:.6f}" for model, value in sorted(cost.items(), key=str)]
+        lines += ["# HELP monitorai_audio_seconds_total Segundos de áudio transcritos", "# TYPE monitorai_audio_seconds_total counter",
+                  f"monitorai_audio_seconds_total {audio_seconds:.3f}"]
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE monitorai_{name}_total counter")
+            lines += [
+                f"monitorai_{name}_total{_labels(**dict(labels))} {value:g}"
+                for (counter, labels), value in sorted(counters.items()) if counter == name
+            ]
+        return "\n".join(lines) + "\n"
+
+
+telemetry = Telemetry(jsonl_path=os.environ.get("MONITORAI_TELEMETRY_JSONL") or None)
+span = telemetry.span
+count = telemetry.count
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    collector = telemetry
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        data = self.collector.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(port=None, host="0.0.0.0", collector=None):
+    """Sobe o endpoint /metrics numa thread; sem porta (nem MONITORAI_METRICS_PORT), não faz nada e devolve None"""
+    port = port if port is not None else os.environ.get("MONITORAI_METRICS_PORT")
+    if port in (None, ""):
+        return None
+    handler = type("MetricsHandler", (_MetricsHandler,), {"collector": collector or telemetry})
+    server = ThreadingHTTPServer((host, int(port)), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
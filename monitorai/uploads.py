@@ -0,0 +1,69 @@
+"""Cópia de uploads para disco em blocos, com remoção garantida do arquivo temporário."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import weakref
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SpooledUpload:
+    """Arquivo temporário com o conteúdo de um upload.
+
+    O arquivo é removido por cleanup(), quando o objeto é coletado (ex.: fim da sessão do Streamlit,
+    que descarta o session_state) ou na saída do interpretador, o que ocorrer primeiro.
+    """
+
+    def __init__(self, path, sha256, size, source_id=None):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.source_id = source_id
+        self._finalizer = weakref.finalize(self, _remove, path)
+
+    @property
+    def exists(self):
+        return self._finalizer.alive and os.path.exists(self.path)
+
+    def cleanup(self):
+        self._finalizer()
+
+
+class _HashingWriter:
+    """Repassa as escritas para o arquivo calculando o SHA-256 no caminho"""
+
+    def __init__(self, target):
+        self.target = target
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, block):
+        self.digest.update(block)
+        self.size += len(block)
+        return self.target.write(block)
+
+
+def spool_upload(fileobj, suffix=".mp3", source_id=None, directory=None, chunk_size=CHUNK_SIZE):
+    """Copia `fileobj` para um arquivo temporário em blocos de tamanho fixo, sem carregá-lo inteiro na memória"""
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            writer = _HashingWriter(tmp)
+            shutil.copyfileobj(fileobj, writer, chunk_size)
+    except BaseException:
+        _remove(path)
+        raise
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    return SpooledUpload(path, writer.digest.hexdigest(), writer.size, source_id=source_id)
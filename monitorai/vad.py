@@ -0,0 +1,90 @@
+"""Tempos da ligação medidos na forma de onda: detecção de voz por energia, sem chamadas à API.
+
+Parte dos níveis por quadro de 20 ms já calculados no pré-processamento (monitorai.preprocess) ou,
+sem eles, de uma decodificação em blocos do arquivo. Os trechos de fala e de silêncio saem de uma
+única passagem vetorizada sobre esses níveis; os números entram no prompt como fatos (itens 1 e 11)
+e aparecem no app e no PDF.
+
+Música de espera tem energia e conta como fala: as esperas detectadas são as de linha muda.
+"""
+
+from monitorai.preprocess import (
+    FRAME_SECONDS,
+    MIN_SPEECH_SECONDS,
+    levels_from_blocks,
+    speech_threshold,
+    stream_pcm,
+)
+
+# Silêncios menores que MIN_GAP_SECONDS ficam dentro da fala (pausas entre palavras)
+MIN_GAP_SECONDS = 0.5
+# Silêncio de PAUSA_MIN_SECONDS ou mais conta como pausa; de ESPERA_MIN_SECONDS ou mais, como espera
+PAUSA_MIN_SECONDS = 2.0
+ESPERA_MIN_SECONDS = 15.0
+
+
+def format_clock(seconds):
+    """m:ss para exibir instantes e durações"""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+def speech_runs(levels, threshold=None, min_gap=MIN_GAP_SECONDS, min_speech=MIN_SPEECH_SECONDS):
+    """(inícios, fins) dos trechos de fala, em quadros; fins exclusivos"""
+    import numpy as np
+    threshold = speech_threshold(levels) if threshold is None else threshold
+    edges = np.diff(np.concatenate(([0], (levels > threshold).astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not len(starts):
+        return starts, ends
+    # Junta trechos separados por silêncios curtos e descarta estalos isolados
+    joined = (starts[1:] - ends[:-1]) < max(1, int(round(min_gap / FRAME_SECONDS)))
+    starts = starts[np.concatenate(([True], ~joined))]
+    ends = ends[np.concatenate((~joined, [True]))]
+    long_enough = (ends - starts) >= max(1, int(round(min_speech / FRAME_SECONDS)))
+    return starts[long_enough], ends[long_enough]
+
+
+def timing_metrics(levels, threshold=None):
+    """Tempo até a primeira fala, pausas, esperas, maior silêncio e proporções de fala/silêncio (segundos)"""
+    import numpy as np
+    duration = len(levels) * FRAME_SECONDS
+    starts, ends = speech_runs(levels, threshold)
+    metrics = {
+        "duracao_s": round(duration, 2),
+        "primeira_fala_s": None,
+        "fala_s": 0.0,
+        "silencio_s": round(duration, 2),
+        "proporcao_fala": 0.0,
+        "proporcao_silencio": 1.0 if duration else 0.0,
+        "pausas": 0,
+        "maior_silencio_s": 0.0,
+        "esperas": [],
+    }
+    if not len(starts):
+        return metrics
+    speech = float(np.sum(ends - starts)) * FRAME_SECONDS
+    # Silêncios entre trechos de fala (as pontas da gravação ficam de fora)
+    gaps = (starts[1:] - ends[:-1]) * FRAME_SECONDS
+    holds = np.flatnonzero(gaps >= ESPERA_MIN_SECONDS)
+    metrics.update(
+        primeira_fala_s=round(float(starts[0]) * FRAME_SECONDS, 2),
+        fala_s=round(speech, 2),
+        silencio_s=round(duration - speech, 2),
+        proporcao_fala=round(speech / duration, 3),
+        proporcao_silencio=round(1 - speech / duration, 3),
+        pausas=int(np.count_nonzero(gaps >= PAUSA_MIN_SECONDS)),
+        maior_silencio_s=round(float(gaps.max()), 2) if len(gaps) else 0.0,
+        esperas=[
+            {"inicio_s": round(float(ends[index]) * FRAME_SECONDS, 2), "duracao_s": round(float(gaps[index]), 2)}
+            for index in holds
+        ],
+    )
+    return metrics
+
+
+def measure_file(path):
+    """timing_metrics de um arquivo de áudio, decodificado em blocos (memória constante)"""
+    levels, _ = levels_from_blocks(stream_pcm(path))
+    return timing_metrics(levels)
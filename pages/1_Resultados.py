@@ -0,0 +1,137 @@
+import streamlit as st
+st.set_page_config(page_title="MonitorAI - Resultados", page_icon="🔴", layout="wide")
+
+import time
+
+import pandas as pd
+
+from monitorai.export import TempExport
+from monitorai.scoring import GRUPOS
+from monitorai.store import SEM_AGENTE, ResultsStore
+
+SEM_AGENTE_ROTULO = "(sem agente)"
+
+@st.cache_resource
+def get_results_store():
+    """Banco de resultados compartilhado com a página de análise (MONITORAI_STORE)"""
+    return ResultsStore()
+
+def agent_label(agente):
+    return agente or SEM_AGENTE_ROTULO
+
+def discard_export():
+    exportacao = st.session_state.pop("exportacao", None)
+    if exportacao is not None:
+        exportacao.discard()
+
+def start_export(filtros, total):
+    """Inicia o ZIP dos relatórios num arquivo temporário (substitui o da exportação anterior da sessão)
+
+    O ZIP é gerado numa thread, com os PDFs nos processos de monitorai.export; o script da página só acompanha o andamento.
+    """
+    discard_export()
+    exportacao = TempExport(filtros, total)
+    exportacao.start(get_results_store().iter_analyses(**filtros))
+    st.session_state["exportacao"] = exportacao
+
+@st.fragment(run_every=1)
+def render_export_progress(exportacao):
+    """Acompanha a exportação em andamento; quando ela termina, a página inteira é redesenhada com o download"""
+    if exportacao.pronto:
+        st.rerun()
+    st.progress(min(exportacao.gerados / max(exportacao.total, 1), 1.0),
+                text=f"Gerando os relatórios: {exportacao.gerados} de {exportacao.total}")
+
+st.markdown("""
+<style>
+h1, h2, h3 { color: #C10000 !important; }
+</style>
+""", unsafe_allow_html=True)
+
+st.title("📊 Resultados das Análises")
+
+store = get_results_store()
+weeks = store.weeks()
+if not weeks:
+    st.info("ℹ️ Nenhuma análise gravada ainda. As análises feitas no app e no modo em lote aparecem aqui.")
+    st.stop()
+
+agentes = st.sidebar.multiselect("Agentes", store.agents(), format_func=agent_label, placeholder="Todos")
+if len(weeks) > 1:
+    semana_inicio, semana_fim = st.sidebar.select_slider("Semanas", options=weeks, value=(weeks[0], weeks[-1]))
+else:
+    semana_inicio = semana_fim = weeks[0]
+filtros = {"agentes": [agente if agente != SEM_AGENTE_ROTULO else SEM_AGENTE for agente in agentes],
+           "semana_inicio": semana_inicio, "semana_fim": semana_fim}
+
+# Tudo sai das tabelas de agregados (agente x semana); o resto é feito em colunas no pandas
+started = time.perf_counter()
+semanal = pd.DataFrame(store.by_agent_week(**filtros), columns=["agente", "semana", "chamadas", "pontuadas", "soma_pontuacao"])
+grupos = pd.DataFrame(store.group_pass_rates(**filtros), columns=["grupo", "avaliados", "feitos"])
+eliminatorios = pd.DataFrame(store.eliminatory_frequencies(**filtros), columns=["criterio", "avaliadas", "ocorrencias"])
+pontuacao = pd.DataFrame(store.score_distribution(**filtros), columns=["pontuacao", "chamadas"])
+elapsed_ms = (time.perf_counter() - started) * 1000
+
+if semanal.empty:
+    st.info("ℹ️ Nenhuma análise para os filtros escolhidos.")
+    st.stop()
+
+total_chamadas = int(semanal["chamadas"].sum())
+total_pontuadas = int(semanal["pontuadas"].sum())
+col1, col2, col3 = st.columns(3)
+col1.metric("Chamadas analisadas", f"{total_chamadas:,}".replace(",", "."))
+col2.metric("Pontuação média", f"{semanal['soma_pontuacao'].sum() / total_pontuadas:.1f}%" if total_pontuadas else "N/A")
+col3.metric("Ocorrências de critérios eliminatórios", int(eliminatorios["ocorrencias"].sum()) if not eliminatorios.empty else 0)
+
+st.subheader("📈 Pontuação média por semana")
+por_semana = semanal.groupby("semana")[["pontuadas", "soma_pontuacao"]].sum()
+st.line_chart((por_semana["soma_pontuacao"] / por_semana["pontuadas"].where(por_semana["pontuadas"] > 0)).rename("pontuação média"))
+
+st.subheader("✅ Taxa de aprovação por grupo")
+if grupos.empty:
+    st.info("ℹ️ Nenhum grupo avaliado.")
+else:
+    nomes = {grupo["grupo"]: f"{grupo['grupo']} - {grupo['nome']}" for grupo in GRUPOS}
+    grupos["taxa_%"] = (100 * grupos["feitos"] / grupos["avaliados"]).round(1)
+    st.bar_chart(grupos.set_index("grupo")["taxa_%"])
+    st.dataframe(grupos.assign(grupo=grupos["grupo"].map(nomes).fillna(grupos["grupo"])), hide_index=True)
+
+st.subheader("⚠️ Frequência dos critérios eliminatórios")
+if eliminatorios.empty:
+    st.info("ℹ️ Critérios eliminatórios não avaliados.")
+else:
+    eliminatorios["frequencia_%"] = (100 * eliminatorios["ocorrencias"] / eliminatorios["avaliadas"]).round(2)
+    st.dataframe(eliminatorios, hide_index=True)
+
+st.subheader("📊 Distribuição da pontuação")
+st.bar_chart(pontuacao.set_index("pontuacao")["chamadas"])
+
+st.subheader("👤 Pontuação média por agente e semana")
+semanal["agente"] = semanal["agente"].map(agent_label)
+semanal["media"] = (semanal["soma_pontuacao"] / semanal["pontuadas"].where(semanal["pontuadas"] > 0)).round(1)
+st.dataframe(semanal.pivot(index="agente", columns="semana", values="media"))
+
+st.caption(f"{total_chamadas:,} chamadas agregadas em {elapsed_ms:.0f} ms".replace(",", "."))
+
+st.subheader("📦 Exportar relatórios em PDF")
+st.caption("Um PDF por chamada dos filtros escolhidos, gerados em paralelo e reunidos num ZIP (sem a transcrição, que o banco não guarda).")
+exportacao = st.session_state.get("exportacao")
+if exportacao is not None and exportacao.filtros != filtros:
+    # O ZIP de outros filtros não é mais oferecido: o arquivo temporário é apagado
+    discard_export()
+    exportacao = None
+gerando = exportacao is not None and not exportacao.pronto
+if st.button(f"Gerar ZIP com {total_chamadas:,} relatórios".replace(",", "."), disabled=gerando):
+    start_export(filtros, total_chamadas)
+    exportacao, gerando = st.session_state["exportacao"], True
+if gerando:
+    render_export_progress(exportacao)
+elif exportacao is not None and exportacao.falha:
+    st.error(f"❌ Falha ao gerar os relatórios: {exportacao.falha}")
+elif exportacao is not None:
+    if exportacao.erros:
+        st.warning(f"⚠️ {len(exportacao.erros)} relatórios não puderam ser gerados (lista em erros.txt, dentro do ZIP).")
+    # Com um callable, o st.download_button só lê o ZIP no clique (numa thread, fora do rerun), e não a cada rerun
+    st.download_button(f"📥 Baixar {exportacao.relatorios} relatórios (ZIP)", data=exportacao.read, mime="application/zip",
+                       file_name=f"MonitorAI_Relatorios_{filtros['semana_inicio']}_{filtros['semana_fim']}.zip",
+                       on_click="ignore")
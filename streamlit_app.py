@@ -1,169 +1,53 @@
 import streamlit as st
 st.set_page_config(page_title="MonitorAI - Análise por Grupos", page_icon="🔴", layout="centered")
 
-from openai import OpenAI
-import tempfile
-import re
-import json
-import base64
+import atexit
 from datetime import datetime
-from fpdf import FPDF
-
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-
-def clean_text_for_pdf(text):
-    """Remove ou substitui caracteres que não são suportados pelo latin-1"""
-    if not text:
-        return ""
-    # Substituições comuns
-    replacements = {
-        '\u2026': '...',  # Reticências
-        '\u2013': '-',    # En dash
-        '\u2014': '--',   # Em dash
-        '\u2018': "'",    # Left single quote
-        '\u2019': "'",    # Right single quote
-        '\u201C': '"',    # Left double quote
-        '\u201D': '"',    # Right double quote
-        '\u2022': '*',    # Bullet
-        '\u2032': "'",    # Prime
-        '\u2033': '"',    # Double prime
-        '\u00B0': ' graus',  # Degree symbol
-        '\u00A9': '(c)',  # Copyright
-        '\u00AE': '(R)',  # Registered
-        '\u2122': '(TM)', # Trademark
-    }
-    
-    for unicode_char, replacement in replacements.items():
-        text = text.replace(unicode_char, replacement)
-    
-    # Remove qualquer caractere que não seja latin-1
-    try:
-        text.encode('latin-1')
-    except UnicodeEncodeError:
-        # Se ainda há caracteres problemáticos, remove-os
-        text = text.encode('latin-1', errors='ignore').decode('latin-1')
-    
-    return text
-
-def create_pdf(analysis, transcript_text, model_name):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.set_fill_color(193, 0, 0)
-    pdf.set_text_color(255, 255, 255)
-    pdf.cell(0, 10, "MonitorAI - Relatorio de Atendimento", 1, 1, "C", True)
-    pdf.ln(5)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 0, 1)
-    pdf.cell(0, 10, f"Modelo: {model_name}", 0, 1)
-    pdf.ln(5)
-    
-    # Status Final
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Status Final", 0, 1)
-    pdf.set_font("Arial", "", 12)
-    final = analysis.get("status_final", {})
-    pdf.cell(0, 10, clean_text_for_pdf(f"Satisfacao: {final.get('satisfacao', 'N/A')}"), 0, 1)
-    pdf.cell(0, 10, clean_text_for_pdf(f"Desfecho: {final.get('desfecho', 'N/A')}"), 0, 1)
-    pdf.cell(0, 10, clean_text_for_pdf(f"Risco: {final.get('risco', 'N/A')}"), 0, 1)
-    pdf.ln(5)
-    
-    # Pontuação Total
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Pontuacao Total", 0, 1)
-    pdf.set_font("Arial", "B", 12)
-    total = clean_text_for_pdf(str(analysis.get("pontuacao_total_percentual", "N/A")))
-    pdf.cell(0, 10, f"{total}% (avaliacao por grupos)", 0, 1)
-    pdf.ln(5)
-    
-    # Avaliação por Grupos
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Avaliacao por Grupos", 0, 1)
-    pdf.ln(3)
-    
-    grupos = analysis.get("grupos_avaliacao", [])
-    for grupo in grupos:
-        feito = grupo.get('feito')
-        if feito is None:
-            continue  # Pular não avaliados
-        
-        status_text = "TOTALMENTE CERTO" if feito else "TOTALMENTE INCORRETO"
-        
-        pdf.set_font("Arial", "B", 12)
-        nome_grupo = clean_text_for_pdf(grupo.get('nome', ''))
-        percentual = grupo.get('percentual', 0)
-        pdf.multi_cell(0, 8, f"{nome_grupo} ({percentual}%) - {status_text}")
-        pdf.set_font("Arial", "", 10)
-        justificativa = clean_text_for_pdf(grupo.get('justificativa', 'N/A'))
-        pdf.multi_cell(0, 6, f"Justificativa: {justificativa}")
-        pdf.ln(3)
-    
-    # Resumo Geral
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Resumo Geral", 0, 1)
-    pdf.set_font("Arial", "", 12)
-    resumo = clean_text_for_pdf(analysis.get("resumo_geral", "N/A"))
-    pdf.multi_cell(0, 10, resumo)
-    pdf.ln(5)
-    
-    # Critérios Eliminatórios
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Criterios Eliminatorios", 0, 1)
-    pdf.ln(3)
-    criterios_elim = analysis.get("criterios_eliminatorios", [])
-    for criterio in criterios_elim:
-        if criterio.get("ocorreu", False):
-            pdf.set_font("Arial", "B", 11)
-            criterio_texto = clean_text_for_pdf(criterio.get('criterio', 'N/A'))
-            pdf.multi_cell(0, 8, f"VIOLADO: {criterio_texto}")
-            pdf.set_font("Arial", "", 10)
-            justificativa = clean_text_for_pdf(criterio.get('justificativa', ''))
-            pdf.multi_cell(0, 6, justificativa)
-            pdf.ln(3)
-    
-    # Detalhamento Técnico
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Detalhamento Tecnico por Item", 0, 1)
-    pdf.ln(5)
-    
-    checklist = analysis.get("checklist_detalhado", [])
-    for item in checklist:
-        pdf.set_font("Arial", "B", 11)
-        criterio = clean_text_for_pdf(item.get('criterio', ''))
-        pdf.multi_cell(0, 8, f"Item {item.get('item')}: {criterio}")
-        pdf.set_font("Arial", "", 10)
-        resposta = clean_text_for_pdf(item.get('resposta', ''))
-        pdf.cell(0, 6, f"Resposta: {resposta}", 0, 1)
-        justificativa = clean_text_for_pdf(item.get('justificativa', ''))
-        pdf.multi_cell(0, 6, f"Justificativa: {justificativa}")
-        pdf.ln(3)
-    
-    # Transcrição
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Transcricao", 0, 1)
-    pdf.set_font("Arial", "", 10)
-    transcript_clean = clean_text_for_pdf(transcript_text)
-    pdf.multi_cell(0, 10, transcript_clean)
-    
-    return pdf.output(dest="S").encode("latin1")
-
-def get_pdf_download_link(pdf_bytes, filename):
-    b64 = base64.b64encode(pdf_bytes).decode()
-    return f'<a href="data:application/pdf;base64,{b64}" download="{filename}">📥 Baixar Relatório em PDF</a>'
-
-def extract_json(text):
-    start_idx = text.find('{')
-    end_idx = text.rfind('}')
-    if start_idx != -1 and end_idx != -1:
-        try:
-            return json.loads(text[start_idx:end_idx+1])
-        except:
-            pass
-    raise ValueError("Não foi possível extrair JSON válido")
+from pathlib import Path
+
+from monitorai.cache import DiskCache, default_cache_dir
+from monitorai.clients import ETAPA_ANALISE, ETAPA_TRANSCRICAO, for_stage, make_client
+from monitorai.compact import ALVO_ITEM, apply_justifications, justify, pending_targets, target_key
+from monitorai.jobs import PENDENTES, STATUS_ERRO, STATUS_NA_FILA, JobQueue, analysis_key, job_worker_count, start_workers, stop_workers
+from monitorai.memo import SessionMemo
+from monitorai.preprocess import preprocess_enabled
+from monitorai.prompt import ENGINE_CASCADE, ENGINE_GROUPS, ENGINE_SINGLE, MODELO_PADRAO, MODELO_RAPIDO
+from monitorai.segments import evidence_times, timestamped_lines
+from monitorai.telemetry import ETAPA_AVALIACAO, ETAPA_PDF, ETAPA_RENDER, span, start_metrics_server, telemetry
+from monitorai.uploads import spool_upload
+from monitorai.vad import format_clock
+
+@st.cache_resource
+def get_client():
+    """Cliente da OpenAI criado na primeira requisição e compartilhado (com o pool de conexões) por todas as sessões"""
+    return make_client(api_key=st.secrets["OPENAI_API_KEY"], base_url=st.secrets.get("OPENAI_BASE_URL"))
+
+@st.cache_resource
+def get_analysis_cache():
+    """Cache de análises (invalidado automaticamente quando a rubrica muda)"""
+    return DiskCache(default_cache_dir() / "analises.sqlite")
+
+@st.cache_resource
+def get_job_queue():
+    """Fila de análises (MONITORAI_JOBS_DIR) compartilhada por todas as sessões"""
+    queue = JobQueue()
+    # A telemetria dos processos de trabalho entra no painel de administração e no /metrics deste processo
+    telemetry.add_source(queue.take_telemetry)
+    return queue
+
+@st.cache_resource
+def get_job_workers():
+    """Processos de trabalho da fila, iniciados uma vez por servidor (MONITORAI_JOB_WORKERS=0: só processos externos)"""
+    workers, stop = start_workers(job_worker_count(), get_job_queue().directory,
+                                  api_key=st.secrets["OPENAI_API_KEY"], base_url=st.secrets.get("OPENAI_BASE_URL"))
+    # Ao desligar o servidor, os jobs em andamento terminam antes (até SHUTDOWN_SECONDS)
+    atexit.register(stop_workers, workers, stop)
+    return workers
+
+@st.cache_resource
+def get_metrics_server():
+    """Endpoint /metrics (Prometheus) do processo, se MONITORAI_METRICS_PORT estiver definida"""
+    return start_metrics_server()
 
 st.markdown("""
 <style>
@@ -186,373 +70,355 @@ def get_progress_class(value):
     elif value >= 50: return "progress-medium"
     else: return "progress-low"
 
-modelo_gpt = "gpt-4o"
+def render_status_final(final):
+    st.subheader("📊 Status Final do Atendimento")
+    st.markdown(f"""
+    <div class="status-box">
+    <strong>Satisfação do Cliente:</strong> {final.get("satisfacao", "N/A")}<br>
+    <strong>Desfecho:</strong> {final.get("desfecho", "N/A")}<br>
+    <strong>Nível de Risco:</strong> {final.get("risco", "N/A")}
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_pontuacao_total(total_percentual):
+    progress_class = get_progress_class(total_percentual)
+    st.subheader("📈 Pontuação Total")
+    st.progress(min(total_percentual / 100, 1.0))
+    st.markdown(f"<h2 class='{progress_class}'>{total_percentual}% de 100%</h2>", unsafe_allow_html=True)
+
+def render_grupos(grupos):
+    st.subheader("✅ Avaliação por Grupos")
+    st.write("*Cada grupo só é considerado TOTALMENTE CERTO se TODOS os seus itens forem aprovados*")
+    
+    for grupo in grupos:
+        feito = grupo.get("feito")
+        percentual = grupo.get("percentual", 0)
+        
+        # Pular se não foi avaliado
+        if feito is None:
+            continue
+        
+        # Todos os grupos agora contam para pontuação (A, B, C, D, E, F = 100%)
+        classe = "grupo-feito" if feito else "grupo-nao-feito"
+        icone_texto = "TOTALMENTE CERTO" if feito else "TOTALMENTE INCORRETO"
+        icone_emoji = "✅" if feito else "❌"
+        nome_grupo = grupo.get('nome')
+        # No modo compacto a justificativa do grupo só existe depois de gerada (PDF)
+        justificativa = f"<br><em>{grupo['justificativa']}</em>" if grupo.get('justificativa') else ""
+        
+        st.markdown(f"""
+        <div class="{classe}">
+        <strong>{icone_emoji} {icone_texto} | {nome_grupo} ({percentual}%)</strong>{justificativa}
+        </div>
+        """, unsafe_allow_html=True)
+
+def render_criterios_eliminatorios(criterios_elim):
+    st.subheader("⚠️ Critérios Eliminatórios")
+    
+    if criterios_elim:
+        criterios_violados = False
+        for criterio in criterios_elim:
+            if criterio.get("ocorreu", False):
+                criterios_violados = True
+                criterio_texto = criterio.get('criterio', 'N/A')
+                justificativa_texto = criterio.get('justificativa') or criterio.get('evidencia', '')
+                st.markdown(f"""
+                <div class="criterio-eliminatorio">
+                <strong>🚫 {criterio_texto}</strong><br>
+                {justificativa_texto}
+                </div>
+                """, unsafe_allow_html=True)
+        
+        if not criterios_violados:
+            st.success("✅ Nenhum critério eliminatório foi violado.")
+    else:
+        st.info("ℹ️ Critérios eliminatórios não avaliados.")
+
+def jump_to(source_id, seconds):
+    """Posiciona o player do áudio no instante da evidência (aplicado no rerun do clique)"""
+    st.session_state["audio_inicio"] = (source_id, int(seconds))
+
+def render_detalhamento(checklist, job_id, evidencias, justificar=None):
+    with st.expander("🔍 Ver Detalhamento Técnico por Item"):
+        st.write("*Avaliação individual de cada item que compõe os grupos*")
+        
+        # Agrupar por grupo
+        grupos_dict = {}
+        for item in checklist:
+            grupo = item.get("grupo", "")
+            if grupo not in grupos_dict:
+                grupos_dict[grupo] = []
+            grupos_dict[grupo].append(item)
+        
+        for grupo_letra in sorted(grupos_dict.keys()):
+            st.markdown(f"**📌 Grupo {grupo_letra}**")
+            for item in grupos_dict[grupo_letra]:
+                resposta = (item.get("resposta") or "").lower()
+                icone = "✅" if resposta == "sim" else "❌"
+                item_num = item.get('item')
+                criterio = item.get('criterio')
+                justificativa = item.get('justificativa')
+                origem = " ⚙️ <small>(regra local)</small>" if item.get("origem") == "regras" else ""
+                pendente = not justificativa and justificar is not None
+                if pendente:
+                    # Modo compacto: o trecho de evidência no lugar da justificativa, que é gerada sob demanda
+                    justificativa = f"“{item['evidencia']}”" if item.get("evidencia") else ""
+                
+                st.markdown(f"""
+                <div class="item-detalhe">
+                {icone} <strong>Item {item_num}: {criterio}</strong>{origem}<br>
+                <em>{justificativa}</em>
+                </div>
+                """, unsafe_allow_html=True)
+                if pendente and st.button("📝 Ver justificativa", key=f"justificar_{item_num}"):
+                    chave = target_key(ALVO_ITEM, item_num)
+                    st.markdown(f"<em>{justificar([chave]).get(chave, 'Justificativa indisponível.')}</em>", unsafe_allow_html=True)
+                if item_num in evidencias:
+                    st.button(f"▶️ Ouvir a evidência ({format_clock(evidencias[item_num])})", key=f"evidencia_{item_num}",
+                              on_click=jump_to, args=(job_id, evidencias[item_num]))
+            st.markdown("---")
+
+def render_resumo(resumo):
+    st.subheader("📝 Resumo Geral")
+    st.markdown(f"<div class='result-box'>{resumo}</div>", unsafe_allow_html=True)
+
+def render_tempos(tempos):
+    """Tempos medidos no áudio (monitorai.vad), também informados ao modelo como fatos"""
+    st.subheader("⏱️ Tempos da Ligação")
+    primeira = tempos.get("primeira_fala_s")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Primeira fala", f"{primeira:.1f} s" if primeira is not None else "N/A")
+    col2.metric("Fala / silêncio", f"{tempos['proporcao_fala']:.0%} / {tempos['proporcao_silencio']:.0%}")
+    col3.metric("Maior silêncio", f"{tempos['maior_silencio_s']:.0f} s")
+    col4.metric("Linha muda", len(tempos["esperas"]))
+    if tempos["esperas"]:
+        st.caption(" · ".join(f"Linha muda aos {format_clock(espera['inicio_s'])} por {espera['duracao_s']:.0f} s" for espera in tempos["esperas"]))
+
+def render_pdf(build_pdf, sob_demanda=False):
+    st.subheader("📄 Relatório em PDF")
+    if sob_demanda and not st.button("📝 Gerar PDF (com as justificativas)"):
+        return
+    try:
+        pdf_bytes = build_pdf()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"MonitorAI_Grupos_{timestamp}.pdf"
+        st.download_button("📥 Baixar Relatório em PDF", data=pdf_bytes, file_name=filename, mime="application/pdf")
+    except Exception as pdf_error:
+        st.error(f"❌ Erro ao gerar PDF: {str(pdf_error)}")
+
+def render_analysis(analysis, slots, build_pdf, job_id, evidencias, justificar=None, pdf_sob_demanda=False):
+    """Renderiza a análise completa; status e grupos ocupam os espaços já exibidos durante o streaming"""
+    with span(ETAPA_RENDER):
+        with slots["status"].container():
+            render_status_final(analysis.get("status_final", {}))
+        with slots["total"].container():
+            render_pontuacao_total(analysis.get("pontuacao_total_percentual", 0))
+        with slots["grupos"].container():
+            render_grupos(analysis.get("grupos_avaliacao", []))
+        render_criterios_eliminatorios(analysis.get("criterios_eliminatorios", []))
+        render_detalhamento(analysis.get("checklist_detalhado", []), job_id, evidencias, justificar)
+        render_resumo(analysis.get('resumo_geral', 'N/A'))
+    render_pdf(build_pdf, pdf_sob_demanda)
+
+def upload_source_id(uploaded_file):
+    return getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+
+def get_spooled_upload(uploaded_file):
+    """Cópia em disco do upload atual, reaproveitada enquanto o mesmo arquivo continuar selecionado"""
+    source_id = upload_source_id(uploaded_file)
+    upload = st.session_state.get("spooled_upload")
+    if upload is not None and upload.source_id == source_id and upload.exists:
+        return upload
+    release_spooled_upload()
+    upload = spool_upload(uploaded_file, source_id=source_id)
+    st.session_state["spooled_upload"] = upload
+    return upload
+
+def release_spooled_upload():
+    upload = st.session_state.pop("spooled_upload", None)
+    if upload is not None:
+        upload.cleanup()
+
+def get_session_memo():
+    """Resultados da sessão por job: reruns redesenham a partir daqui, sem reler o banco de jobs nem chamar a API"""
+    if "memo" not in st.session_state:
+        st.session_state["memo"] = SessionMemo()
+    return st.session_state["memo"]
+
+ETAPAS_JOB = {
+    STATUS_NA_FILA: "Aguardando na fila...",
+    ETAPA_TRANSCRICAO: "Transcrevendo o áudio...",
+    ETAPA_AVALIACAO: "Analisando a conversa por grupos...",
+    ETAPA_PDF: "Gerando o relatório em PDF...",
+}
+
+@st.fragment(run_every=1)
+def render_job_progress(job_id):
+    """Acompanha o job em andamento; quando ele termina, a página inteira é redesenhada com o resultado"""
+    job = get_job_queue().get(job_id)
+    if job is None or job["status"] not in PENDENTES:
+        st.rerun()
+    st.progress(job["progresso"], text=ETAPAS_JOB.get(job["etapa"] or job["status"], "Processando..."))
+    parcial = job["parcial"] or {}
+    if parcial.get("status_final"):
+        render_status_final(parcial["status_final"])
+    if parcial.get("grupos_avaliacao"):
+        render_grupos(parcial["grupos_avaliacao"])
+    st.caption("A análise continua mesmo se esta página for fechada: o link atual (?job=...) mostra o resultado depois.")
+
+def render_job_result(job):
+    """Resultado de um job concluído; os reruns redesenham da memória da sessão, sem reler o banco de jobs"""
+    job_id, params, resultado = job["id"], job["parametros"], job["resultado"]
+    modelo, compacto = params["modelo"], params.get("compacto", False)
+    transcript_text, tempos, indice = resultado["transcricao"], resultado.get("tempos"), resultado.get("indice")
+    memo = get_session_memo()
+
+    with st.expander("📄 Ver transcrição completa"):
+        st.code(timestamped_lines(indice) if indice else transcript_text, language="markdown")
+    preprocessamento = resultado.get("preprocessamento")
+    if preprocessamento:
+        st.caption(f"Áudio enviado: {preprocessamento['bytes'] / 2**20:.1f} MB de {preprocessamento['bytes_originais'] / 2**20:.1f} MB "
+                   f"({preprocessamento['bytes_economizados'] / 2**20:.1f} MB a menos) · "
+                   f"{preprocessamento['segundos_economizados']:.0f} s de silêncio cortados")
+    if tempos:
+        render_tempos(tempos)
+    if resultado.get("aviso"):
+        st.warning(f"⚠️ {resultado['aviso']}")
+    cascata = resultado["analise"].get("cascata")
+    if cascata:
+        motivos = ", ".join(cascata["motivos"])
+        st.caption(f"Cascata: avaliado por {cascata['modelo_final']}" + (f" (escalonado: {motivos})" if motivos else
+                   f" ({len(cascata['pontuacoes'])} execuções concordantes)"))
+        if cascata.get("escalacao_falhou"):
+            st.warning(f"⚠️ A reavaliação pelo modelo completo falhou ({cascata['escalacao_falhou']}); "
+                       "mantida a análise do modelo rápido.")
+
+    with st.expander("🔧 Debug - Resposta bruta"):
+        st.code(resultado["raw"], language="json")
+    slots = {"status": st.empty(), "total": st.empty(), "grupos": st.empty()}
+    analysis = resultado["analise"]
+
+    try:
+        def justificar(targets):
+            """Justificativas já geradas e as de `targets` que faltam (cache em disco, depois uma requisição)"""
+            texts = memo.get(job_id, "justificativas") or {}
+            missing = [target for target in targets if target not in texts]
+            if missing:
+                with st.spinner("Gerando justificativas..."):
+                    texts = {**texts, **justify(for_stage(get_client(), ETAPA_ANALISE), transcript_text, modelo, analysis,
+                                                missing, tempos, cache=get_analysis_cache(),
+                                                analysis_key=analysis_key(transcript_text, modelo, ENGINE_SINGLE, True, tempos))}
+                memo.put(job_id, "justificativas", texts)
+            return texts
+
+        # Fora do modo compacto o PDF já foi gerado pelo processo de trabalho; no compacto, só com as justificativas
+        def build_pdf():
+            if not compacto:
+                return Path(resultado["pdf"]).read_bytes()
+            from monitorai.report import create_pdf
+
+            completa = apply_justifications(analysis, justificar(pending_targets(analysis)))
+            return create_pdf(completa, transcript_text, modelo, tempos, indice)
+
+        evidencias = memo.get_or_put(job_id, "evidencias", lambda: evidence_times(indice, analysis) if indice else {})
+        if compacto:
+            analysis = apply_justifications(analysis, memo.get(job_id, "justificativas") or {})
+        render_analysis(analysis, slots, lambda: memo.get_or_put(job_id, "pdf", build_pdf), job_id, evidencias,
+                        justificar if compacto else None, pdf_sob_demanda=compacto and memo.get(job_id, "pdf") is None)
+    except Exception as e:
+        st.error(f"❌ Erro ao processar a análise: {str(e)}")
+
+def render_job(job_id):
+    # Um job concluído não muda mais: fica na memória da sessão e os reruns não releem o banco de jobs
+    memo = get_session_memo()
+    job = memo.get(job_id, "job")
+    if job is None:
+        job = get_job_queue().get(job_id)
+        if job is not None and job["status"] not in PENDENTES:
+            memo.put(job_id, "job", job)
+    if job is None:
+        st.warning("⚠️ Análise não encontrada (jobs antigos são apagados). Envie o áudio novamente.")
+        return
+    audio_inicio = st.session_state.get("audio_inicio")
+    st.audio(job["parametros"]["audio"], format='audio/mp3',
+             start_time=audio_inicio[1] if audio_inicio and audio_inicio[0] == job_id else 0)
+    if job["status"] in PENDENTES:
+        render_job_progress(job_id)
+    elif job["status"] == STATUS_ERRO:
+        st.error(f"❌ Erro ao processar a análise: {job['erro']}")
+        raw = (job["resultado"] or {}).get("raw")
+        if raw:
+            st.text_area("Resposta da IA:", value=raw, height=300)
+        else:
+            st.text_area("Não foi possível recuperar a resposta da IA", height=300)
+    else:
+        render_job_result(job)
+
+def render_admin_panel():
+    """Painel oculto (?admin=<ADMIN_TOKEN>): p50/p95 por etapa (app e processos de trabalho), tokens e custo"""
+    with st.sidebar.expander("🛠️ Telemetria", expanded=True):
+        rows = telemetry.summary()
+        if not rows:
+            st.caption("Nenhuma etapa registrada.")
+            return
+        st.dataframe(
+            [{**row, "p50_ms": round(row["p50_ms"], 1), "p95_ms": round(row["p95_ms"], 1)} for row in rows],
+            hide_index=True,
+        )
+        totals = telemetry.totals()
+        st.caption(f"Custo estimado: US$ {totals['custo_usd']:.4f} · Áudio transcrito: {totals['audio_s'] / 60:.1f} min")
+        if totals["contadores"]:
+            st.json(totals["contadores"], expanded=False)
+        if st.button("Zerar telemetria"):
+            telemetry.reset()
+            st.rerun()
+
+modelo_gpt = MODELO_PADRAO
+get_metrics_server()
+get_job_workers()
+
+admin_token = st.query_params.get("admin")
+if admin_token and admin_token == st.secrets.get("ADMIN_TOKEN"):
+    render_admin_panel()
+
+MODO_PROMPT_UNICO = "Prompt único"
+MODO_POR_GRUPO = "Por grupo (paralelo)"
+MODO_CASCATA = f"Cascata ({MODELO_RAPIDO} → {modelo_gpt})"
+MOTORES = {MODO_PROMPT_UNICO: ENGINE_SINGLE, MODO_POR_GRUPO: ENGINE_GROUPS, MODO_CASCATA: ENGINE_CASCADE}
+modo_avaliacao = st.sidebar.radio(
+    "Modo de avaliação", list(MOTORES),
+    help="Por grupo: uma requisição menor por grupo em paralelo, com a pontuação calculada localmente. "
+         f"Cascata: {MODELO_RAPIDO} duas vezes e {modelo_gpt} só quando as duas divergem, há critério eliminatório "
+         "marcado, a pontuação está perto de 50% ou 70% ou o JSON é inválido.",
+)
+modo_compacto = st.sidebar.toggle(
+    "Modo compacto", value=True, disabled=modo_avaliacao != MODO_PROMPT_UNICO,
+    help="Prompt único: só os veredictos e um trecho de evidência por item; as justificativas são geradas quando abertas ou no PDF.",
+)
+agente = st.sidebar.text_input("Agente (opcional)", help="Usado nos agregados por agente da página de Resultados.")
 
 st.title("MonitorAI SURA - Análise por Grupos")
 st.write("Análise inteligente de ligações: avaliação estruturada por grupos de competências.")
 
 uploaded_file = st.file_uploader("📁 Envie o áudio da ligação (.mp3)", type=["mp3"])
+job_id = st.query_params.get("job")
 
-if uploaded_file is not None:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-        tmp.write(uploaded_file.read())
-        tmp_path = tmp.name
-
-    st.audio(uploaded_file, format='audio/mp3')
-
+if uploaded_file is None:
+    release_spooled_upload()
+else:
+    if job_id is None:
+        st.audio(uploaded_file, format='audio/mp3')
     if st.button("🔍 Analisar Atendimento"):
-        with st.spinner("Transcrevendo o áudio..."):
-            with open(tmp_path, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-            transcript_text = transcript.text
-
-        with st.expander("📄 Ver transcrição completa"):
-            st.code(transcript_text, language="markdown")
-
-        prompt = f"""
-Você é um especialista em atendimento ao cliente da Carglass. Avalie a transcrição usando o sistema de GRUPOS.
-
-TRANSCRIÇÃO:
-\"\"\"{transcript_text}\"\"\"
-
-⚠️ LÓGICA DE AVALIAÇÃO POR GRUPOS - REGRA CRÍTICA:
-Cada GRUPO só é considerado "FEITO" se TODOS os itens dentro dele receberem "sim".
-Se QUALQUER item de um grupo receber "não", o GRUPO INTEIRO é marcado como "NÃO FEITO" e recebe 0%.
-
-ESTRUTURA DE GRUPOS:
-
-**GRUPO A (10%): Utilizou adequadamente as técnicas do atendimento?**
-Itens que compõem este grupo:
-- Item 1 (peso interno 10): Atendeu a ligação prontamente, dentro de 5 seg. e utilizou a saudação correta com as técnicas do atendimento encantador?
-- Item 3 (peso interno 6): Confirmou os dados do cadastro e pediu 2 telefones para contato?
-- Item 4 (peso interno 2): Verbalizou o script da LGPD?
-- Item 5 (peso interno 5): Utilizou a técnica do eco para garantir o entendimento sobre as informações coletadas?
-
-**GRUPO B (30%): Adotou o procedimento de acordo com a rotina/transmitiu informações corretas e completas?**
-Itens que compõem este grupo:
-- Item 6 (peso interno 3): Escutou atentamente a solicitação do segurado evitando solicitações em duplicidade?
-- Item 7 (peso interno 5): Compreendeu a solicitação do cliente em linha e demonstrou domínio sobre o produto/serviço?
-- Item 9 (peso interno 10): Confirmou as informações completas sobre o dano no veículo?
-- Item 10 (peso interno 10): Confirmou cidade para o atendimento e selecionou corretamente a primeira opção de loja identificada pelo sistema?
-
-**GRUPO C (10%): Foi objetivo, contribuindo para redução do TMA?**
-Itens que compõem este grupo:
-- Item 11 (peso interno 5): A comunicação com o cliente foi eficaz: não houve uso de gírias, linguagem inadequada ou conversas paralelas? O analista informou quando ficou ausente da linha e quando retornou?
-- Item 12 (peso interno 4): A conduta do analista foi acolhedora, com sorriso na voz, empatia e desejo verdadeiro em entender e solucionar a solicitação do cliente?
-
-**GRUPO D (20%): Utilizou adequadamente o sistema e efetuou os registros de maneira correta e completa?**
-Itens que compõem este grupo:
-- Item 14 (peso interno 15): Realizou o script de encerramento completo, informando: prazo de validade, franquia, link de acompanhamento e vistoria, e orientou que o cliente aguarde o contato para agendamento?
-- Item 15 (peso interno 6): Orientou o cliente sobre a pesquisa de satisfação do atendimento?
-
-**GRUPO E (10%): Transferiu a ligação ao superior quando solicitado e/ou necessário?**
-REGRA ESPECIAL PARA GRUPO E:
-- No modelo atual, colaboradores são incentivados a serem protagonistas do atendimento (autonomia)
-- Buscam auxílio quando necessário, mas são responsáveis por concluir as solicitações
-- Superiores monitoram e apoiam, mas NÃO assumem as chamadas
-
-AVALIAÇÃO:
-- Se NÃO transferiu/acionou superior = VERDE (Totalmente Certo) = +10% na pontuação
-- Se transferiu/acionou superior = VERMELHO (Totalmente Incorreto) = 0% na pontuação
-
-Marque "feito: true" se o atendente NÃO transferiu e resolveu com autonomia.
-Marque "feito: false" se o atendente transferiu ou acionou o superior.
-
-**GRUPO F (20%): Teve foco no cliente?**
-Avalie o foco no cliente durante TODO o atendimento:
-- Priorizou as necessidades do cliente?
-- Manteve empatia e interesse genuíno?
-- Buscou a melhor solução para o cliente?
-- Demonstrou comprometimento em resolver o problema?
-Este grupo conta 20% na pontuação total.
-
-INSTRUÇÕES DETALHADAS PARA CADA ITEM:
-
-**ITEM 5 - TÉCNICA DO ECO (AVALIAÇÃO RIGOROSA):**
-Marque como "SIM" SE QUALQUER UMA das condições abaixo for atendida:
-
-CONDIÇÃO A - SOLETRAÇÃO FONÉTICA (APROVAÇÃO AUTOMÁTICA):
-- Soletração fonética de QUALQUER informação (placa, telefone, CPF)
-- Exemplos: "R de rato, W de Washington", "rato, sapo, xícara", "A de avião, B de bola"
-- Uma única soletração fonética é suficiente
-
-CONDIÇÃO B - ECO MÚLTIPLO:
-- Repetiu (completa ou parcialmente) PELO MENOS 2 informações: placa, telefone principal, CPF, telefone secundário
-
-CONDIÇÃO C - ECO PARCIAL (APROVAÇÃO FLEXÍVEL):
-- Repetiu parte significativa de uma informação principal
-- Exemplos: "0800-703-0203" → "0203" (últimos dígitos)
-- Eco parcial de 3+ dígitos finais é válido mesmo sem confirmação explícita
-
-CONDIÇÃO D - ECO INTERROGATIVO CONFIRMADO:
-- Repetiu informação com tom interrogativo E cliente confirmou
-- Exemplos: "54-3381-5775?" → Cliente: "Isso"
-
-NÃO É ECO VÁLIDO: Apenas "ok", "certo", "entendi" sem repetir informação
-
-**ITEM 3 - SOLICITAÇÃO DE DADOS (AVALIAÇÃO RIGOROSA):**
-Marque como "SIM" APENAS se o atendente solicitou EXPLICITAMENTE TODOS os 6 dados:
-1. NOME do cliente
-2. CPF do cliente
-3. PLACA do veículo
-4. ENDEREÇO do cliente
-5. TELEFONE PRINCIPAL
-6. TELEFONE SECUNDÁRIO
-
-EXCEÇÃO BRADESCO/SURA/ALD: CPF e endereço podem ser dispensados APENAS se o atendente CONFIRMAR que já estão no sistema.
-
-**ITEM 4 - SCRIPT LGPD:**
-Válido se mencionar compartilhamento do telefone com prestador, com ênfase em privacidade/consentimento.
-Variações aceitas:
-- "Você permite que compartilhemos seu telefone com o prestador?"
-- "Podemos informar seu telefone ao prestador que irá atender?"
-- "Você autoriza o envio de notificações no WhatsApp?"
-
-**ITEM 14 - SCRIPT DE ENCERRAMENTO:**
-Deve incluir TODOS os elementos:
-- Prazo de validade
-- Franquia
-- Link de acompanhamento e vistoria
-- Orientação para aguardar contato para agendamento
-
-**CRITÉRIOS ELIMINATÓRIOS:**
-- Ofereceu serviço sem direito
-- Preencheu veículo/peça incorretos
-- Agiu com rudeza
-- Encerrou/transferiu sem conhecimento do cliente
-- Falou negativamente da empresa
-- Forneceu informações incorretas ou fez suposições infundadas
-- Comentou sobre serviços externos
-
-RETORNE APENAS JSON (sem ``` ou texto adicional):
-
-{{
-  "status_final": {{
-    "satisfacao": "satisfeito/insatisfeito/neutro",
-    "risco": "baixo/médio/alto",
-    "desfecho": "resolvido/pendente/não resolvido"
-  }},
-  "grupos_avaliacao": [
-    {{
-      "grupo": "A",
-      "nome": "Utilizou adequadamente as técnicas do atendimento?",
-      "percentual": 10,
-      "feito": true/false,
-      "justificativa": "Explicação detalhada considerando TODOS os itens (1, 3, 4, 5) do grupo"
-    }},
-    {{
-      "grupo": "B",
-      "nome": "Adotou o procedimento de acordo com a rotina/transmitiu informações corretas e completas?",
-      "percentual": 30,
-      "feito": true/false,
-      "justificativa": "Explicação detalhada considerando TODOS os itens (6, 7, 9, 10) do grupo"
-    }},
-    {{
-      "grupo": "C",
-      "nome": "Foi objetivo, contribuindo para redução do TMA?",
-      "percentual": 10,
-      "feito": true/false,
-      "justificativa": "Explicação detalhada considerando TODOS os itens (11, 12) do grupo"
-    }},
-    {{
-      "grupo": "D",
-      "nome": "Utilizou adequadamente o sistema e efetuou os registros de maneira correta e completa?",
-      "percentual": 20,
-      "feito": true/false,
-      "justificativa": "Explicação detalhada considerando TODOS os itens (14, 15) do grupo"
-    }},
-    {{
-      "grupo": "E",
-      "nome": "Transferiu a ligação ao superior quando solicitado e/ou necessário?",
-      "percentual": 10,
-      "feito": true/false,
-      "justificativa": "Se NÃO transferiu (autonomia) = true (+10%). Se transferiu = false (0%). Explicar se houve transferência ou se resolveu com autonomia."
-    }},
-    {{
-      "grupo": "F",
-      "nome": "Teve foco no cliente?",
-      "percentual": 20,
-      "feito": true/false,
-      "justificativa": "Análise detalhada do foco no cliente durante TODO o atendimento: priorizou necessidades, manteve empatia, buscou melhor solução, demonstrou comprometimento"
-    }}
-  ],
-  "checklist_detalhado": [
-    {{"item": 1, "grupo": "A", "criterio": "Atendeu prontamente e usou saudação correta", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 3, "grupo": "A", "criterio": "Confirmou cadastro e pediu 2 telefones", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 4, "grupo": "A", "criterio": "Verbalizou script LGPD", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 5, "grupo": "A", "criterio": "Utilizou técnica do eco", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 6, "grupo": "B", "criterio": "Escutou atentamente", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 7, "grupo": "B", "criterio": "Demonstrou domínio", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 9, "grupo": "B", "criterio": "Confirmou danos no veículo", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 10, "grupo": "B", "criterio": "Confirmou cidade", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 11, "grupo": "C", "criterio": "Comunicação eficaz", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 12, "grupo": "C", "criterio": "Conduta acolhedora", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 14, "grupo": "D", "criterio": "Script encerramento completo", "resposta": "sim/não", "justificativa": "..."}},
-    {{"item": 15, "grupo": "D", "criterio": "Orientou sobre pesquisa", "resposta": "sim/não", "justificativa": "..."}}
-  ],
-  "criterios_eliminatorios": [
-    {{"criterio": "Ofereceu serviço sem direito?", "ocorreu": false, "justificativa": "..."}},
-    {{"criterio": "Preencheu veículo/peça incorretos?", "ocorreu": false, "justificativa": "..."}},
-    {{"criterio": "Agiu de forma rude?", "ocorreu": false, "justificativa": "..."}},
-    {{"criterio": "Encerrou/transferiu sem conhecimento?", "ocorreu": false, "justificativa": "..."}},
-    {{"criterio": "Falou negativamente da empresa?", "ocorreu": false, "justificativa": "..."}},
-    {{"criterio": "Forneceu informações incorretas?", "ocorreu": false, "justificativa": "..."}},
-    {{"criterio": "Comentou sobre serviços externos?", "ocorreu": false, "justificativa": "..."}}
-  ],
-  "pontuacao_total_percentual": (soma dos percentuais dos grupos onde feito=true),
-  "resumo_geral": "Resumo executivo do atendimento, destacando pontos fortes e áreas de melhoria"
-}}
-
-CÁLCULO DA PONTUAÇÃO:
-- Some APENAS os percentuais dos grupos onde TODOS os itens = "sim" (feito=true)
-- Exemplo: Se grupos A, C, E e F estão completos → 10% + 10% + 10% + 20% = 50%
-- IMPORTANTE: Grupo E vale 10% SE o atendente NÃO transferiu (demonstrou autonomia)
-- Pontuação máxima possível: 100%
-"""
-
-        with st.spinner("Analisando a conversa por grupos..."):
-            try:
-                response = client.chat.completions.create(
-                    model=modelo_gpt,
-                    messages=[
-                        {"role": "system", "content": "Você é um analista especializado em atendimento. Responda APENAS com JSON, sem texto adicional."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    response_format={"type": "json_object"}
-                )
-                result = response.choices[0].message.content.strip()
-
-                with st.expander("🔧 Debug - Resposta bruta"):
-                    st.code(result, language="json")
-                
-                try:
-                    if not result.startswith("{"):
-                        analysis = extract_json(result)
-                    else:
-                        analysis = json.loads(result)
-                except Exception as json_error:
-                    st.error(f"❌ Erro ao processar JSON: {str(json_error)}")
-                    st.text_area("Resposta da IA:", value=result, height=300)
-                    st.stop()
-
-                # Status Final
-                st.subheader("📊 Status Final do Atendimento")
-                final = analysis.get("status_final", {})
-                st.markdown(f"""
-                <div class="status-box">
-                <strong>Satisfação do Cliente:</strong> {final.get("satisfacao", "N/A")}<br>
-                <strong>Desfecho:</strong> {final.get("desfecho", "N/A")}<br>
-                <strong>Nível de Risco:</strong> {final.get("risco", "N/A")}
-                </div>
-                """, unsafe_allow_html=True)
-
-                # Pontuação Total
-                total_percentual = analysis.get("pontuacao_total_percentual", 0)
-                progress_class = get_progress_class(total_percentual)
-                st.subheader("📈 Pontuação Total")
-                st.progress(min(total_percentual / 100, 1.0))
-                st.markdown(f"<h2 class='{progress_class}'>{total_percentual}% de 100%</h2>", unsafe_allow_html=True)
-
-                # Avaliação por Grupos (Principal)
-                st.subheader("✅ Avaliação por Grupos")
-                st.write("*Cada grupo só é considerado TOTALMENTE CERTO se TODOS os seus itens forem aprovados*")
-                
-                grupos = analysis.get("grupos_avaliacao", [])
-                for grupo in grupos:
-                    feito = grupo.get("feito")
-                    grupo_letra = grupo.get("grupo", "")
-                    percentual = grupo.get("percentual", 0)
-                    
-                    # Pular se não foi avaliado
-                    if feito is None:
-                        continue
-                    
-                    # Todos os grupos agora contam para pontuação (A, B, C, D, E, F = 100%)
-                    classe = "grupo-feito" if feito else "grupo-nao-feito"
-                    icone_texto = "TOTALMENTE CERTO" if feito else "TOTALMENTE INCORRETO"
-                    icone_emoji = "✅" if feito else "❌"
-                    nome_grupo = grupo.get('nome')
-                    justificativa = grupo.get('justificativa', 'N/A')
-                    
-                    st.markdown(f"""
-                    <div class="{classe}">
-                    <strong>{icone_emoji} {icone_texto} | {nome_grupo} ({percentual}%)</strong><br>
-                    <em>{justificativa}</em>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-
-                # Critérios Eliminatórios
-                st.subheader("⚠️ Critérios Eliminatórios")
-                criterios_elim = analysis.get("criterios_eliminatorios", [])
-                
-                if criterios_elim:
-                    criterios_violados = False
-                    for criterio in criterios_elim:
-                        if criterio.get("ocorreu", False):
-                            criterios_violados = True
-                            criterio_texto = criterio.get('criterio', 'N/A')
-                            justificativa_texto = criterio.get('justificativa', '')
-                            st.markdown(f"""
-                            <div class="criterio-eliminatorio">
-                            <strong>🚫 {criterio_texto}</strong><br>
-                            {justificativa_texto}
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
-                    if not criterios_violados:
-                        st.success("✅ Nenhum critério eliminatório foi violado.")
-                else:
-                    st.info("ℹ️ Critérios eliminatórios não avaliados.")
-
-                # Detalhamento Técnico (Expandível)
-                with st.expander("🔍 Ver Detalhamento Técnico por Item"):
-                    st.write("*Avaliação individual de cada item que compõe os grupos*")
-                    checklist = analysis.get("checklist_detalhado", [])
-                    
-                    # Agrupar por grupo
-                    grupos_dict = {}
-                    for item in checklist:
-                        grupo = item.get("grupo", "")
-                        if grupo not in grupos_dict:
-                            grupos_dict[grupo] = []
-                        grupos_dict[grupo].append(item)
-                    
-                    for grupo_letra in sorted(grupos_dict.keys()):
-                        st.markdown(f"**📌 Grupo {grupo_letra}**")
-                        for item in grupos_dict[grupo_letra]:
-                            resposta = item.get("resposta", "").lower()
-                            icone = "✅" if resposta == "sim" else "❌"
-                            item_num = item.get('item')
-                            criterio = item.get('criterio')
-                            justificativa = item.get('justificativa')
-                            
-                            st.markdown(f"""
-                            <div class="item-detalhe">
-                            {icone} <strong>Item {item_num}: {criterio}</strong><br>
-                            <em>{justificativa}</em>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        st.markdown("---")
-
-                # Resumo Geral
-                st.subheader("📝 Resumo Geral")
-                st.markdown(f"<div class='result-box'>{analysis.get('resumo_geral', 'N/A')}</div>", unsafe_allow_html=True)
-                
-                # PDF
-                st.subheader("📄 Relatório em PDF")
-                try:
-                    pdf_bytes = create_pdf(analysis, transcript_text, modelo_gpt)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"MonitorAI_Grupos_{timestamp}.pdf"
-                    st.markdown(get_pdf_download_link(pdf_bytes, filename), unsafe_allow_html=True)
-                except Exception as pdf_error:
-                    st.error(f"❌ Erro ao gerar PDF: {str(pdf_error)}")
-
-            except Exception as e:
-                st.error(f"❌ Erro ao processar a análise: {str(e)}")
-                try:
-                    st.text_area("Resposta da IA:", value=response.choices[0].message.content.strip(), height=300)
-                except:
-                    st.text_area("Não foi possível recuperar a resposta da IA", height=300)
+        # O áudio vai para o diretório do job; a cópia temporária do upload sai assim que o job é criado
+        upload = get_spooled_upload(uploaded_file)
+        try:
+            job_id = get_job_queue().submit(upload.path, sha256=upload.sha256, modelo=modelo_gpt,
+                                            motor=MOTORES[modo_avaliacao],
+                                            compacto=modo_compacto and modo_avaliacao == MODO_PROMPT_UNICO,
+                                            preprocess=preprocess_enabled(), agente=agente)
+        finally:
+            release_spooled_upload()
+        st.query_params["job"] = job_id
+
+if job_id is not None:
+    render_job(job_id)
@@ -0,0 +1,115 @@
+"""Avaliação em cascata (monitorai.cascade): respostas inválidas ou truncadas e pontuação calculada localmente."""
+
+import asyncio
+import json
+
+import pytest
+
+from monitorai import cascade
+from monitorai.scoring import GRUPOS, ITENS
+
+FAST, FULL = "rapido", "completo"
+ELIMINATORIO = json.dumps({
+    "pontuacao_total_percentual": 90,
+    "criterios_eliminatorios": [{"criterio": "Ofensa", "ocorreu": True, "justificativa": "..."}],
+})
+
+
+def full_analysis(respostas, pontuacao_modelo, eliminatorio=False):
+    """Análise no formato do prompt único; `respostas`: {item: "sim"/"não"} (os demais itens "sim")"""
+    return json.dumps({
+        "grupos_avaliacao": [{"grupo": grupo["grupo"], "percentual": grupo["percentual"], "feito": True} for grupo in GRUPOS],
+        "checklist_detalhado": [{"item": numero, "resposta": respostas.get(numero, "sim")} for numero in ITENS],
+        "criterios_eliminatorios": [{"criterio": "Ofensa", "ocorreu": eliminatorio}],
+        "pontuacao_total_percentual": pontuacao_modelo,
+    })
+
+
+def fake_requests(monkeypatch, responses):
+    """`responses`: {modelo: conteúdo} ou {modelo: (conteúdo, finish_reason)}"""
+    def completion(model):
+        response = responses[model]
+        return response if isinstance(response, tuple) else (response, "stop")
+
+    def request(client, transcript_text, model, tempos=None):
+        return completion(model)
+
+    async def request_async(client, transcript_text, model, tempos=None):
+        return completion(model)
+
+    monkeypatch.setattr(cascade, "request_completion", request)
+    monkeypatch.setattr(cascade, "request_completion_async", request_async)
+
+
+def run_both(transcript_text="transcrição"):
+    sync = cascade.evaluate_cascade(None, transcript_text, FULL, FAST)
+    async_ = asyncio.run(cascade.evaluate_cascade_async(None, transcript_text, FULL, FAST))
+    return [sync, async_]
+
+
+def test_invalid_escalation_keeps_the_fast_analysis(monkeypatch):
+    fake_requests(monkeypatch, {FAST: ELIMINATORIO, FULL: "Desculpe, não consegui avaliar"})
+    for raw, analysis in run_both():
+        decision = analysis["cascata"]
+        assert raw == ELIMINATORIO
+        assert decision["modelo_final"] == FAST
+        assert decision["motivos"] == [cascade.MOTIVO_ELIMINATORIO] and decision["escalou"]
+        assert decision["escalacao_falhou"].startswith(f"{FULL}: JSON inválido")
+        assert cascade.escalation_failed(analysis)
+
+
+def test_valid_escalation_is_not_marked(monkeypatch):
+    full = json.dumps({"pontuacao_total_percentual": 100, "criterios_eliminatorios": []})
+    fake_requests(monkeypatch, {FAST: ELIMINATORIO, FULL: full})
+    for raw, analysis in run_both():
+        assert raw == full
+        assert analysis["cascata"]["modelo_final"] == FULL
+        assert not cascade.escalation_failed(analysis)
+
+
+def test_invalid_escalation_without_fast_analysis_raises(monkeypatch):
+    fake_requests(monkeypatch, {FAST: "sem json", FULL: "também sem json"})
+    with pytest.raises(ValueError):
+        cascade.evaluate_cascade(None, "transcrição", FULL, FAST)
+    with pytest.raises(ValueError):
+        asyncio.run(cascade.evaluate_cascade_async(None, "transcrição", FULL, FAST))
+
+
+def test_score_is_recomputed_from_the_items(monkeypatch):
+    # O modelo diz 100%, mas o item 14 "não" derruba o grupo D (20%)
+    fast = full_analysis({14: "não"}, pontuacao_modelo=100)
+    fake_requests(monkeypatch, {FAST: fast, FULL: "não deve ser chamado"})
+    for raw, analysis in run_both():
+        assert analysis["pontuacao_total_percentual"] == 80
+        assert {grupo["grupo"]: grupo["feito"] for grupo in analysis["grupos_avaliacao"]}["D"] is False
+        assert analysis["cascata"]["pontuacoes"] == [80, 80] and not analysis["cascata"]["escalou"]
+
+
+def test_local_score_near_a_threshold_escalates(monkeypatch):
+    # 70% pelos itens (A e D falham) fica no limiar, mesmo com o modelo informando 100%
+    fast = full_analysis({4: "não", 14: "não"}, pontuacao_modelo=100)
+    full = full_analysis({}, pontuacao_modelo=0)
+    fake_requests(monkeypatch, {FAST: fast, FULL: full})
+    for raw, analysis in run_both():
+        assert analysis["cascata"]["motivos"] == [cascade.MOTIVO_LIMIAR]
+        assert analysis["cascata"]["modelo_final"] == FULL and analysis["pontuacao_total_percentual"] == 100
+
+
+def test_truncated_fast_response_escalates(monkeypatch):
+    fast = full_analysis({}, pontuacao_modelo=100)
+    full = full_analysis({5: "não"}, pontuacao_modelo=100)
+    # parse_tolerant repararia o JSON cortado: o finish_reason é que marca a resposta como incompleta
+    fake_requests(monkeypatch, {FAST: (fast[:len(fast) // 2], "length"), FULL: full})
+    for raw, analysis in run_both():
+        decision = analysis["cascata"]
+        assert decision["motivos"] == [cascade.MOTIVO_TRUNCADO] and decision["pontuacoes"] == [None, None]
+        assert decision["modelo_final"] == FULL and analysis["pontuacao_total_percentual"] == 90
+
+
+def test_truncated_escalation_keeps_the_fast_analysis(monkeypatch):
+    fast = full_analysis({}, pontuacao_modelo=100, eliminatorio=True)
+    full = full_analysis({}, pontuacao_modelo=100)
+    fake_requests(monkeypatch, {FAST: fast, FULL: (full[:-10], "length")})
+    for raw, analysis in run_both():
+        assert raw == fast and analysis["cascata"]["modelo_final"] == FAST
+        assert analysis["cascata"]["escalacao_falhou"].startswith(f"{FULL}: resposta truncada")
@@ -0,0 +1,16 @@
+"""O app sobe sem importar as dependências pesadas: openai, numpy e fpdf só carregam quando usados."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_app_modules_do_not_load_heavy_dependencies():
+    # Os imports de monitorai do topo do app, num processo novo
+    lines = (ROOT / "streamlit_app.py").read_text(encoding="utf-8").splitlines()
+    imports = [line for line in lines if line.startswith("from monitorai")]
+    code = "\n".join(["import sys", *imports, "print(sorted(m for m in ('openai', 'numpy', 'fpdf', 'httpx') if m in sys.modules))"])
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
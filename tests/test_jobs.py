@@ -0,0 +1,145 @@
+"""Fila de análises (monitorai.jobs): retirada dos jobs, heartbeat, volta para a fila, dono do job e telemetria dos processos."""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from monitorai import jobs
+from monitorai.jobs import MAX_ATTEMPTS, STALE_SECONDS, STATUS_CONCLUIDO, STATUS_ERRO, STATUS_EXECUTANDO, JobQueue
+from monitorai.telemetry import Telemetry, telemetry
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs")
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / "ligacao.mp3"
+    path.write_bytes(b"ID3")
+    return path
+
+
+def expire_heartbeat(queue, job_id):
+    """Simula um processo morto: heartbeat mais antigo que STALE_SECONDS"""
+    conn = sqlite3.connect(queue.path)
+    with conn:
+        conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - STALE_SECONDS - 1, job_id))
+    conn.close()
+
+
+def test_claim_takes_the_oldest_job_once(queue, audio):
+    first = queue.submit(audio, modelo="gpt-4o", motor="unico")
+    second = queue.submit(audio, modelo="gpt-4o", motor="unico")
+
+    job = queue.claim("a")
+    assert job["id"] == first and job["status"] == STATUS_EXECUTANDO and job["processo"] == "a"
+    assert job["tentativas"] == 1 and job["parametros"]["modelo"] == "gpt-4o"
+    assert (queue.job_dir(first) / "audio.mp3").read_bytes() == b"ID3"
+    assert queue.claim("b")["id"] == second
+    assert queue.claim("c") is None
+
+
+def test_heartbeat_only_from_the_owner(queue, audio):
+    job_id = queue.submit(audio, modelo="gpt-4o", motor="unico")
+    queue.claim("a")
+    expire_heartbeat(queue, job_id)
+    stale = queue.get(job_id)["heartbeat"]
+
+    queue.heartbeat(job_id, "outro")
+    assert queue.get(job_id)["heartbeat"] == stale
+    queue.heartbeat(job_id, "a")
+    assert queue.get(job_id)["heartbeat"] > stale
+    # Com o heartbeat em dia o job não é retirado de novo
+    assert queue.claim("b") is None
+
+
+def test_stale_job_is_requeued_and_the_old_owner_is_ignored(queue, audio):
+    job_id = queue.submit(audio, modelo="gpt-4o", motor="unico")
+    queue.claim("a")
+    queue.progress(job_id, "a", "transcricao", 0.05)
+    expire_heartbeat(queue, job_id)
+
+    job = queue.claim("b")
+    assert job["id"] == job_id and job["processo"] == "b" and job["tentativas"] == 2
+    assert job["etapa"] is None and job["progresso"] == 0
+
+    # O processo dado como morto ainda termina: nada do que ele grava vale
+    queue.progress(job_id, "a", "pdf", 0.9, {"status_final": {}})
+    queue.finish(job_id, "a", {"analise": "antiga"})
+    queue.fail(job_id, "a", "erro antigo")
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_EXECUTANDO and job["etapa"] is None and job["parcial"] is None
+
+    queue.progress(job_id, "b", "avaliacao", 0.6, {"status_final": {"risco": "baixo"}})
+    assert queue.get(job_id)["parcial"] == {"status_final": {"risco": "baixo"}}
+    queue.finish(job_id, "b", {"analise": "nova"})
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_CONCLUIDO and job["resultado"] == {"analise": "nova"} and job["progresso"] == 1
+
+
+def test_job_fails_after_max_attempts(queue, audio):
+    job_id = queue.submit(audio, modelo="gpt-4o", motor="unico")
+    for attempt in range(MAX_ATTEMPTS):
+        assert queue.claim(f"p{attempt}")["id"] == job_id
+        expire_heartbeat(queue, job_id)
+
+    assert queue.claim("ultimo") is None
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_ERRO and "interrompido" in job["erro"]
+
+
+def test_worker_telemetry_reaches_the_app_collector(queue):
+    worker, app = Telemetry(), Telemetry()
+    events = []
+    worker.forward_to(events.append)
+    with worker.span("avaliacao", modelo="gpt-4o") as sp:
+        sp.set(prompt_tokens=1000, completion_tokens=200)
+    worker.count("cascata", decisao="rapida")
+    queue.add_telemetry(events)
+
+    app.add_source(queue.take_telemetry)
+    rows = {row["etapa"]: row for row in app.summary()}
+    assert rows["avaliacao"]["eventos"] == 1 and rows["avaliacao"]["prompt_tokens"] == 1000
+    totals = app.totals()
+    assert totals["custo_usd"] > 0 and totals["contadores"] == {'cascata{decisao="rapida"}': 1}
+    # Cada evento é consumido uma vez
+    assert queue.take_telemetry() == []
+    assert app.summary()[0]["eventos"] == 1
+
+
+def test_worker_loop_survives_a_locked_database(queue, audio, tmp_path, monkeypatch):
+    monkeypatch.setenv("MONITORAI_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("MONITORAI_STORE", str(tmp_path / "resultados.sqlite"))
+    job_id = queue.submit(audio, modelo="gpt-4o", motor="unico")
+    stop = threading.Event()
+    claim, locked = JobQueue.claim, []
+
+    def flaky_claim(self, processo):
+        if not locked:
+            locked.append(processo)
+            raise sqlite3.OperationalError("database is locked")
+        return claim(self, processo)
+
+    def failing_job(queue, job, *args):
+        with telemetry.span("transcricao", modelo="whisper-1"):
+            pass
+        stop.set()
+        raise RuntimeError("falha na transcrição")
+
+    monkeypatch.setattr(JobQueue, "claim", flaky_claim)
+    monkeypatch.setattr(jobs, "run_job", failing_job)
+    events = []
+    telemetry.forward_to(events.append)
+    try:
+        jobs.worker_loop(queue.directory, api_key="x", stop=stop, poll_interval=0.01, telemetry_events=events)
+    finally:
+        telemetry.forward_to(None)
+
+    assert locked
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_ERRO and job["erro"] == "RuntimeError: falha na transcrição"
+    assert [event["etapa"] for event in queue.take_telemetry() if "etapa" in event] == ["transcricao"]
@@ -0,0 +1,137 @@
+"""Transcrição de ligações longas em trechos (monitorai.longaudio): cortes nos silêncios e recomposição dos tempos."""
+
+import os
+import shutil
+import types
+
+import pytest
+
+from monitorai import audio, longaudio
+from monitorai.longaudio import chunk_ranges, plan_chunks, response_segments, stitch, transcribe_long
+
+SILENCEDETECT_STDERR = """\
+Input #0, mp3, from 'ligacao.mp3':
+  Duration: 00:25:00.50, start: 0.025057, bitrate: 32 kb/s
+[silencedetect @ 0x1] silence_start: -0.01
+[silencedetect @ 0x1] silence_end: 1.2 | silence_duration: 1.21
+[silencedetect @ 0x1] silence_start: 575.5
+[silencedetect @ 0x1] silence_end: 578.5 | silence_duration: 3
+[silencedetect @ 0x1] silence_start: 1498
+size=N/A time=00:25:00.50 bitrate=N/A speed= 900x
+"""
+
+
+def fake_client(create):
+    return types.SimpleNamespace(audio=types.SimpleNamespace(transcriptions=types.SimpleNamespace(create=create)))
+
+
+def test_detect_silences_parses_silencedetect_output(monkeypatch):
+    monkeypatch.setattr(audio, "run_ffmpeg", lambda args: SILENCEDETECT_STDERR)
+    duration, silences = audio.detect_silences("ligacao.mp3")
+    assert duration == pytest.approx(1500.5)
+    # Início negativo vira 0; silêncio aberto no fim vai até a duração
+    assert silences == [(0.0, 1.2), (575.5, 578.5), (1498.0, 1500.5)]
+
+
+def test_plan_chunks_cuts_in_the_middle_of_silences():
+    boundaries = plan_chunks(1500.5, [(0.0, 1.2), (575.5, 578.5), (1160.0, 1162.0)], chunk_seconds=600)
+    assert boundaries == [0.0, 577.0, 1161.0, 1500.5]
+
+
+def test_plan_chunks_without_silence_cuts_at_the_ideal_size():
+    assert plan_chunks(1300.0, [], chunk_seconds=600) == [0.0, 600.0, 1200.0, 1300.0]
+    assert plan_chunks(300.0, [(100.0, 110.0)], chunk_seconds=600) == [0.0, 300.0]
+
+
+def test_chunk_ranges_apply_overlap_within_the_audio():
+    assert chunk_ranges([0.0, 577.0, 1161.0, 1500.5], overlap=2.0) == [
+        (0.0, 579.0), (575.0, 1163.0), (1159.0, 1500.5),
+    ]
+
+
+def test_response_segments_are_shifted_by_the_chunk_offset():
+    transcript = {"text": "a b", "segments": [{"start": 0.5, "end": 2.0, "text": " a "}, {"start": 2.0, "end": 4.25, "text": "b"}]}
+    assert response_segments(transcript, 575.0, 1163.0) == [
+        {"start": 575.5, "end": 577.0, "text": "a"},
+        {"start": 577.0, "end": 579.25, "text": "b"},
+    ]
+    # Sem segmentos, o trecho inteiro vira um só
+    assert response_segments(types.SimpleNamespace(text=" oi ", segments=None), 10.0, 20.0) == [
+        {"start": 10.0, "end": 20.0, "text": "oi"},
+    ]
+
+
+def test_stitch_drops_segments_and_words_repeated_in_the_overlap():
+    boundaries = [0.0, 10.0, 20.0]
+    chunk_segments = [
+        [{"start": 0.0, "end": 6.0, "text": "bom dia"}, {"start": 6.0, "end": 10.5, "text": "qual a placa do veículo"},
+         {"start": 10.5, "end": 12.0, "text": "é ABC"}],
+        [{"start": 8.0, "end": 10.5, "text": "placa do veículo"}, {"start": 10.2, "end": 12.0, "text": "veículo é ABC"},
+         {"start": 12.0, "end": 20.0, "text": "obrigado"}],
+    ]
+    result = stitch(chunk_segments, boundaries)
+    assert [seg["text"] for seg in result["segments"]] == ["bom dia", "qual a placa do veículo", "é ABC", "obrigado"]
+    assert result["text"] == "bom dia qual a placa do veículo é ABC obrigado"
+
+
+def test_transcribe_long_merges_chunks_with_mocked_silences(monkeypatch, tmp_path):
+    source = tmp_path / "ligacao.mp3"
+    source.write_bytes(b"")
+    # Falas de 20 s separadas por pausas de 3 s; o silencedetect é simulado
+    speeches = [(i * 23.0, i * 23.0 + 20.0) for i in range(6)]
+    silences = [(end, end + 3.0) for _, end in speeches[:-1]]
+    monkeypatch.setattr(longaudio, "detect_silences", lambda path: (speeches[-1][1], silences))
+    ranges = {}
+
+    def extract(path, start, end, out_path):
+        ranges[os.path.basename(out_path)] = (start, end)
+        open(out_path, "wb").close()
+        return out_path
+
+    def create(model, file, **kwargs):
+        # Cada trecho responde as falas que contém, com tempos relativos ao início do trecho
+        start, end = ranges[os.path.basename(file.name)]
+        segments = [
+            {"start": max(s, start) - start, "end": min(e, end) - start, "text": f"fala {index}"}
+            for index, (s, e) in enumerate(speeches) if s < end and e > start
+        ]
+        return {"text": " ".join(seg["text"] for seg in segments), "segments": segments}
+
+    monkeypatch.setattr(longaudio, "extract_segment", extract)
+    result = transcribe_long(fake_client(create), source, chunk_seconds=50, max_workers=3)
+
+    assert len(ranges) > 1
+    assert [seg["text"] for seg in result["segments"]] == [f"fala {i}" for i in range(len(speeches))]
+    for seg, (start, end) in zip(result["segments"], speeches):
+        assert start <= seg["start"] < seg["end"] <= end
+
+
+@pytest.mark.skipif(shutil.which(audio.FFMPEG) is None, reason="ffmpeg indisponível (defina FFMPEG_BINARY)")
+def test_transcribe_long_with_synthetic_wav(tmp_path):
+    wav = tmp_path / "ligacao.wav"
+    speeches = [(i * 8.0, i * 8.0 + 6.0) for i in range(5)]
+    filters = "".join(
+        f"sine=frequency={400 + 50 * i}:duration=6:sample_rate=16000[s{i}];"
+        f"anullsrc=r=16000:cl=mono,atrim=duration=2[p{i}];"
+        for i in range(len(speeches))
+    )
+    inputs = "".join(f"[s{i}][p{i}]" for i in range(len(speeches)))
+    audio.run_ffmpeg(["-loglevel", "error", "-filter_complex", f"{filters}{inputs}concat=n={2 * len(speeches)}:v=0:a=1[out]",
+                      "-map", "[out]", "-ac", "1", "-c:a", "pcm_s16le", "-y", str(wav)])
+
+    def create(model, file, **kwargs):
+        # Como o endpoint: um segmento por fala encontrada no arquivo do trecho (textos distintos entre trechos)
+        name = os.path.basename(file.name)
+        duration, silences = audio.detect_silences(file.name)
+        segments, cursor = [], 0.0
+        for start, end in silences + [(duration, duration)]:
+            if start - cursor > 1.0:
+                segments.append({"start": cursor, "end": start, "text": f"{name} fala {len(segments)}"})
+            cursor = end
+        return {"text": "", "segments": segments}
+
+    result = transcribe_long(fake_client(create), wav, chunk_seconds=15, max_workers=2)
+    segments = result["segments"]
+    assert len(segments) == len(speeches)
+    for seg, (start, end) in zip(segments, speeches):
+        assert start - 0.5 <= seg["start"] and seg["end"] <= end + 0.5
@@ -0,0 +1,47 @@
+"""Relatório em PDF (monitorai.report): acentos e emoji com a fonte TrueType, pela cópia leve e pelo add_font público."""
+
+import io
+
+import pytest
+
+from monitorai import report
+
+pypdf = pytest.importorskip("pypdf")
+
+if report._font_prototypes() is None:
+    pytest.skip(f"fonte DejaVu ausente em {report.FONT_DIR} (MONITORAI_PDF_FONT_DIR)", allow_module_level=True)
+
+TRANSCRICAO = "Agente: Olá, a solicitação já está em análise 👍. Cliente: Ótimo, não há cobrança? 😀 Obrigação cumprida."
+ANALISE = {
+    "status_final": {"satisfacao": "satisfeito", "risco": "baixo", "desfecho": "resolvido"},
+    "grupos_avaliacao": [{"grupo": "A", "nome": "Técnicas de atendimento", "percentual": 10, "feito": True,
+                          "justificativa": "Confirmação dos dados e atenção às informações 🚗"}],
+    "checklist_detalhado": [{"item": 4, "grupo": "A", "criterio": "Verbalizou script LGPD", "resposta": "sim",
+                             "justificativa": "Pediu autorização — “posso compartilhar?” ✅"}],
+    "criterios_eliminatorios": [],
+    "pontuacao_total_percentual": 10,
+    "resumo_geral": "Atendimento cordial, sem pendências de documentação 🙂",
+}
+
+
+def extract_text(data):
+    return "".join(page.extract_text() for page in pypdf.PdfReader(io.BytesIO(data)).pages)
+
+
+@pytest.mark.parametrize("copy_fonts", [True, False], ids=["copia", "add_font"])
+def test_report_keeps_accents_and_drops_emoji(monkeypatch, copy_fonts):
+    if not copy_fonts:
+        monkeypatch.setattr(report, "_can_copy_fonts", lambda: False)
+    elif not report._can_copy_fonts():
+        pytest.skip("esta versão do fpdf2 não tem os atributos internos da cópia leve")
+
+    # Dois relatórios no mesmo processo: a segunda cópia não pode herdar o subset da primeira
+    for _ in range(2):
+        text = extract_text(report.create_pdf(ANALISE, TRANSCRICAO, "gpt-4o"))
+        for palavra in ["solicitação", "análise", "Ótimo", "não", "cobrança", "Obrigação", "Confirmação",
+                        "informações", "documentação", "pendências"]:
+            assert palavra in text
+        # Emoji saem do texto quando a fonte não tem o glifo (😀 está na DejaVu; 👍, 🚗, ✅ e 🙂 não)
+        cmap = report._font_prototypes()[""][0].cmap
+        for emoji in "👍😀🚗✅🙂":
+            assert (emoji in text) == (ord(emoji) in cmap)
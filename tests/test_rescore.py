@@ -0,0 +1,184 @@
+"""Reavaliação pela Batch API (monitorai.rescore): compilação das requisições e coleta dos resultados, com um cliente falso."""
+
+import contextlib
+import json
+import types
+
+import pytest
+
+from monitorai import rescore
+from monitorai.batch import ResultWriter
+from monitorai.fanout import TAREFA_ELIMINATORIOS, TAREFA_RESUMO
+from monitorai.prompt import ENGINE_GROUPS, ENGINE_SINGLE
+from monitorai.scoring import GRUPOS
+
+TRANSCRICAO = "Agente: Bom dia, Carglass, meu nome é Ana. Cliente: Bom dia, quero trocar o para-brisa."
+
+
+class FakeFiles:
+    """Só o que a coleta usa: files.with_streaming_response.content(file_id).iter_lines()"""
+
+    def __init__(self):
+        self.contents = {}
+        self.with_streaming_response = self
+
+    @contextlib.contextmanager
+    def content(self, file_id):
+        yield types.SimpleNamespace(iter_lines=lambda: iter(self.contents[file_id]))
+
+
+class FakeStore:
+    def __init__(self):
+        self.chaves = []
+
+    def add_many(self, records):
+        self.chaves.extend(record["chave"] for record in records)
+
+
+class StopWriter(ResultWriter):
+    """Interrompe a coleta depois de `limit` registros gravados, como um Ctrl+C"""
+
+    def __init__(self, output_path, limit):
+        super().__init__(output_path)
+        self.limit = limit
+
+    def write(self, record):
+        super().write(record)
+        self.limit -= 1
+        if not self.limit:
+            raise KeyboardInterrupt
+
+
+def write_source(path, calls):
+    with open(path, "w", encoding="utf-8") as source:
+        for index in range(calls):
+            source.write(json.dumps({"id": f"ligacao-{index}", "status": "ok", "transcricao": TRANSCRICAO,
+                                     "metadados": {"agente": "Ana"}}, ensure_ascii=False) + "\n")
+
+
+def task_content(custom_id):
+    task = custom_id.rsplit(rescore.TASK_SEPARATOR, 1)[-1]
+    if task == TAREFA_ELIMINATORIOS:
+        return {"criterios_eliminatorios": []}
+    if task == TAREFA_RESUMO:
+        return {"status_final": {"satisfacao": "satisfeito"}, "resumo_geral": custom_id}
+    grupo = next((grupo for grupo in GRUPOS if grupo["grupo"] == task), None)
+    if grupo is None:  # motor único: a análise inteira numa resposta
+        return {"resumo_geral": custom_id, "checklist_detalhado": []}
+    if not grupo["itens"]:
+        return {"feito": True, "justificativa": "ok"}
+    return {"checklist_detalhado": [{"item": numero, "resposta": "sim", "justificativa": "ok"} for numero in grupo["itens"]]}
+
+
+def result_line(custom_id, fail=False):
+    if fail:
+        return json.dumps({"custom_id": custom_id, "response": {"status_code": 500, "body": {"error": {"message": "falhou"}}}})
+    body = {"choices": [{"message": {"content": json.dumps(task_content(custom_id))}}]}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}})
+
+
+def finish_jobs(state, files, failing=()):
+    """Marca os jobs como terminados, com um arquivo de resultado por arquivo de requisições"""
+    for index, entry in enumerate(state["arquivos"]):
+        with open(entry["caminho"], encoding="utf-8") as requests_file:
+            custom_ids = [json.loads(line)["custom_id"] for line in requests_file]
+        files.contents[f"saida-{index}"] = [result_line(custom_id, custom_id in failing) for custom_id in custom_ids]
+        entry.update(status="completed", output_file_id=f"saida-{index}", error_file_id=None)
+
+
+def read_output(path):
+    with open(path, encoding="utf-8") as output:
+        return [json.loads(line) for line in output]
+
+
+def test_prepare_splits_files_and_skips_invalid_lines(tmp_path):
+    source = tmp_path / "entrada.jsonl"
+    write_source(source, 5)
+    with open(source, "a", encoding="utf-8") as extra:
+        extra.write(json.dumps({"id": "ligacao-0", "status": "ok", "transcricao": "repetida"}) + "\n")
+        extra.write(json.dumps({"id": "com-erro", "status": "erro", "erro": "timeout"}) + "\n")
+        extra.write('{"id": "truncada", "transcr\n')
+
+    state = rescore.prepare(source, tmp_path / "trabalho", max_requests=2)
+
+    assert state["engine"] == ENGINE_SINGLE
+    assert [entry["requisicoes"] for entry in state["arquivos"]] == [2, 2, 1]
+    custom_ids = []
+    for entry in state["arquivos"]:
+        with open(entry["caminho"], encoding="utf-8") as requests_file:
+            lines = [json.loads(line) for line in requests_file]
+        assert all(line["url"] == rescore.ENDPOINT and line["body"]["model"] == state["modelo"] for line in lines)
+        custom_ids += [line["custom_id"] for line in lines]
+    assert custom_ids == [f"ligacao-{index}" for index in range(5)]
+    with open(tmp_path / "trabalho" / "locais.jsonl", encoding="utf-8") as sidecar:
+        assert [json.loads(line)["metadados"] for line in sidecar] == [{"agente": "Ana"}] * 5
+
+
+def test_prepare_groups_keeps_tasks_of_a_call_in_one_file(tmp_path):
+    source = tmp_path / "entrada.jsonl"
+    write_source(source, 3)
+
+    state = rescore.prepare(source, tmp_path / "trabalho", engine=ENGINE_GROUPS, max_requests=10)
+
+    for entry in state["arquivos"]:
+        with open(entry["caminho"], encoding="utf-8") as requests_file:
+            calls = [json.loads(line)["custom_id"].rsplit(rescore.TASK_SEPARATOR, 1)[0] for line in requests_file]
+        assert entry["ligacoes"] == len(set(calls))
+        assert entry["requisicoes"] == len(calls) <= 10
+    assert sum(entry["ligacoes"] for entry in state["arquivos"]) == 3
+
+
+@pytest.mark.parametrize("engine", [ENGINE_SINGLE, ENGINE_GROUPS])
+def test_collect_writes_one_record_per_call(tmp_path, engine):
+    source, work_dir, output = tmp_path / "entrada.jsonl", tmp_path / "trabalho", tmp_path / "saida.jsonl"
+    write_source(source, 4)
+    state = rescore.prepare(source, work_dir, engine=engine, max_requests=8)
+    files = FakeFiles()
+    failing = {"ligacao-1"} if engine == ENGINE_SINGLE else {f"ligacao-1{rescore.TASK_SEPARATOR}{TAREFA_RESUMO}"}
+    finish_jobs(state, files, failing)
+    store = FakeStore()
+
+    writer = ResultWriter(output)
+    try:
+        ok, failed = rescore.collect(types.SimpleNamespace(files=files), work_dir, state, writer, store, output_path=output)
+    finally:
+        writer.close()
+
+    records = read_output(output)
+    assert (ok, failed) == (3, 1)
+    assert sorted(record["id"] for record in records) == [f"ligacao-{index}" for index in range(4)]
+    assert {record["id"]: record["status"] for record in records}["ligacao-1"] == "erro"
+    assert all(record["metadados"] == {"agente": "Ana"} for record in records)
+    assert sorted(store.chaves) == ["ligacao-0", "ligacao-2", "ligacao-3"]
+    assert all(entry["coletado"] and "coletando" not in entry for entry in rescore.load_state(work_dir)["arquivos"])
+
+
+def test_collect_resumes_an_interrupted_file_without_duplicates(tmp_path):
+    source, work_dir, output = tmp_path / "entrada.jsonl", tmp_path / "trabalho", tmp_path / "saida.jsonl"
+    write_source(source, 6)
+    state = rescore.prepare(source, work_dir, max_requests=3)
+    files = FakeFiles()
+    finish_jobs(state, files)
+    rescore.save_state(work_dir, state)
+    client = types.SimpleNamespace(files=files)
+    store = FakeStore()
+
+    writer = StopWriter(output, limit=4)
+    with pytest.raises(KeyboardInterrupt):
+        rescore.collect(client, work_dir, state, writer, store, output_path=output)
+    writer.close()
+    assert len(read_output(output)) == 4
+
+    # Nova execução a partir do estado gravado: o primeiro arquivo terminou, o segundo ficou pela metade
+    state = rescore.load_state(work_dir)
+    assert [(entry.get("coletado"), entry.get("coletando")) for entry in state["arquivos"]] == [(True, None), (None, True)]
+    writer = ResultWriter(output)
+    try:
+        ok, failed = rescore.collect(client, work_dir, state, writer, store, output_path=output)
+    finally:
+        writer.close()
+
+    assert (ok, failed) == (2, 0)
+    assert sorted(record["id"] for record in read_output(output)) == [f"ligacao-{index}" for index in range(6)]
+    # O banco recebe o arquivo interrompido inteiro (gravar de novo só substitui)
+    assert sorted(set(store.chaves)) == [f"ligacao-{index}" for index in range(6)]
@@ -0,0 +1,73 @@
+"""Regras determinísticas (monitorai.rules): nenhuma decisão errada nas fixtures e falsos positivos conhecidos."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from monitorai import rules
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "transcricoes.jsonl"
+
+
+def load_fixtures():
+    with open(FIXTURES, encoding="utf-8") as fixtures:
+        return [json.loads(line) for line in fixtures if line.strip()]
+
+
+def score(item, text):
+    return rules.RULES[item](text, rules.normalize(text))
+
+
+@pytest.mark.parametrize("fixture", load_fixtures(), ids=lambda fixture: fixture["id"])
+def test_rules_never_contradict_the_fixtures(fixture):
+    for item, result in rules.prescore(fixture["transcricao"]).items():
+        # Sem decisão (None) o item segue para o modelo; uma decisão tem de ser a esperada
+        assert result["resposta"] in (None, fixture["esperado"][str(item)]), (item, result["justificativa"])
+
+
+def test_item_14_ignores_a_customer_denying_the_closing_script():
+    for text in ["Não tem franquia? Não sei da validade. Não recebi link. Vou aguardar o retorno.",
+                 "Cliente: Não tem franquia? Não sei da validade. Não recebi link. Vou aguardar o retorno.",
+                 "A validade é de 30 dias. A franquia é 300 reais. O link vai por SMS. "
+                 "Cliente: Tá, vou ficar aguardando o contato."]:
+        assert score(14, text)["resposta"] is None
+
+
+def test_item_14_never_answers_nao():
+    assert score(14, "Bom dia, em que posso ajudar? Obrigado, tenha um bom dia.")["resposta"] is None
+    partial = score(14, "A validade é de 30 dias e a franquia é de 300 reais.")
+    assert partial["resposta"] is None and "link de acompanhamento" in partial["justificativa"]
+
+
+def test_item_14_accepts_the_agent_script():
+    text = ("A autorização tem validade de 30 dias, a franquia é de 280 reais, o link de acompanhamento vai "
+            "por SMS e a senhora aguarde o contato da loja para o agendamento.")
+    assert score(14, text)["resposta"] == "sim"
+
+
+@pytest.mark.parametrize("text", [
+    "Posso passar o contato da loja que vai fazer o serviço pra senhora anotar?",
+    "Podemos enviar os dados do parceiro por e-mail?",
+    "Cliente: Você pode passar meu telefone para o prestador? Agente: Posso sim.",
+    "Não podemos compartilhar seus dados com o prestador sem autorização.",
+])
+def test_item_4_requires_consent_for_the_customer_data(text):
+    assert score(4, text)["resposta"] is None
+
+
+def test_item_4_accepts_consent_for_the_customer_data():
+    text = "Dona Paula, podemos informar seu telefone ao prestador que irá atender?"
+    assert score(4, text)["resposta"] == "sim"
+
+
+@pytest.mark.parametrize("text", [
+    "O valor é 1500000 reais. Cliente: 1500000 certo?",
+    "O valor é R$ 1500000. 1500000, certo?",
+])
+def test_item_5_money_is_not_an_echo(text):
+    assert score(5, text)["resposta"] is None
+
+
+def test_item_5_echo_of_a_phone_number():
+    assert score(5, "Meu telefone é 11 98765-4321. 98765-4321, correto?")["resposta"] == "sim"
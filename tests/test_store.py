@@ -0,0 +1,41 @@
+"""Banco de resultados (monitorai.store): gravação em lote depois de uma transação desfeita."""
+
+import pytest
+
+from monitorai import store
+from monitorai.store import ResultsStore
+
+NOVO_CRITERIO = "Critério fora da lista padrão"
+
+
+def record(chave):
+    return {
+        "chave": chave, "agente": "Ana", "data": "2024-05-06",
+        "analise": {
+            "pontuacao_total_percentual": 80,
+            "criterios_eliminatorios": [{"criterio": NOVO_CRITERIO, "ocorreu": True}],
+        },
+    }
+
+
+def test_retry_after_rollback_with_a_new_criterion(tmp_path, monkeypatch):
+    results = ResultsStore(tmp_path / "resultados.sqlite")
+    records = [record("ligacao-1"), record("ligacao-2")]
+
+    def fail(self, conn):
+        raise RuntimeError("falha no meio da transação")
+
+    # O critério novo é inserido e a transação é desfeita antes do COMMIT
+    with monkeypatch.context() as patch:
+        patch.setattr(store._Deltas, "apply", fail)
+        with pytest.raises(RuntimeError):
+            results.add_many(records)
+    assert results.count() == 0
+
+    # Nova tentativa (como a gravação pendente do lote): o id do critério não pode vir do cache
+    assert results.add_many(records) == 2
+    assert results.get("ligacao-1")["criterios_eliminatorios"][0]["criterio"] == NOVO_CRITERIO
+    assert (NOVO_CRITERIO, 2, 2) in results.eliminatory_frequencies()
+    # Depois do COMMIT o id fica em cache e continua válido
+    assert results.add_many([record("ligacao-3")]) == 1
+    assert (NOVO_CRITERIO, 3, 3) in results.eliminatory_frequencies()
@@ -0,0 +1,92 @@
+"""Cópia dos uploads para disco (monitorai.uploads): memória limitada e remoção do arquivo temporário."""
+
+import gc
+import hashlib
+import io
+import os
+import tracemalloc
+
+import pytest
+
+from monitorai.uploads import CHUNK_SIZE, spool_upload
+
+LARGE_UPLOAD_BYTES = 128 * 1024 * 1024
+
+
+class GeneratedUpload:
+    """Upload de `size` bytes gerado sob demanda (sem seek), que não fica inteiro na memória"""
+
+    def __init__(self, size, fail_after=None):
+        self.remaining = size
+        self.sent = 0
+        self.fail_after = fail_after
+        self.largest_read = 0
+        self.digest = hashlib.sha256()
+        self._block = bytes(range(256)) * (CHUNK_SIZE // 256)
+
+    def read(self, size=-1):
+        if self.fail_after is not None and self.sent >= self.fail_after:
+            raise OSError("conexão interrompida")
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        self.largest_read = max(self.largest_read, size)
+        block = self._block[:size] if size <= len(self._block) else bytes(size)
+        self.remaining -= len(block)
+        self.sent += len(block)
+        self.digest.update(block)
+        return block
+
+
+def test_large_upload_is_copied_in_chunks(tmp_path):
+    upload = GeneratedUpload(LARGE_UPLOAD_BYTES)
+    tracemalloc.start()
+    try:
+        spooled = spool_upload(upload, directory=tmp_path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert spooled.size == LARGE_UPLOAD_BYTES
+    assert os.path.getsize(spooled.path) == LARGE_UPLOAD_BYTES
+    assert spooled.sha256 == upload.digest.hexdigest()
+    # Leituras em blocos de CHUNK_SIZE: a memória não acompanha o tamanho da gravação
+    assert upload.largest_read <= CHUNK_SIZE
+    assert peak < 4 * CHUNK_SIZE
+    spooled.cleanup()
+
+
+def test_seekable_upload_is_rewound(tmp_path):
+    data = os.urandom(3 * CHUNK_SIZE + 17)
+    source = io.BytesIO(data)
+    source.seek(100)
+    spooled = spool_upload(source, directory=tmp_path, source_id="f1")
+    assert source.tell() == 0
+    assert spooled.size == len(data)
+    assert spooled.source_id == "f1"
+    with open(spooled.path, "rb") as copied:
+        assert copied.read() == data
+    spooled.cleanup()
+
+
+def test_cleanup_removes_file(tmp_path):
+    spooled = spool_upload(io.BytesIO(b"audio"), directory=tmp_path)
+    assert spooled.exists
+    spooled.cleanup()
+    assert not spooled.exists
+    assert not os.path.exists(spooled.path)
+    spooled.cleanup()  # idempotente
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_file_removed_when_upload_is_collected(tmp_path):
+    # Fim da sessão do Streamlit: o session_state é descartado e o objeto coletado
+    session_state = {"spooled_upload": spool_upload(io.BytesIO(b"audio"), directory=tmp_path)}
+    path = session_state["spooled_upload"].path
+    session_state.clear()
+    gc.collect()
+    assert not os.path.exists(path)
+
+
+def test_interrupted_copy_leaves_no_file(tmp_path):
+    with pytest.raises(OSError):
+        spool_upload(GeneratedUpload(10 * CHUNK_SIZE, fail_after=3 * CHUNK_SIZE), directory=tmp_path)
+    assert list(tmp_path.iterdir()) == []